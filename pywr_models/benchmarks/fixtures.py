@@ -0,0 +1,391 @@
+import os
+import shutil
+import zlib
+import numpy as np
+import pandas as pd
+from loguru import logger
+
+# Management tables (flood control curves, IFR schedules, demands, etc.) are static policy inputs, not hydrology, so
+# they are copied from the real data when it is available. Otherwise, they are synthesized with the index and columns
+# that the model's parameters look them up by.
+MONTH_DAY = 'month-day'  # e.g., '1-31'
+MONTH_SLASH_DAY = 'month/day'  # e.g., '1/31'
+MM_DD = 'mm-dd'  # e.g., '01-31'
+DATE_1900 = '1900-mm-dd'  # e.g., '1900-01-31'
+MDY_1900 = 'm/d/1900'  # e.g., '1/31/1900'
+MONTH_AND_DAY = '(month, day)'  # two index columns
+MONTH = 'month'
+WATER_YEAR = 'water year'
+NODE = 'node'
+ROWS = 'rows'
+
+WYT_COLUMNS = [1, 2, 3, 4, 5]
+
+MANAGEMENT_TABLES = {
+    # stanislaus
+    'Lake Tulloch Flood Control': dict(index=MONTH_DAY, low=70, high=82),
+    'New Melones Lake Flood Control': dict(index=MONTH_DAY, columns=['rainflood', 'conditional'], low=2400, high=2970),
+    'New Spicer Meadow District release': dict(index=MONTH_SLASH_DAY, low=5, high=20),
+    'IFR Below Relief Reservoir schedule': dict(index=MONTH_AND_DAY, columns=WYT_COLUMNS, low=5, high=50),
+    'IFR Below Pinecrest Lake schedule': dict(index=MONTH_AND_DAY, columns=WYT_COLUMNS, low=3, high=30),
+    'IFR Below Donnell Lake schedule': dict(index=MONTH_AND_DAY, columns=WYT_COLUMNS, low=10, high=100),
+    'Supplemental IFR below Donnell Lake': dict(index=ROWS, columns=WYT_COLUMNS, low=0, high=200),
+    'IFR Below Sand Bar Div Schedule': dict(index=MONTH_AND_DAY, columns=WYT_COLUMNS, low=10, high=100),
+    'Supplemental IFR below Sand Bar Div': dict(index=ROWS, columns=WYT_COLUMNS, low=0, high=200),
+    'IFR Below Philadelphia Div Schedule': dict(index=MONTH_AND_DAY, columns=WYT_COLUMNS, low=5, high=50),
+    'IFR bl Goodwin Dam schedule': dict(index=MM_DD, columns=[1, 2, 3, 4, 5, 6], low=200, high=1500),
+    'Oakdale Irrigation District Demand': dict(index=MONTH_AND_DAY, columns=WYT_COLUMNS, low=0, high=2),
+    'South San Joaquin Irrigation District Demand': dict(index=MONTH_AND_DAY, columns=WYT_COLUMNS, low=0, high=2),
+    'New Melones Storage Regression': dict(index=MONTH, columns=['m', 'b'], low=0.8, high=1.2),
+    'Storage Costs': dict(index=NODE, index_name='Reservoir', columns=['Cost'], low=-50, high=-1),
+
+    # tuolumne
+    'Bias Correction Factors': dict(index=MONTH, columns=[], low=1, high=1),
+    'Modesto Irrigation District/Demand Table': dict(index=MONTH_AND_DAY,
+                                                     columns=['Critical', 'Dry', 'Below', 'Above', 'Wet'],
+                                                     low=0, high=0.006),
+    'Turlock Irrigation District/Demand Table': dict(index=MONTH_AND_DAY,
+                                                     columns=['Critical', 'Dry', 'Below', 'Above', 'Wet'],
+                                                     low=0, high=0.006),
+    'SFPUC weekly fraction': dict(index=ROWS, rows=range(1, 54), low=0.015, high=0.024),
+    'Don Pedro Lake Flood Control Curve': dict(index=MONTH_DAY, low=2100, high=2500),
+    'Preferred Storage': dict(index=ROWS, rows=range(1, 367), columns=['Water Bank'], low=300000, high=570000),
+    'Lake Eleanor Pumping Thresholds': dict(index=ROWS, rows=range(1, 367), low=10000, high=27000),
+    'IFR at La Grange/IFR Schedule': dict(index=ROWS, rows=range(6), columns=['days', 1, 2, 3, 4, 5, 6, 7],
+                                          low=50, high=300),
+    'IFR bl Hetch Hetchy Reservoir/IFR Schedule': dict(index=ROWS, rows=range(13), columns=[
+        ('A', 'min'), ('A', 'max'), ('B', 'min'), ('B', 'max'), ('C', 'min'), ('C', 'max')], low=35, high=125),
+    'IFR bl Hetch Hetchy Reservoir/UTREP hydrographs': dict(index=ROWS, rows=range(365),
+                                                            columns=[0, 100000, 200000, 300000], low=0, high=3000),
+    'IFR bl Lake Eleanor/IFR Schedule': dict(index=ROWS, rows=range(12), columns=[1, 2, 3], low=5, high=50),
+    'functional flows parameters': dict(index=ROWS, rows=['dry season baseflow', 'wet season baseflow'],
+                                        columns=[('dry', 'magnitude'), ('moderate', 'magnitude'),
+                                                 ('wet', 'magnitude')], low=50, high=500),
+    'functional flows metrics': dict(index=ROWS, rows=['dry', 'moderate', 'wet'],
+                                     columns=['moderate magnitude'], low=50, high=500),
+    'functional flows floods': dict(index=ROWS, rows=['2-year', '5-year', '10-year'], low=18000, high=53000),
+
+    # merced
+    'WYT for IFR Below Exchequer': dict(index=WATER_YEAR, low=1, high=5, dtype=int),
+    'Lake McClure Spill/ESRD': dict(index=None),
+    'Lake McClure/Guide Curve': dict(index=DATE_1900, columns=['dry', 'normal', 'wet'], low=675000, high=1024600),
+    'MID Northside Diversions': dict(index=MDY_1900, columns=[4, 3, 1, 2, 5], low=0, high=100),
+    'MID Main Diversions': dict(index=MDY_1900, columns=[4, 3, 1, 2, 5], low=0, high=1000),
+    'Fish Pulse': dict(index=DATE_1900, low=0, high=100),
+
+    # upper san joaquin
+    'CVP Friant-Kern Canal demand': dict(index=MONTH_AND_DAY, columns=WYT_COLUMNS, low=0, high=4000),
+    'CVP Madera Canal demand': dict(index=MONTH_AND_DAY, columns=WYT_COLUMNS, low=0, high=1000),
+    'Big Creek System IFRs 2000 normal': dict(index=NODE, columns='big creek', low=1, high=20),
+    'Big Creek System IFRs 2000 dry': dict(index=NODE, columns='big creek', low=1, high=10),
+    'IFR Schedule below Friant Dam': dict(index=MONTH_AND_DAY, columns=[1, 2, 3, 4, 5, 6], low=100, high=1500),
+    'SJ restoration flows': dict(index=WATER_YEAR, columns=['WYT', 'Allocation adjustment']),
+    'Seasonal Inflow at Friant': dict(index=WATER_YEAR, low=400000, high=2500000),
+    'Millerton Lake flood curve': dict(index=MONTH_DAY, columns=['rainflood', 'conditional'], low=450, high=640),
+}
+
+# water year types, by table, as (lowest, highest)
+WYT_TABLES = {
+    'WYT P2005 & P2130': (1, 5),
+    'WYT P2019': (1, 5),
+}
+
+# hydrologic scale of each basin's runoff, relative to the Stanislaus
+BASIN_SCALES = {
+    'Stanislaus River': 1.0,
+    'Tuolumne River': 1.6,
+    'Merced River': 0.8,
+    'Upper San Joaquin River': 1.5,
+}
+
+DAILY_BLOCKS = 4
+MONTHLY_BLOCKS = 8
+
+
+def _rng(*keys):
+    # a random number generator seeded by the data it is used for, so that fixtures are the same on every machine
+    return np.random.RandomState(zlib.crc32('|'.join(str(k) for k in keys).encode()))
+
+
+def _calendar_days():
+    return pd.date_range('2000-01-01', '2000-12-31', freq='D')
+
+
+def _water_years(start, end):
+    return list(range(start.year - 1, end.year + 3))
+
+
+def synthetic_runoff(dates, key, scale=1.0):
+    """
+    Synthetic daily runoff (mcm) with a winter rain and spring snowmelt pattern, year-to-year variation and noise.
+    :param dates: The daily dates
+    :param key: A key (e.g., the data url) to seed the random numbers with
+    :param scale: The mean daily runoff
+    """
+    rng = _rng(key)
+    day_of_year = dates.dayofyear.values
+    snowmelt = np.exp(-((day_of_year - 140) / 35.0) ** 2)
+    rain = 0.3 * np.exp(-((day_of_year - 30) / 40.0) ** 2)
+    water_years = np.where(dates.month >= 10, dates.year + 1, dates.year)
+    year_factors = {wy: rng.lognormal(0, 0.5) for wy in np.unique(water_years)}
+    wetness = np.array([year_factors[wy] for wy in water_years])
+    noise = rng.lognormal(0, 0.2, len(dates))
+    flow = scale * (0.05 + 2.5 * snowmelt + rain) * wetness * noise * rng.uniform(0.2, 1.0)
+    return pd.Series(flow, index=dates)
+
+
+def synthetic_monthly_forecasts(daily_flow):
+    """
+    Perfect monthly runoff forecasts for the next 12 months, from each month, as in forecast_daily_to_monthly.
+    """
+    monthly = daily_flow.resample('MS').sum()
+    values = monthly.values
+    rows = [[values[i + j] if i + j < len(values) else values[(i + j) % 12] for j in range(12)]
+            for i in range(len(values))]
+    df = pd.DataFrame(rows, index=monthly.index, columns=['{:02}'.format(m) for m in range(1, 13)])
+    df.index.name = 'Date'
+    return df
+
+
+def synthetic_energy_prices(price_years, blocks=None, monthly=False, key=''):
+    """
+    Synthetic energy prices ($/MWh) indexed by date strings, with either 24 hourly columns (blocks=None), or piecewise
+    price blocks and their durations (see energy_prices/piecewise_linearization).
+    :return: A tuple of (prices, block durations), where block durations is None for hourly prices
+    """
+    dates = pd.DatetimeIndex([])
+    for year in sorted(set(price_years)):
+        freq = 'MS' if monthly else 'D'
+        dates = dates.append(pd.date_range('{}-01-01'.format(year), '{}-12-31'.format(year), freq=freq))
+    rng = _rng('energy prices', key)
+    seasonal = 40 + 10 * np.cos(2 * np.pi * (dates.dayofyear.values - 200) / 365)
+    hours = np.arange(24)
+    daily_shape = 1 + 0.3 * np.sin(np.pi * (hours - 6) / 14).clip(0)
+    hourly = seasonal[:, None] * daily_shape[None, :] * rng.lognormal(0, 0.1, (len(dates), 24))
+    index = pd.Index(dates.strftime('%Y-%m-%d'), name='Date')
+    if blocks is None:
+        return pd.DataFrame(hourly.round(2), index=index, columns=[str(h + 1) for h in hours]), None
+
+    # descending prices, split into blocks of equal duration
+    hourly = -np.sort(-hourly, axis=1)
+    splits = np.array_split(np.arange(24), blocks)
+    prices = np.stack([hourly[:, s].mean(axis=1) for s in splits], axis=1)
+    durations = np.stack([np.full(len(dates), len(s) / 24) for s in splits], axis=1)
+    columns = [str(b + 1) for b in range(blocks)]
+    return pd.DataFrame(prices, index=index, columns=columns), pd.DataFrame(durations, index=index, columns=columns)
+
+
+def _index(kind, spec, start, end, node_names):
+    days = _calendar_days()
+    if kind == MONTH_DAY:
+        return pd.Index(['{}-{}'.format(d.month, d.day) for d in days])
+    elif kind == MONTH_SLASH_DAY:
+        return pd.Index(['{}/{}'.format(d.month, d.day) for d in days])
+    elif kind == MM_DD:
+        return pd.Index(['{:02}-{:02}'.format(d.month, d.day) for d in days])
+    elif kind == DATE_1900:
+        return pd.Index(['1900-{:02}-{:02}'.format(d.month, d.day) for d in days])
+    elif kind == MDY_1900:
+        return pd.Index(['{}/{}/1900'.format(d.month, d.day) for d in days])
+    elif kind == MONTH_AND_DAY:
+        return pd.MultiIndex.from_tuples([(d.month, d.day) for d in days], names=['month', 'day'])
+    elif kind == MONTH:
+        return pd.Index(range(1, 13))
+    elif kind == WATER_YEAR:
+        return pd.Index(_water_years(start, end))
+    elif kind == NODE:
+        return pd.Index(node_names, name=spec.get('index_name'))
+    else:
+        return pd.Index(spec.get('rows', range(366)))
+
+
+def synthetic_management_table(name, spec, start, end, node_names):
+    """
+    Synthesize a management table from its entry in MANAGEMENT_TABLES.
+    """
+    rng = _rng(name)
+    low, high = spec.get('low', 0), spec.get('high', 1)
+
+    if spec['index'] is None:
+        # a grid with row and column labels in the first column and row (e.g., ESRD curves)
+        grid = np.sort(rng.uniform(low, high, (21, 21)), axis=0)
+        grid[0, :] = np.linspace(0, 100, 21)
+        grid[:, 0] = np.linspace(0, 100, 21)
+        return pd.DataFrame(grid)
+
+    index = _index(spec['index'], spec, start, end, node_names)
+
+    if name == 'SJ restoration flows':
+        return pd.DataFrame({
+            'WYT': rng.randint(1, 6, len(index)),
+            'Allocation adjustment': rng.uniform(0.8, 1.0, len(index))
+        }, index=index)
+
+    columns = spec.get('columns')
+    if columns == 'big creek':
+        columns = list(range(1, 13)) + ['{}-{}'.format(m, d) for m in [11, 12, 4, 9] for d in [1, 16]]
+    if columns is None:
+        values = rng.uniform(low, high, len(index))
+        return pd.Series(values.astype(spec.get('dtype', float)), index=index, name='value')
+    if isinstance(columns, list) and columns and isinstance(columns[0], tuple):
+        columns = pd.MultiIndex.from_tuples(columns)
+    values = rng.uniform(low, high, (len(index), len(columns)))
+    return pd.DataFrame(values.astype(spec.get('dtype', float)), index=index, columns=columns)
+
+
+def _fixture_for(name, url, spec, start, end, node_names, price_years):
+    """
+    Get the synthetic data for a table or dataframe parameter, based on the data it holds (from its url and name).
+    :return: A dataframe or series, or None if the data type is not known
+    """
+    path = url.replace('\\', '/')
+    filename = os.path.basename(path)
+    basin_dir = next((b for b in BASIN_SCALES if '/{}/'.format(b) in path), None)
+    scale = BASIN_SCALES.get(basin_dir, 1.0)
+
+    # run a few years either side of the model dates, for lookups of previous and next years
+    dates = pd.date_range('{}-10-01'.format(start.year - 2), '{}-09-30'.format(end.year + 2), freq='D')
+
+    if '/runoff_monthly_forecasts/' in path:
+        daily_flow = synthetic_runoff(dates, path.replace('/runoff_monthly_forecasts/', '/runoff_aggregated/'), scale)
+        return synthetic_monthly_forecasts(daily_flow)
+
+    if '/runoff_aggregated/' in path or '/runoff/' in path:
+        column = spec.get('column', 'flow')
+        df = synthetic_runoff(dates, path, scale).to_frame(column)
+        df.index.name = 'Date'
+        return df
+
+    if filename.startswith('full_natural_flow') or filename.startswith('precipitation'):
+        fnf = synthetic_runoff(dates, os.path.dirname(path), scale * 10)
+        if 'annual' in filename:
+            water_years = np.where(fnf.index.month >= 10, fnf.index.year + 1, fnf.index.year)
+            fnf = fnf.groupby(water_years).sum()
+            fnf.index.name = 'WY'
+        elif 'monthly' in filename:
+            fnf = fnf.resample('MS').sum()
+            fnf.index.name = 'date'
+        else:
+            fnf.index.name = 'date'
+        return fnf.to_frame('flow')
+
+    if filename == 'exceedance_forecast_mcm.csv':
+        fnf = synthetic_runoff(dates, os.path.dirname(path), scale * 10).resample('MS').sum()
+        months = list(range(3, 10))
+        years = _water_years(start, end)
+        rows = [[fnf.get(pd.Timestamp(year, m, 1), 0.0) for m in months] for year in years for _ in months]
+        index = pd.MultiIndex.from_product([years, months], names=['year', 'month'])
+        columns = pd.MultiIndex.from_tuples([(m, 50) for m in months], names=['month', 'exceedance'])
+        df = pd.DataFrame(rows, index=index, columns=columns)
+        df[('sum', 50)] = df.sum(axis=1)
+        return df
+
+    if filename == 'SJVI.csv':
+        years = _water_years(start, end)
+        return pd.Series(_rng(path).uniform(1.5, 5.0, len(years)), index=pd.Index(years, name='Date'), name='SJVI')
+
+    if name in WYT_TABLES:
+        low, high = WYT_TABLES[name]
+        years = _water_years(start, end)
+        return pd.Series(_rng(path).randint(low, high + 1, len(years)), index=pd.Index(years, name='WY'),
+                         name='WYT')
+
+    if name == 'Peak Donnells Runoff':
+        years = _water_years(start, end)
+        peaks = ['{}-{:02}-{:02}'.format(y, 5, 1 + _rng(path, y).randint(0, 30)) for y in years]
+        return pd.Series(peaks, index=pd.Index(years, name='year'), name='peak date')
+
+    if 'energy prices' in path:
+        monthly = 'monthly' in filename
+        if filename.startswith('prices_pivoted'):
+            return synthetic_energy_prices(price_years, key=filename)[0]
+        blocks = MONTHLY_BLOCKS if monthly else DAILY_BLOCKS
+        prices, durations = synthetic_energy_prices(price_years, blocks=blocks, monthly=monthly, key=filename)
+        return durations if 'blocks' in filename else prices
+
+    if name == 'Initial Storage':
+        df = pd.DataFrame([[0.8] * len(node_names)], columns=node_names,
+                          index=pd.Index([start.strftime('%Y-%m-%d')], name='Date'))
+        return df
+
+    if name in MANAGEMENT_TABLES:
+        return synthetic_management_table(name, MANAGEMENT_TABLES[name], start, end, node_names)
+
+    return None
+
+
+def _write(df, path, spec):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    if path.endswith('.xlsx'):
+        sheet_name = spec.get('sheet_name', 'Sheet1')
+        mode = 'a' if os.path.exists(path) else 'w'
+        kwargs = dict(if_sheet_exists='replace') if mode == 'a' else {}
+        with pd.ExcelWriter(path, engine='openpyxl', mode=mode, **kwargs) as writer:
+            # skiprows=[0] in the model, so add a title row
+            df.to_excel(writer, sheet_name=sheet_name, startrow=1)
+    else:
+        df.to_csv(path, header=spec.get('header', 0) is not None, index='index_col' in spec)
+
+
+def _data_items(model_json):
+    for part in ['tables', 'parameters']:
+        for name, item in model_json.get(part, {}).items():
+            if isinstance(item, dict) and item.get('url'):
+                yield name, item
+
+
+def write_fixtures(model_jsons, fixtures_path, start, end, data_path=None, price_years=None):
+    """
+    Write synthetic data for every table and dataframe parameter in a set of assembled models, as needed to run them
+    without SIERRA_DATA_PATH. The models should already point to the fixtures folder (i.e., assembled with
+    data_path=fixtures_path). Existing files are left as they are.
+
+    Hydrology (runoff, full natural flow, forecasts, SJVI, water year types) and energy prices are always synthetic.
+    Management tables are copied from data_path, if given and the file exists there, and otherwise synthesized.
+    :param model_jsons: The model definitions (e.g., daily and planning)
+    :param fixtures_path: The fixtures folder
+    :param start: The model start date
+    :param end: The model end date
+    :param data_path: The real data folder, if any
+    :param price_years: Energy price years to include (the model dates and 2009 by default)
+    :return: A dict of status: number of files, where status is synthetic, copied, or missing
+    """
+    start = pd.Timestamp(start)
+    end = pd.Timestamp(end)
+    price_years = price_years or [2009] + list(range(start.year, end.year + 1))
+    counts = dict(synthetic=0, copied=0, missing=0)
+
+    written = set()
+    for model_json in model_jsons:
+        node_names = [node['name'] for node in model_json.get('nodes', [])]
+        for name, spec in _data_items(model_json):
+            path = os.path.normpath(spec['url'])
+            key = (path, spec.get('sheet_name'))
+            if key in written or (os.path.exists(path) and not path.endswith('.xlsx')):
+                continue
+            written.add(key)
+
+            relative_path = os.path.relpath(path, fixtures_path)
+            real_path = os.path.join(data_path, relative_path) if data_path else None
+            is_management = '/management/' in path.replace('\\', '/') or name in MANAGEMENT_TABLES
+            if is_management and real_path and os.path.exists(real_path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                shutil.copyfile(real_path, path)
+                counts['copied'] += 1
+                continue
+
+            df = _fixture_for(name, path, spec, start, end, node_names, price_years)
+            if df is None:
+                logger.warning('No fixture for {} ({})'.format(name, relative_path))
+                counts['missing'] += 1
+                continue
+
+            try:
+                _write(df, path, spec)
+            except ImportError:
+                logger.warning('openpyxl is needed to write {}'.format(relative_path))
+                counts['missing'] += 1
+                continue
+            counts['synthetic'] += 1
+
+    return counts
@@ -0,0 +1,129 @@
+"""
+Compare planning schedules (see utilities.planning_schedule): the run time of a basin model with each schedule vs. the
+hydropower revenue it earns, on the historical Livneh climate.
+
+Run from the pywr_models folder, with SIERRA_DATA_PATH set, e.g.:
+
+    python -m benchmarks.planning_schedules -b stanislaus -s 2000 -y 5
+"""
+
+import os
+import sys
+import time
+import argparse
+import numpy as np
+from loguru import logger
+
+here = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+sys.path.insert(0, os.path.dirname(here))  # for pywr_models.utilities, used by the planning model
+
+from run_basin_model import prepare_model_files, register_components, load_planning_model, load_daily_model, \
+    get_planning_schedule, simulate
+from utilities.results import _recorder_data
+from utilities.cache import dump_json
+from benchmarks.run_benchmarks import PLANNING_BASINS, CLIMATE, get_metadata
+
+SCHEDULES = {
+    'monthly': dict(),
+    'quarterly': dict(interval=3),
+    'water year': dict(interval=12),
+    'monthly, shrinking horizon': dict(shrink_horizon=True),
+    'quarterly, shrinking horizon': dict(interval=3, shrink_horizon=True),
+    'water year, storage deviation > 10%': dict(interval=12, storage_threshold=0.1),
+    'water year, forecasts Feb-May': dict(interval=12, forecast_months=[2, 3, 4, 5]),
+}
+
+
+def get_hydropower_revenue(model):
+    """
+    Estimate the hydropower revenue of a model run: the energy of each powerhouse on each day, times the mean energy
+    price of that day in the price year of each scenario.
+    :return: The total revenue ($) of each scenario
+    """
+    from recorders.hydropower import HydropowerEnergyRecorder
+
+    daily_prices = model.tables['All Energy Price Values'].mean(axis=1)
+    dates = model.timestepper.datetime_index
+    revenue = np.zeros(len(model.scenarios.combinations))
+    energy = sum(_recorder_data(r) for r in model.recorders if isinstance(r, HydropowerEnergyRecorder))  # MWh
+    for scenario_index in model.scenarios.combinations:
+        price_year = int(model.parameters['Price Year'].get_value(scenario_index))
+        # as in PH_Water_Demand, Feb 29 uses Feb 28 prices
+        price_dates = ['{}-02-28'.format(price_year) if (d.month, d.day) == (2, 29)
+                       else d.strftime('{}-%m-%d'.format(price_year)) for d in dates]
+        prices = daily_prices.reindex(price_dates).values
+        revenue[scenario_index.global_id] = np.nansum(energy[:, scenario_index.global_id] * prices)
+    return revenue
+
+
+def run_schedule(basin, model_path, planning_model_path, settings, planning_months=12):
+    """
+    Run a basin model with a planning schedule.
+    :return: A dict with the run time, the number of planning model runs (by reason) and the hydropower revenue
+    """
+    planning_model = load_planning_model(planning_model_path)
+    # the revenue is calculated from the whole run, so keep all the results in the recorders
+    model = load_daily_model(model_path, planning_model=planning_model, planning_months=planning_months,
+                             windowed=False)
+    planning_schedule = get_planning_schedule(settings, planning_months)
+    planning_schedule.set_planning_models(model.planning, planning_model_path, load_planning_model)
+
+    t0 = time.perf_counter()
+    simulate(model, planning_schedule=planning_schedule)
+    seconds = time.perf_counter() - t0
+
+    return dict(
+        seconds=seconds,
+        planning_runs=sum(planning_schedule.plans.values()),
+        plans=dict(planning_schedule.plans),
+        revenue=get_hydropower_revenue(model).mean(),
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare run time and hydropower revenue of planning schedules')
+    parser.add_argument("-b", "--basin", help="Basin", choices=PLANNING_BASINS, default='stanislaus')
+    parser.add_argument("-s", "--start_year", help="Start year", type=int, default=2000)
+    parser.add_argument("-y", "--years", help="Years to run", type=int, default=5)
+    parser.add_argument("-m", "--planning_months", help="Planning months", type=int, default=12)
+    parser.add_argument("-n", "--schedules", help="Schedules to compare (default: all)", nargs='+',
+                        choices=list(SCHEDULES))
+    parser.add_argument("-o", "--output", help="Output file (JSON)")
+    args = parser.parse_args()
+
+    os.chdir(here)  # components are registered from paths relative to pywr_models
+
+    try:
+        data_path = os.environ['SIERRA_DATA_PATH']
+    except KeyError:
+        raise Exception("SIERRA_DATA_PATH must be defined in your environment")
+
+    start = '{}-10-01'.format(args.start_year)
+    end = '{}-09-30'.format(args.start_year + args.years)
+
+    # build the planning models for all horizons, for the shrinking horizon schedules
+    model_path, planning_model_path = prepare_model_files(
+        args.basin, CLIMATE, start, end, data_path=data_path, include_planning=True,
+        planning_months=args.planning_months, planning_horizons=list(range(1, args.planning_months + 1)))
+    register_components(args.basin, model_paths=[model_path, planning_model_path])
+
+    results = dict(metadata=get_metadata(start, end, True, args.planning_months), basin=args.basin, schedules={})
+    for name in args.schedules or SCHEDULES:
+        logger.info('Running {} with {} planning'.format(args.basin, name))
+        results['schedules'][name] = run_schedule(args.basin, model_path, planning_model_path, SCHEDULES[name],
+                                                  planning_months=args.planning_months)
+
+    baseline = results['schedules'].get('monthly')
+    logger.info('{:<36} {:>10} {:>8} {:>14} {:>9}'.format('schedule', 'seconds', 'plans', 'revenue ($M)', 'change'))
+    for name, result in results['schedules'].items():
+        change = result['revenue'] / baseline['revenue'] - 1 if baseline and baseline['revenue'] else np.nan
+        logger.info('{:<36} {:>10.1f} {:>8} {:>14.2f} {:>+9.2%}'.format(
+            name, result['seconds'], result['planning_runs'], result['revenue'] / 1e6, change))
+
+    if args.output:
+        dump_json(results, args.output, indent=2)
+        logger.info('Results saved to {}'.format(args.output))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,312 @@
+"""
+Benchmark the stages of a basin model run with synthetic data, so that performance can be compared across commits.
+
+Run from the pywr_models folder, e.g.:
+
+    python -m benchmarks.run_benchmarks -y 2 -p
+    python -m benchmarks.run_benchmarks -y 2 -p -c benchmarks/baselines/<commit>.json
+"""
+
+import os
+import sys
+import json
+import copy
+import time
+import shutil
+import platform
+import argparse
+import subprocess
+import tempfile
+from datetime import datetime
+from statistics import median
+from loguru import logger
+
+here = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+sys.path.insert(0, os.path.dirname(here))  # for pywr_models.utilities, used by the planning model
+
+from run_basin_model import assemble_model, register_components, set_scheduling_end
+from utilities import simplify_network, prepare_planning_model
+from utilities.cache import dump_json
+from utilities.monthly_tables import get_monthly_tables_path, build_monthly_tables
+from utilities.inflow_store import get_inflow_sources, get_inflow_store_path, build_inflow_store, use_inflow_store
+from utilities.hydrology_store import build_hydrology_store, use_hydrology_store
+from benchmarks.fixtures import write_fixtures
+
+BASINS = ['stanislaus', 'tuolumne', 'merced', 'upper_san_joaquin']
+PLANNING_BASINS = ['stanislaus', 'upper_san_joaquin']
+CLIMATE = 'historical/Livneh'
+
+STAGES = ['assemble', 'simplify', 'inflow store', 'planning model', 'hydrology store', 'load', 'setup', 'daily step',
+          'planning step', 'save results']
+
+
+def get_git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=here,
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def get_metadata(start, end, include_planning, planning_months):
+    try:
+        import pywr
+        pywr_version = pywr.__version__
+    except ImportError:
+        pywr_version = None
+    return dict(
+        commit=get_git_commit(),
+        date=datetime.now().isoformat(),
+        python=platform.python_version(),
+        pywr=pywr_version,
+        platform=platform.platform(),
+        start=start,
+        end=end,
+        include_planning=include_planning,
+        planning_months=planning_months,
+    )
+
+
+def timed(fn, *args, **kwargs):
+    t0 = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, time.perf_counter() - t0
+
+
+def prepare_basin(basin, start, end, fixtures_path, work_path, include_planning=False, planning_months=12,
+                  data_path=None):
+    """
+    Assemble the model files for a basin with data from the fixtures folder, writing any missing fixtures.
+    :return: A tuple of (stage timings, daily model path, planning model path or None, fixture counts)
+    """
+    timings = {}
+    model_json, timings['assemble'] = timed(assemble_model, basin, CLIMATE, start, end, data_path=fixtures_path)
+    model_json, timings['simplify'] = timed(simplify_network, model_json, basin=basin, climate=CLIMATE,
+                                            delete_gauges=True, delete_observed=True)
+    model_path = os.path.join(work_path, basin, 'pywr_model_simplified.json')
+    os.makedirs(os.path.dirname(model_path), exist_ok=True)
+    dump_json(model_json, model_path)
+
+    # the daily data is needed to build the planning model's monthly tables
+    counts = write_fixtures([model_json], fixtures_path, start, end, data_path=data_path)
+
+    # as in prepare_model_files, the daily model reads its inflows from one store
+    inflow_sources = get_inflow_sources(model_json)
+    if inflow_sources:
+        def prepare_inflows():
+            inflow_store_path = get_inflow_store_path(os.path.join(work_path, basin), CLIMATE)
+            build_inflow_store(inflow_sources, inflow_store_path)
+            dump_json(use_inflow_store(copy.deepcopy(model_json), inflow_sources, inflow_store_path), model_path)
+
+        _, timings['inflow store'] = timed(prepare_inflows)
+
+    planning_model_path = None
+    if include_planning and basin in PLANNING_BASINS:
+        planning_model_path = os.path.join(work_path, basin, 'pywr_model_monthly.json')
+        monthly_tables_path = get_monthly_tables_path(os.path.join(work_path, basin), CLIMATE)
+
+        def prepare_planning():
+            sources = prepare_planning_model(copy.deepcopy(model_json), basin, CLIMATE, planning_model_path,
+                                             steps=planning_months, remove_rim_dams=True,
+                                             monthly_tables_path=monthly_tables_path)
+            build_monthly_tables(sources, monthly_tables_path)
+
+        _, timings['planning model'] = timed(prepare_planning)
+        with open(planning_model_path) as f:
+            planning_counts = write_fixtures([json.load(f)], fixtures_path, start, end, data_path=data_path)
+        counts = {k: counts[k] + planning_counts[k] for k in counts}
+
+    # as in prepare_model_files, hydrology data is mapped from the binary store rather than parsed from CSV files
+    _, timings['hydrology store'] = timed(build_hydrology_store, fixtures_path)
+    for path in [model_path, planning_model_path]:
+        if path:
+            with open(path) as f:
+                dump_json(use_hydrology_store(json.load(f)), path)
+
+    return timings, model_path, planning_model_path, counts
+
+
+def run_basin(basin, model_path, planning_model_path=None, planning_months=12, results_path=None):
+    """
+    Load, set up and run a basin model, timing each stage.
+    :return: A dict of stage timings, with step timings as the mean per step
+    """
+    from pywr.core import Model
+    from utilities.climates import load_climate_tables
+    from utilities.hydrology_store import load_store_tables
+    from utilities.results import ResultsWriter
+
+    timings = {}
+    register_components(basin, model_paths=[model_path, planning_model_path])
+
+    def load(path):
+        with open(path) as f:
+            model_json = json.load(f)
+        model, seconds = timed(Model.load, model_json, path=path)
+        load_store_tables(model, model_json)
+        load_climate_tables(model, model_json)
+        timings['load'] = timings.get('load', 0) + seconds
+        return model
+
+    planning_model = None
+    if planning_model_path:
+        planning_model = load(planning_model_path)
+        planning_model.mode = 'planning'
+        _, timings['setup'] = timed(planning_model.setup)
+
+    model = load(model_path)
+    _, seconds = timed(model.setup)
+    timings['setup'] = timings.get('setup', 0) + seconds
+
+    model.mode = 'scheduling'
+    model.planning = planning_model
+    if planning_model:
+        set_scheduling_end(model, planning_months)
+        model.planning.scheduling = model
+
+    daily_seconds = []
+    planning_seconds = []
+    for date in model.timestepper.datetime_index:
+        if planning_model and date.day == 1:
+            t0 = time.perf_counter()
+            planning_model.reset(start=date.to_timestamp())
+            planning_model.step()
+            planning_seconds.append(time.perf_counter() - t0)
+        _, seconds = timed(model.step)
+        daily_seconds.append(seconds)
+
+    timings['daily step'] = sum(daily_seconds) / len(daily_seconds)
+    if planning_seconds:
+        timings['planning step'] = sum(planning_seconds) / len(planning_seconds)
+
+    results_writer = ResultsWriter(model, results_path, 'benchmark')
+    t0 = time.perf_counter()
+    results_writer.start()
+    results_writer.write(len(model.timestepper.datetime_index))
+    results_writer.to_csv()
+    timings['save results'] = time.perf_counter() - t0
+    results_writer.remove()
+
+    return timings
+
+
+def benchmark_basin(basin, start, end, fixtures_path, work_path, include_planning=False, planning_months=12,
+                    data_path=None, repeat=1):
+    """
+    Benchmark a basin, taking the median of each stage over repeated runs.
+    :return: A dict with the stage timings (seconds; per step for the step stages), the fixtures written, and an error
+        message if the model could not be run
+    """
+    runs = []
+    result = dict(stages={})
+    for i in range(repeat):
+        timings, model_path, planning_model_path, counts = prepare_basin(
+            basin, start, end, fixtures_path, work_path, include_planning=include_planning,
+            planning_months=planning_months, data_path=data_path)
+        if i == 0:
+            result['fixtures'] = counts
+        try:
+            timings.update(run_basin(basin, model_path, planning_model_path, planning_months=planning_months,
+                                     results_path=os.path.join(work_path, basin, 'results')))
+        except Exception as err:
+            logger.exception(err)
+            result['error'] = '{}: {}'.format(type(err).__name__, err)
+        runs.append(timings)
+
+    for stage in STAGES:
+        values = [run[stage] for run in runs if stage in run]
+        if values:
+            result['stages'][stage] = median(values)
+
+    return result
+
+
+def compare(baseline, current, threshold=0.1):
+    """
+    Compare benchmark results with a baseline, logging the change in each stage.
+    :param threshold: The fractional increase in time above which a stage is reported as slower
+    :return: A list of (basin, stage, change) for stages that are slower than the threshold
+    """
+    logger.info('Comparing {} with baseline {}'.format(current['metadata']['commit'], baseline['metadata']['commit']))
+    regressions = []
+    for basin, result in current['basins'].items():
+        baseline_stages = baseline['basins'].get(basin, {}).get('stages', {})
+        for stage, seconds in result['stages'].items():
+            baseline_seconds = baseline_stages.get(stage)
+            if not baseline_seconds:
+                continue
+            change = seconds / baseline_seconds - 1
+            flag = ''
+            if change > threshold:
+                flag = ' <-- slower'
+                regressions.append((basin, stage, change))
+            elif change < -threshold:
+                flag = ' <-- faster'
+            logger.info('{:<18} {:<14} {:>10.4f} s {:>10.4f} s {:>+7.1%}{}'.format(
+                basin, stage, baseline_seconds, seconds, change, flag))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark basin model stages with synthetic data')
+    parser.add_argument("-b", "--basins", help="Basins to benchmark (default: all)", nargs='+', choices=BASINS)
+    parser.add_argument("-s", "--start_year", help="Start year", type=int, default=2000)
+    parser.add_argument("-y", "--years", help="Years to run", type=int, default=2)
+    parser.add_argument("-p", "--include_planning", help="Include planning model", action='store_true')
+    parser.add_argument("-m", "--planning_months", help="Planning months", type=int, default=12)
+    parser.add_argument("-r", "--repeat", help="Number of times to repeat each benchmark", type=int, default=1)
+    parser.add_argument("-f", "--fixtures", help="Fixtures folder (created if needed)",
+                        default=os.path.join(tempfile.gettempdir(), 'sierra-pywr-fixtures'))
+    parser.add_argument("-o", "--output", help="Output file (default: benchmarks/baselines/<commit>.json)")
+    parser.add_argument("-c", "--compare", help="Baseline file to compare with")
+    parser.add_argument("-t", "--threshold", help="Fractional slowdown to report as a regression", type=float,
+                        default=0.1)
+    args = parser.parse_args()
+
+    os.chdir(here)  # components are registered from paths relative to pywr_models
+
+    # management tables are copied from the real data, if available
+    data_path = os.environ.get('SIERRA_DATA_PATH')
+    fixtures_path = os.path.abspath(args.fixtures)
+    os.environ['SIERRA_DATA_PATH'] = fixtures_path  # used by simplify_network
+
+    start = '{}-10-01'.format(args.start_year)
+    end = '{}-09-30'.format(args.start_year + args.years)
+
+    results = dict(
+        metadata=get_metadata(start, end, args.include_planning, args.planning_months),
+        basins={}
+    )
+
+    work_path = tempfile.mkdtemp(prefix='sierra-pywr-benchmark-')
+    try:
+        for basin in args.basins or BASINS:
+            logger.info('Benchmarking {}'.format(basin))
+            result = benchmark_basin(basin, start, end, fixtures_path, work_path,
+                                     include_planning=args.include_planning, planning_months=args.planning_months,
+                                     data_path=data_path, repeat=args.repeat)
+            results['basins'][basin] = result
+            for stage, seconds in result['stages'].items():
+                logger.info('{:<18} {:<14} {:>10.4f} s'.format(basin, stage, seconds))
+            if 'error' in result:
+                logger.warning('{}: {}'.format(basin, result['error']))
+    finally:
+        shutil.rmtree(work_path, ignore_errors=True)
+
+    output = args.output or os.path.join(here, 'benchmarks', 'baselines',
+                                         '{}.json'.format(results['metadata']['commit'] or 'latest'))
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    dump_json(results, output, indent=2)
+    logger.info('Benchmark results saved to {}'.format(output))
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(baseline, results, threshold=args.threshold)
+        if regressions:
+            logger.warning('{} stages are slower than the baseline'.format(len(regressions)))
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,179 @@
+"""
+Benchmark network simplification (utilities.network.simplify_network) on the base model of each basin, as it is used
+to run a basin model, to build the planning model (from the simplified daily model) and to aggregate subwatersheds.
+The reduced networks are checked against the original node-by-node reduction, which is also timed.
+
+Run from the pywr_models folder, e.g.:
+
+    python -m benchmarks.simplify_network -r 5
+"""
+
+import os
+import sys
+import copy
+import json
+import time
+import argparse
+from statistics import median
+from loguru import logger
+
+here = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+sys.path.insert(0, os.path.dirname(here))  # for pywr_models.utilities, used by the planning model
+
+from utilities.network import simplify_network, reduce_network
+from utilities.cache import dump_json
+from benchmarks.run_benchmarks import BASINS, CLIMATE, get_git_commit
+
+USES = {
+    'daily': dict(delete_gauges=True, delete_observed=True),
+    'planning': dict(delete_gauges=True, delete_observed=True, delete_scenarios=False),
+    'subwatersheds': dict(scenario_path='.', delete_gauges=True, delete_observed=True, delete_scenarios=True,
+                          aggregate_runoff=False),
+}
+
+
+def reduce_network_reference(nodes, edges, delete_gauges=False):
+    """
+    The original network reduction, which scans the node list from the top after removing each node.
+    :return: A tuple of (nodes, edges, names of removed nodes)
+    """
+    obsolete_nodes = []
+    mission_complete = False
+    while not mission_complete:
+        mission_complete = True
+        up_nodes = []
+        down_nodes = []
+        up_edges = {}
+        down_edges = {}
+        for edge in edges:
+            a, b = edge
+            up_nodes.append(a)
+            down_nodes.append(b)
+            down_edges[a] = [edge] if a not in down_edges else down_edges[a] + [edge]
+            up_edges[b] = [edge] if b not in up_edges else up_edges[b] + [edge]
+
+        obsolete_edges = []
+        new_edges = []
+        node_lookup = {n['name']: n for n in nodes}
+
+        for node in nodes:
+            node_name = node['name']
+            node_type = node['type'].lower()
+            metadata = json.loads(node.get('comment', '{}'))
+            keys_set = set(node.keys())
+
+            if len({'cost', 'max_flow'} & keys_set) >= 1 and up_nodes.count(node_name) == 1 \
+                    and down_nodes.count(node_name) == 1 \
+                    and 'hydropower' not in node_type \
+                    and 'reservoir' not in node_type:
+                up_edge = up_edges[node_name][0]
+                up_node = node_lookup[up_edge[0]]
+                down_edge = down_edges[node_name][0]
+                down_node = node_lookup[down_edge[1]]
+                if 'hydropower' in up_node['type'].lower() or 'hydropower' in down_node['type'].lower():
+                    obsolete_nodes.append(node_name)
+                    obsolete_edges.extend([up_edge, down_edge])
+                    new_edges.append([up_node['name'], down_node['name']])
+                    mission_complete = False
+                    break
+
+            if keys_set in [{'name', 'type'}, {'name', 'type', 'comment'}] and not metadata.get('keep') \
+                    or delete_gauges and node_type == 'rivergauge' \
+                    or node_type == 'reservoir' and not node.get('max_volume'):
+                if down_nodes.count(node_name) == 0:
+                    down_edge = down_edges[node_name][0]
+                    obsolete_nodes.append(node_name)
+                    obsolete_edges.append(down_edge)
+                    mission_complete = False
+                    break
+                elif up_nodes.count(node_name) == 1:
+                    down_edge = down_edges[node_name][0]
+                    obsolete_nodes.append(node_name)
+                    obsolete_edges.append(down_edge)
+                    for up_edge in up_edges[node_name]:
+                        obsolete_edges.append(up_edge)
+                        new_edges.append([up_edge[0], down_edge[1]])
+                    mission_complete = False
+                    break
+
+        nodes = [node for node in nodes if node['name'] not in obsolete_nodes]
+        edges = [edge for edge in edges if edge not in obsolete_edges] + new_edges
+        edges_set = []
+        for edge in edges:
+            if edge not in edges_set:
+                edges_set.append(edge)
+        edges = edges_set
+
+    return nodes, edges, obsolete_nodes
+
+
+def best_of(fn, repeat, *args, **kwargs):
+    """
+    Run a function on copies of its arguments, returning the result and the median time.
+    """
+    seconds = []
+    for i in range(repeat):
+        args_copy = copy.deepcopy(args)
+        t0 = time.perf_counter()
+        result = fn(*args_copy, **kwargs)
+        seconds.append(time.perf_counter() - t0)
+    return result, median(seconds)
+
+
+def benchmark_basin(basin, repeat=1, check=True):
+    """
+    Time network simplification of a basin for each use, and the reduction itself with both methods.
+    :return: A dict of use: timings and node counts
+    """
+    with open(os.path.join(here, 'models', basin, 'pywr_model.json')) as f:
+        base_model = json.load(f)
+
+    results = {}
+    for use, kwargs in USES.items():
+        model_json = base_model
+        if use == 'planning':
+            model_json = simplify_network(copy.deepcopy(base_model), basin=basin, climate=CLIMATE, **USES['daily'])
+        simplified, seconds = best_of(simplify_network, repeat, model_json, basin=basin, climate=CLIMATE, **kwargs)
+        result = dict(nodes=len(model_json['nodes']), simplified_nodes=len(simplified['nodes']), seconds=seconds)
+
+        delete_gauges = kwargs['delete_gauges']
+        reduced, result['reduce'] = best_of(reduce_network, repeat, model_json['nodes'], model_json['edges'],
+                                            delete_gauges=delete_gauges)
+        if check:
+            reference, result['reduce (reference)'] = best_of(
+                reduce_network_reference, repeat, model_json['nodes'], model_json['edges'],
+                delete_gauges=delete_gauges)
+            if reduced != reference:
+                raise Exception('The reduced {} network ({}) differs from the reference'.format(basin, use))
+        results[use] = result
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark network simplification')
+    parser.add_argument("-b", "--basins", help="Basins to benchmark (default: all)", nargs='+', choices=BASINS)
+    parser.add_argument("-r", "--repeat", help="Number of times to repeat each benchmark", type=int, default=3)
+    parser.add_argument("-n", "--no_check", help="Do not check (and time) the reference reduction",
+                        action='store_true')
+    parser.add_argument("-o", "--output", help="Output file (JSON)")
+    args = parser.parse_args()
+
+    os.environ.setdefault('SIERRA_DATA_PATH', '.')  # only used in urls
+
+    results = dict(metadata=dict(commit=get_git_commit(), repeat=args.repeat), basins={})
+    logger.info('{:<18} {:<14} {:>6} {:>6} {:>10} {:>10} {:>12}'.format(
+        'basin', 'use', 'nodes', 'left', 'simplify', 'reduce', 'reference'))
+    for basin in args.basins or BASINS:
+        results['basins'][basin] = benchmark_basin(basin, repeat=args.repeat, check=not args.no_check)
+        for use, result in results['basins'][basin].items():
+            logger.info('{:<18} {:<14} {:>6} {:>6} {:>8.4f} s {:>8.4f} s {:>10.4f} s'.format(
+                basin, use, result['nodes'], result['simplified_nodes'], result['seconds'], result['reduce'],
+                result.get('reduce (reference)', float('nan'))))
+
+    if args.output:
+        dump_json(results, args.output, indent=2)
+        logger.info('Results saved to {}'.format(args.output))
+
+
+if __name__ == '__main__':
+    main()
@@ -2,8 +2,11 @@ import os
 import json
 import argparse
 from itertools import product
-from run_basin_model import run_model
-from functools import partial
+from run_basin_model import run_model, run_models_warm, run_model_climates, get_run_dates, get_results_path, \
+    assemble_model
+from utilities.scheduler import get_manifest_path, get_file_suffix, read_runtime_history, order_jobs, \
+    get_pending_jobs, run_jobs
+from utilities.shared_tables import SharedTables, get_common_tables
 import pandas as pd
 from loguru import logger
 from dotenv import load_dotenv
@@ -24,6 +27,37 @@ parser.add_argument("-e", "--end_year", help="End year", type=int)
 parser.add_argument("-y", "--years", help="Years to run (useful for debugging)", type=int)
 parser.add_argument("-n", "--run_name", help="Run name")
 parser.add_argument("-pb", "--progress_bar", help="Show progress bar", action='store_true')
+parser.add_argument("-nc", "--no_cache", help="Rebuild model files instead of using cached ones", action='store_true')
+parser.add_argument("-w", "--warm", help="Keep each basin model loaded across climates", action='store_true')
+parser.add_argument("-cs", "--climate_scenario", help="Run climates with the same dates together, as a scenario",
+                    action='store_true')
+parser.add_argument("-r", "--resume", help="Skip jobs that have already finished for this run name and restart "
+                                           "unfinished ones from their last checkpoint", action='store_true')
+parser.add_argument("-rf", "--results_format", help="Results format: csv (default) or hdf5",
+                    choices=['csv', 'hdf5'], default='csv')
+parser.add_argument("-pr", "--profile", help="Time parameters, recorders, the LP solve and the planning model, and "
+                                            "save a ranked report for each basin", action='store_true')
+parser.add_argument("-nk", "--no_checkpoints", help="Do not save checkpoints at the end of each water year",
+                    action='store_true')
+parser.add_argument("-ip", "--incremental_planning", help="Reset the planning model incrementally each month and warm "
+                                                          "start its LP from the previous month", action='store_true')
+parser.add_argument("-pw", "--planning_workers", help="Number of processes to split the planning model scenarios "
+                                                      "across", type=int, default=1)
+parser.add_argument("-pi", "--planning_interval", help="Months between planning model runs, from the start of the "
+                                                       "water year (default: 1)", type=int, default=1,
+                    choices=[1, 2, 3, 4, 6, 12])
+parser.add_argument("-pd", "--planning_deviation", help="Also run the planning model when a reservoir's storage "
+                                                        "deviates from the plan by more than this fraction of its "
+                                                        "capacity", type=float)
+parser.add_argument("-pf", "--planning_forecast_months", help="Also run the planning model in these months (e.g., "
+                                                              "when forecasts are updated)", type=int, nargs='+')
+parser.add_argument("-ps", "--shrink_planning_horizon", help="End the planning horizon at the end of the water year",
+                    action='store_true')
+parser.add_argument("-pc", "--planning_cache", help="Number of planning model results to keep for reuse when a "
+                                                    "scenario's planning inputs repeat (default: 0, none)", type=int,
+                    default=0)
+parser.add_argument("-sp", "--save_planning", help="Save the decisions of each planning model run",
+                    action='store_true')
 args = parser.parse_args()
 
 basin = args.basin
@@ -94,7 +128,53 @@ if basin == 'all':
 else:
     basins = [basin]
 
-model_args = list(product(climate_scenarios, basins))
+# =============
+# Schedule jobs
+# =============
+
+manifest_path = get_manifest_path(run_name, debug=debug)
+
+# a resumed run keeps the file suffix of the run it resumes, so that its results are found again
+file_suffix = get_file_suffix(manifest_path, str(date.today()), resume=args.resume)
+
+years = {}
+for climate in climate_scenarios:
+    run_start, run_end = get_run_dates(climate, start, end)
+    years[climate] = int(run_end[:4]) - int(run_start[:4])
+
+results_paths = {}
+for climate, basin in product(climate_scenarios, basins):
+    results_paths[(climate, basin)] = get_results_path(run_name, basin, climate, file_suffix, debug=debug)
+
+jobs = list(product(climate_scenarios, basins))
+if args.resume:
+    pending_jobs = get_pending_jobs(jobs, manifest_path)
+    logger.info('Skipping {} finished jobs'.format(len(jobs) - len(pending_jobs)))
+    jobs = pending_jobs
+
+# longest first
+jobs = order_jobs(jobs, years, include_planning=include_planning, history=read_runtime_history(debug=debug))
+
+num_cores = args.num_cores or os.cpu_count() - 1
+
+if args.warm:
+    # one task per basin and group of climates, so each worker loads its model only once
+    num_groups = max(1, num_cores) if multiprocessing else 1
+    grouped_jobs = []
+    for basin in basins:
+        basin_climates = [c for c, b in jobs if b == basin]
+        for i in range(num_groups):
+            climate_group = basin_climates[i::num_groups]
+            if climate_group:
+                grouped_jobs.append((climate_group, basin))
+    jobs = grouped_jobs
+
+elif args.climate_scenario:
+    # one task per basin and set of climates that share the same dates
+    climate_groups = {}
+    for climate, basin in jobs:
+        climate_groups.setdefault((basin, get_run_dates(climate, start, end)), []).append(climate)
+    jobs = [(climates, basin) for (basin, dates), climates in climate_groups.items()]
 
 kwargs = dict(
     run_name=run_name,
@@ -108,30 +188,44 @@ kwargs = dict(
     data_path=data_path,
     scenarios=scenarios,
     show_progress=args.progress_bar,
-    file_suffix=str(date.today())
+    file_suffix=file_suffix,
+    use_cache=not args.no_cache,
+    checkpoint=not args.no_checkpoints,
+    resume=args.resume,
+    results_format=args.results_format,
+    profile=args.profile,
+    incremental_planning=args.incremental_planning,
+    planning_workers=args.planning_workers,
+    planning_cache=args.planning_cache,
+    planning_schedule=dict(
+        interval=args.planning_interval,
+        storage_threshold=args.planning_deviation,
+        forecast_months=args.planning_forecast_months,
+        shrink_horizon=args.shrink_planning_horizon
+    ),
+    save_planning=args.save_planning
 )
 
-if not multiprocessing:  # serial processing for debugging
-    for args in model_args:
-        run_model(*args, **kwargs)
-
+if args.climate_scenario:
+    run_fn = run_model_climates
+elif args.warm:
+    run_fn = run_models_warm
 else:
-    import multiprocessing as mp
-    num_cores = args.num_cores or mp.cpu_count() - 1
-
-    run_partial = partial(run_model, **kwargs)
-
-    if multiprocessing == 'joblib':
-        from joblib import Parallel, delayed
-        n_jobs = min(num_cores, len(climate_scenarios))
-        output = Parallel(n_jobs=n_jobs)(delayed(run_partial)(*args) for args in model_args)
-
-    else:
-        pool = mp.Pool(processes=num_cores)
-        for args in model_args:
-            pool.apply_async(run_partial, *args)
-
-        pool.close()
-        pool.join()
+    run_fn = run_model
+
+if jobs:
+    shared_tables = None
+    if multiprocessing:
+        # tables common to all basins (SJVI, energy prices) are loaded once here and mapped by the workers
+        model_jsons = [assemble_model(basin, climate, *get_run_dates(climate, start, end), scenarios=scenarios,
+                                      data_path=data_path) for climate, basin in product(climate_scenarios, basins)]
+        shared_tables = SharedTables(get_common_tables(model_jsons))
+        kwargs['shared_tables'] = shared_tables.descriptors
+    try:
+        run_jobs(run_fn, jobs, manifest_path, years, results_paths, multiprocessing=multiprocessing,
+                 num_cores=num_cores, **kwargs)
+    finally:
+        if shared_tables:
+            shared_tables.close()
 
 logger.info('Done!')
@@ -8,6 +8,8 @@ class Exchequer_Dam_Flood_Release_Requirement(WaterLPParameter):
     This policy calculates release from Exchequer Dam.
     """
 
+    state_attrs = ['wyt']
+
     esrd_spline = None
 
     zones = {
@@ -33,17 +35,19 @@ class Exchequer_Dam_Flood_Release_Requirement(WaterLPParameter):
         cols = table.iloc[0, 1:]
         values = table.values[1:, 1:]
         self.esrd_spline = interpolate.RectBivariateSpline(rows, cols, values, kx=1, ky=1)
+        self.wyt = ['normal'] * self.num_climates
 
     def before(self):
         super().before()
         if (self.model.timestep.month, self.model.timestep.day) == (10, 1):
-            SJVI = self.model.tables["San Joaquin Valley Index"][self.model.timestep.year + 1]
-            if SJVI <= 2.5:
-                self.wyt = 'dry'
-            elif SJVI < 3.8:
-                self.wyt = 'normal'
-            else:
-                self.wyt = 'wet'
+            for i, SJVI_table in enumerate(self.get_climate_tables("San Joaquin Valley Index")):
+                SJVI = SJVI_table[self.model.timestep.year + 1]
+                if SJVI <= 2.5:
+                    self.wyt[i] = 'dry'
+                elif SJVI < 3.8:
+                    self.wyt[i] = 'normal'
+                else:
+                    self.wyt[i] = 'wet'
 
     def _value(self, timestep, scenario_index):
 
@@ -52,7 +56,8 @@ class Exchequer_Dam_Flood_Release_Requirement(WaterLPParameter):
         # FLOOD RELEASE
 
         date_str = '1900-{:02}-{:02}'.format(timestep.month, timestep.day)
-        target_mcm = self.model.tables["Lake McClure/Guide Curve"].at[date_str, self.wyt] * 1233.5 / 1e6
+        wyt = self.wyt[self.get_climate(scenario_index)]
+        target_mcm = self.model.tables["Lake McClure/Guide Curve"].at[date_str, wyt] * 1233.5 / 1e6
         curr_inflow = self.model.parameters["Full Natural Flow"].value(timestep, scenario_index)
         lake_mcclure_volume = self.model.nodes["Lake McClure"].volume[scenario_index.global_id]
         flood_release_mcm = lake_mcclure_volume + curr_inflow - target_mcm
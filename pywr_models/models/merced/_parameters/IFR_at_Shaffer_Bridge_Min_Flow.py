@@ -9,6 +9,8 @@ class IFR_at_Shaffer_Bridge_Min_Flow(MinFlowParameter):
     This policy calculates instream flow requirements in the Merced River below the Merced Falls powerhouse.
     """
 
+    state_attrs = MinFlowParameter.state_attrs + ['nov_dec_mean', 'cowell_day_cnt']
+
     # initialize some values
     ferc_wyt = 1
     cowell_day_cnt = 0
@@ -30,7 +32,7 @@ class IFR_at_Shaffer_Bridge_Min_Flow(MinFlowParameter):
             return self.model.nodes["IFR at Shaffer Bridge"].prev_flow[scenario_index.global_id]
 
         # FERC REQUIREMENT
-        WYT = self.model.tables['WYT for IFR Below Exchequer'][self.operational_water_year]
+        WYT = self.get_table('WYT for IFR Below Exchequer', scenario_index)[self.operational_water_year]
         ferc_flow_req = self.ferc_req(timestep, scenario_index, WYT)
 
         # DAVIS-GRUNSKY AGREEMENT REQUIREMENT
@@ -4,23 +4,28 @@ from parameters import WaterLPParameter
 class Lake_McClure_Water_Demand(WaterLPParameter):
     """"""
 
+    state_attrs = ['wyt']
+
+    def setup(self):
+        super().setup()
+        self.wyt = [None] * self.num_scenarios
+
     def _value(self, timestep, scenario_index):
 
+        sid = scenario_index.global_id
         if (timestep.month, timestep.day) == (10, 1):
-            SJVI = self.model.tables["San Joaquin Valley Index"][timestep.year + 1]
-            # Note: this isn't exactly scenario safe, but self.wyt doesn't change between scenarios
-            # so is okay as is.
+            SJVI = self.get_table("San Joaquin Valley Index", scenario_index)[timestep.year + 1]
             if SJVI <= 2.5:
-                self.wyt = 'dry'
+                self.wyt[sid] = 'dry'
             elif SJVI < 3.8:
-                self.wyt = 'normal'
+                self.wyt[sid] = 'normal'
             else:
-                self.wyt = 'wet'
+                self.wyt[sid] = 'wet'
 
         curves_af = self.model.tables["Lake McClure/Guide Curve"]
         max_volume_mcm = self.model.nodes[self.res_name].max_volume.value(timestep, scenario_index)
         date_str = '1900-{:02}-{:02}'.format(timestep.month, timestep.day)
-        target_mcm = float(curves_af.at[date_str, self.wyt] * 1233.5 / 1e6)
+        target_mcm = float(curves_af.at[date_str, self.wyt[sid]] * 1233.5 / 1e6)
         target_fraction = min(target_mcm / max_volume_mcm, 1.0)
         return target_fraction
 
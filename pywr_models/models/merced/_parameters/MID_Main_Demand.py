@@ -7,7 +7,7 @@ class MID_Main_Demand(WaterLPParameter):
     """"""
 
     def _value(self, timestep, scenario_index):
-        WYT = self.model.tables['WYT for IFR Below Exchequer'][self.operational_water_year]
+        WYT = self.get_table('WYT for IFR Below Exchequer', scenario_index)[self.operational_water_year]
         ts = "{}/{}/1900".format(timestep.month, timestep.day)
         demand_cms = self.model.tables["MID Main Diversions"].at[ts, WYT] / 35.31
 
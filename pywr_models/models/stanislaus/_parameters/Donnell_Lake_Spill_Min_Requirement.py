@@ -6,11 +6,17 @@ from utilities.converter import convert
 class Donnell_Lake_Spill_Min_Requirement(MinFlowParameter):
     """"""
 
+    state_attrs = MinFlowParameter.state_attrs + ['peak_dt']
+
+    def setup(self):
+        super().setup()
+        self.peak_dt = [None] * self.num_scenarios
+
     def _value(self, timestep, scenario_index):
 
         # Default WYT is 3, for instances where we don't have pre-calculated WYT for the first operational water year
         # This is needed particularly for sequences.
-        WYT = self.model.tables["WYT P2005 & P2130"].get(self.operational_water_year, 3)
+        WYT = self.get_table("WYT P2005 & P2130", scenario_index).get(self.operational_water_year, 3)
 
         # Critically Dry: 1,Dry: 2,Normal-Dry: 3,Normal-Wet: 4,Wet: 5
         # Calculate regular IFR
@@ -20,9 +26,9 @@ class Donnell_Lake_Spill_Min_Requirement(MinFlowParameter):
         if self.mode == 'scheduling':
 
             if self.datetime.month == 10 and self.datetime.day == 1:
-                self.peak_dt = self.model.tables["Peak Donnells Runoff"][timestep.year + 1]
+                self.peak_dt[scenario_index.global_id] = self.get_table("Peak Donnells Runoff", scenario_index)[timestep.year + 1]
 
-            diff_day = (timestep.datetime - self.peak_dt).days
+            diff_day = (timestep.datetime - self.peak_dt[scenario_index.global_id]).days
             if 0 <= diff_day < 91:
                 data_supp = self.model.tables["Supplemental IFR below Donnell Lake"]
                 start_idx = diff_day - diff_day % 7
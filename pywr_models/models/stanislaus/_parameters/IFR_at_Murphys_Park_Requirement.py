@@ -6,6 +6,8 @@ from utilities.converter import convert
 
 class IFR_at_Murphys_Park_Requirement(MinFlowParameter):
     """"""
+    state_attrs = MinFlowParameter.state_attrs + ['year_type']
+
     year_type_thresholds = [100000, 140000, 320000, 400000, 500000]
     may_sep = [12, 16, 22, 26, 30]
     oct_mar = [12, 12, 16, 18, 18]
@@ -28,7 +30,7 @@ class IFR_at_Murphys_Park_Requirement(MinFlowParameter):
             operational_water_year = self.datetime.year - 1
 
         # default to 3 for first year of sequences
-        self.year_type[sid] = self.model.tables["WYT P2019"].get(operational_water_year, 3)
+        self.year_type[sid] = self.get_table("WYT P2019", scenario_index).get(operational_water_year, 3)
 
         # Calculate water year type based on Apr-Jul inflow forecast
         if month == 5 and self.datetime.day == 1:
@@ -8,7 +8,7 @@ class IFR_bl_Relief_Reservoir_Min_Requirement(MinFlowParameter):
 
     def _value(self, timestep, scenario_index):
 
-        WYT = self.model.tables["WYT P2005 & P2130"].get(self.operational_water_year, 3)
+        WYT = self.get_table("WYT P2005 & P2130", scenario_index).get(self.operational_water_year, 3)
         schedule = self.model.tables["IFR Below Relief Reservoir schedule"]
 
         month = self.datetime.month
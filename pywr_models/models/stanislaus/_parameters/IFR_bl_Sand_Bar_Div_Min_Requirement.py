@@ -5,6 +5,8 @@ from utilities.converter import convert
 class IFR_bl_Sand_Bar_Div_Min_Requirement(MinFlowParameter):
     """"""
 
+    state_attrs = MinFlowParameter.state_attrs + ['peak_dt']
+
     def setup(self):
         super().setup()
         num_scenarios = len(self.model.scenarios.combinations)
@@ -12,7 +14,7 @@ class IFR_bl_Sand_Bar_Div_Min_Requirement(MinFlowParameter):
 
     def _value(self, timestep, scenario_index):
 
-        WYT = self.model.tables["WYT P2005 & P2130"].get(self.operational_water_year, 3)
+        WYT = self.get_table("WYT P2005 & P2130", scenario_index).get(self.operational_water_year, 3)
         schedule = self.model.tables["IFR Below Sand Bar Div Schedule"]
 
         month = self.datetime.month
@@ -33,7 +35,7 @@ class IFR_bl_Sand_Bar_Div_Min_Requirement(MinFlowParameter):
 
         if self.mode == 'scheduling':
             if self.datetime.month == 10 and self.datetime.day == 1:
-                self.peak_dt[scenario_index.global_id] = self.model.tables["Peak Donnells Runoff"][timestep.year + 1]
+                self.peak_dt[scenario_index.global_id] = self.get_table("Peak Donnells Runoff", scenario_index)[timestep.year + 1]
             diff_day = (self.datetime - self.peak_dt[scenario_index.global_id]).days
             if 0 <= diff_day < 91:
                 data_supp = self.model.tables["Supplemental IFR below Sand Bar Div"]
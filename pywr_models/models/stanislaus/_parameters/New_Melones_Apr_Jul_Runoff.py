@@ -1,10 +1,13 @@
 import numpy as np
+from datetime import datetime
 from parameters import WaterLPParameter
 
 
 class New_Melones_Apr_Jul_Runoff(WaterLPParameter):
     """"""
 
+    state_attrs = ['apr_jul_runoff']
+
     def setup(self):
         super().setup()
         num_scenarios = len(self.model.scenarios.combinations)
@@ -15,9 +18,10 @@ class New_Melones_Apr_Jul_Runoff(WaterLPParameter):
         day = self.datetime.day
 
         if month == 4 and day == 1 or self.model.mode == 'planning' and month in [4, 5, 6, 7]:
-            start = '{:04}-04-01'.format(self.datetime.year)
-            end = '{:04}-07-31'.format(self.datetime.year)
-            self.apr_jul_runoff[scenario_index.global_id] = self.model.tables["Full Natural Flow"][start:end].sum() / 1.2335 * 1000
+            start = datetime(self.datetime.year, 4, 1)
+            end = datetime(self.datetime.year, 7, 31)
+            self.apr_jul_runoff[scenario_index.global_id] = \
+                self.get_table_sum("Full Natural Flow", start, end, scenario_index) / 1.2335 * 1000
 
         return self.apr_jul_runoff[scenario_index.global_id]
 
@@ -8,11 +8,24 @@ from utilities.converter import convert
 class New_Melones_Lake_Flood_Control_Requirement(WaterLPParameter):
     """"""
 
+    state_attrs = ['should_drawdown', 'storage_mcm', 'prev_storage_mcm']
+
     def setup(self):
         super().setup()
         num_scenarios = len(self.model.scenarios.combinations)
         self.should_drawdown = np.empty(num_scenarios, np.bool)
 
+        # storage at the start of this and the previous time step
+        self.storage_mcm = np.zeros(num_scenarios)
+        self.prev_storage_mcm = np.zeros(num_scenarios)
+
+    def before(self):
+        super().before()
+        if self.model.mode == 'planning':
+            return
+        self.prev_storage_mcm[:] = self.storage_mcm
+        self.storage_mcm[:] = self.model.nodes["New Melones Lake"].volume
+
     def _value(self, timestep, scenario_index):
 
         # For the planning model, we don't care about reservoir volume, at least for now
@@ -80,7 +93,8 @@ class New_Melones_Lake_Flood_Control_Requirement(WaterLPParameter):
             forecasted_target_storage_mcm = flood_curves.at[end_month_day, 'rainflood']
 
             # Get expected FNF inflow
-            forecasted_inflow_mcm = self.model.tables["Full Natural Flow"][self.datetime:forecast_date].sum()
+            forecasted_inflow_mcm = self.get_table_sum("Full Natural Flow", self.datetime, forecast_date,
+                                                       scenario_index)
 
             # Forecasted release volume
             release_mcm \
@@ -137,9 +151,7 @@ class New_Melones_Lake_Flood_Control_Requirement(WaterLPParameter):
 
         # Check if New Melones filled
         if drawdown_period and prev_storage_mcm > nov1_target and not self.should_drawdown[sid]:
-            day_before_yesterday = self.datetime + timedelta(days=-2)
-            prev_prev_storage_mcm = self.model.recorders["New Melones Lake/storage"].to_dataframe()\
-                                        .loc[day_before_yesterday].values[sid]
+            prev_prev_storage_mcm = self.prev_storage_mcm[sid]
             if prev_storage_mcm - prev_prev_storage_mcm <= 0:
                 self.should_drawdown[sid] = True
 
@@ -5,6 +5,8 @@ from parameters import WaterLPParameter
 class New_Melones_WYT(WaterLPParameter):
     """"""
 
+    state_attrs = ['wyt']
+
     def setup(self):
         super().setup()
         num_scenarios = len(self.model.scenarios.combinations)
@@ -22,7 +24,7 @@ class New_Melones_WYT(WaterLPParameter):
         # Step 1: Calculate New Melones Index (NMI), sum of Mar-Sep runoff and end-of-month storage
 
         # Get the Mar-Sep FNF runoff in AF
-        fnf_fcst_table = self.model.tables['Full Natural Flow Forecast']
+        fnf_fcst_table = self.get_table('Full Natural Flow Forecast', scenario_index)
         fnf_fcst_mcm = fnf_fcst_table.at[(year, month), ("sum", "50")]
 
         # Estimate end-of-Feb (Mar 1) storage
@@ -1,5 +1,5 @@
 from parameters import WaterLPParameter
-from calendar import isleap
+from utilities.energy_prices import get_price_cube
 
 
 class PH_Cost(WaterLPParameter):
@@ -9,18 +9,21 @@ class PH_Cost(WaterLPParameter):
 
     # baseline_median_daily_energy_demand = 768  # 768 GWh is median daily energy demand for 2009
 
+    price_year_param = None
+    prices = None
+
+    def setup(self):
+        super().setup()
+        self.price_year_param = self.model.parameters['Price Year']
+        self.prices = get_price_cube(self.model, 'Energy Price Values')
+
     def _value(self, timestep, scenario_index):
 
         # per-mcm value is a function of:
         # 1. electricity price
         # 2. generating potential, a function of generating efficiency, head, etc.
 
-        price_year = int(self.model.parameters['Price Year'].value(timestep, scenario_index))
-
-        if isleap(self.datetime.year) and self.datetime.month == 2 and self.datetime.day == 29:
-            price_date = self.datetime.strftime('{}-02-28'.format(price_year))
-        else:
-            price_date = self.datetime.strftime('{}-%m-%d'.format(price_year))
+        price_year = int(self.price_year_param.value(timestep, scenario_index))
 
         # price_per_kWh = self.model.tables["Energy Price Values"] \
         #     .at[price_date, str(self.block)]
@@ -32,8 +35,7 @@ class PH_Cost(WaterLPParameter):
         # pywr_cost = - (abs(price_per_mcm) / 100 + 100) * price_per_mcm / abs(price_per_mcm)
 
         if self.model.mode == 'planning':
-            price_per_kWh = self.model.tables["Energy Price Values"] \
-                .at[price_date, str(self.block)]
+            price_per_kWh = self.prices.at(price_year, self.datetime, str(self.block))
             head = self.model.nodes[self.res_name + self.month_suffix].head
             eta = 0.9  # generation efficiency
             gamma = 9807  # specific weight of water = rho*g
@@ -38,8 +38,8 @@ class Dion_R_Holm_PH_Demand(WaterLPParameter):
         end = start + dt.timedelta(days=days)
         forecast_dates = pd.date_range(start, end)
 
-        EL_forecasted_inflow_mcm = self.model.parameters["Lake Eleanor Inflow/Runoff"].dataframe[forecast_dates].sum()
-        CH_forecasted_inflow_mcm = self.model.parameters["Cherry Lake Inflow/Runoff"].dataframe[forecast_dates].sum()
+        EL_forecasted_inflow_mcm = self.get_dataframe_sum("Lake Eleanor Inflow/Runoff", start, end, scenario_index)
+        CH_forecasted_inflow_mcm = self.get_dataframe_sum("Cherry Lake Inflow/Runoff", start, end, scenario_index)
 
         # forecasted_inflow_mcm = EL_forecasted_inflow_mcm + CH_forecasted_inflow_mcm
         forecasted_inflow_mcm = CH_forecasted_inflow_mcm
@@ -5,6 +5,11 @@ from datetime import datetime
 
 
 class IFR_bl_Hetch_Hetchy_Reservoir_UTREP_Spill(MinFlowParameter):
+    state_attrs = MinFlowParameter.state_attrs + [
+        'latest_start_date', 'fcst_spill_mcm', 'last_release_af', 'spill_days', 'excess_af', 'spill_threshold_af',
+        'base_template_hydrograph_cfs', 'adjusted_template_hydrograph_cfs'
+    ]
+
     MIN_STORAGE_THRESHOLD_MCM = 150 * 1.2335  # Storage threshold below which snowmelt flows will not initiate
     STORAGE_FORECAST_THRESHOLD_MCM = 360 * 1.2335  # Storage forecast above which snowmelt releases should be initiated
     EXCESS_SPILL_THRESHOLD_AF = 10000  # Excess spill value above which the template hydrograph should be changed
@@ -37,7 +42,7 @@ class IFR_bl_Hetch_Hetchy_Reservoir_UTREP_Spill(MinFlowParameter):
                              days=None):
         # Estimate uncontrolled spill assuming snowmelt releases do not occur.
 
-        hh_inflow_df = self.model.nodes['Hetch Hetchy Reservoir Inflow'].max_flow.dataframe
+        hh_inflow_df = self.get_dataframe(self.model.nodes['Hetch Hetchy Reservoir Inflow'].max_flow.name, scenario_index)
 
         # get end date if fcst_inflow is not supplied
         if fcst_inflow is None and days and end_date is None:
@@ -1,10 +1,13 @@
 import numpy as np
+from datetime import datetime
 from parameters import MinFlowParameter
 
 
 class IFR_bl_Hetch_Hetchy_Reservoir_Water_Year_Type(MinFlowParameter):
     """"""
 
+    state_attrs = MinFlowParameter.state_attrs + ['WYT']
+
     WYT = None
 
     def setup(self):
@@ -37,11 +40,11 @@ class IFR_bl_Hetch_Hetchy_Reservoir_Water_Year_Type(MinFlowParameter):
 
             criteria = (schedule.iat[lookup_row, 1], schedule.iat[lookup_row, 3])
 
-            oct_1 = '{:04}-10-01'.format(date.year - 1)
+            oct_1 = datetime(date.year - 1, 10, 1)
 
             if date.month <= 6:
-                precip = self.model.parameters["Hetch Hetchy Reservoir/Precipitation"].dataframe
-                total_precip = precip[oct_1:date].sum() / 25.4  # sum & convert mm to inches
+                total_precip = self.get_dataframe_sum("Hetch Hetchy Reservoir/Precipitation", oct_1, date,
+                                                      scenario_index) / 25.4  # sum & convert mm to inches
                 if total_precip >= criteria[0]:
                     WYT = 3
                 elif total_precip >= criteria[1]:
@@ -51,8 +54,8 @@ class IFR_bl_Hetch_Hetchy_Reservoir_Water_Year_Type(MinFlowParameter):
 
             # July-Aug:
             else:
-                runoff = self.model.parameters["Hetch Hetchy Reservoir Inflow/Runoff"].dataframe
-                cumulative_runoff = runoff[oct_1:date].sum()
+                cumulative_runoff = self.get_dataframe_sum("Hetch Hetchy Reservoir Inflow/Runoff", oct_1, date,
+                                                           scenario_index)
                 cumulative_runoff *= 810.7 / 1000  # convert mcm to taf
                 if cumulative_runoff >= criteria[0]:
                     WYT = 3
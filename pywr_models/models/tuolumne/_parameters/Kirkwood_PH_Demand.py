@@ -7,6 +7,8 @@ from utilities.converter import convert
 class Kirkwood_PH_Demand(WaterLPParameter):
     """"""
 
+    state_attrs = ['prev_release_cms']
+
     prev_release_cms = None
 
     def setup(self):
@@ -29,7 +31,8 @@ class Kirkwood_PH_Demand(WaterLPParameter):
             start = timestep.datetime
             end = datetime(timestep.year, end_month, end_day)
             forecast_days = (end - start).days + 1
-            forecast_HH_inflow = self.model.parameters["Hetch Hetchy Reservoir Inflow/Runoff"].dataframe[start:end].sum()
+            forecast_HH_inflow = self.get_dataframe_sum("Hetch Hetchy Reservoir Inflow/Runoff", start, end,
+                                                        scenario_index)
             HH = self.model.nodes["Hetch Hetchy Reservoir"]
             current_storage_mcm = HH.volume[scenario_index.global_id]
             HH_space = HH.max_volume - current_storage_mcm
@@ -11,7 +11,7 @@ class Lake_Eleanor_Forecasted_Inflow(WaterLPParameter):
         start = timestep.datetime
         end = start + timedelta(days=60)
         forecast_dates = pd.date_range(start, end)
-        forecasted_inflow_mcm = self.model.parameters["Lake Eleanor Inflow/Runoff"].dataframe[forecast_dates].sum()
+        forecasted_inflow_mcm = self.get_dataframe_sum("Lake Eleanor Inflow/Runoff", start, end, scenario_index)
 
         # get forecasted IFR
         forecasted_ifr_mcm = 0
@@ -3,6 +3,8 @@ from parameters import WaterLPParameter
 
 
 class Water_Bank(WaterLPParameter):
+    state_attrs = ['initial_storage']
+
     initial_storage = None
 
     def setup(self):
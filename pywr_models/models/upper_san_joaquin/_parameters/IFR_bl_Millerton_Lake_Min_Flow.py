@@ -27,11 +27,11 @@ class IFR_bl_Millerton_Lake_Min_Flow(MinFlowParameter):
             date_index = sum([1 for md in ifr_schedule_cfs.index if month_day >= md]) - 1
 
         # get IFR from schedule
-        wyt = self.model.tables["SJ restoration flows"].at[restoration_year, 'WYT']
+        wyt = self.get_table("SJ restoration flows", scenario_index).at[restoration_year, 'WYT']
         wyt_index = wyt - 1
         ifr_cfs = ifr_schedule_cfs.iat[date_index, wyt_index]
         if wyt in [3, 4, 5]:
-            allocation_adjustment = self.model.tables["SJ restoration flows"] \
+            allocation_adjustment = self.get_table("SJ restoration flows", scenario_index) \
                 .at[restoration_year, 'Allocation adjustment']
             ifr_cfs *= allocation_adjustment
 
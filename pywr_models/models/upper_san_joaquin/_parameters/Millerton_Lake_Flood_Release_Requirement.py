@@ -2,11 +2,14 @@ from parameters import WaterLPParameter
 from datetime import datetime, timedelta
 import numpy as np
 from utilities.converter import convert
+from utilities.network_index import get_network_index
 import math
 
 
 class Millerton_Lake_Flood_Release_Requirement(WaterLPParameter):
 
+    state_attrs = ['should_drawdown', 'storage_mcm', 'prev_storage_mcm']
+
     should_drawdown = None
 
     def setup(self):
@@ -14,6 +17,22 @@ class Millerton_Lake_Flood_Release_Requirement(WaterLPParameter):
         num_scenarios = len(self.model.scenarios.combinations)
         self.should_drawdown = np.empty(num_scenarios, np.bool)
 
+        # storage at the start of this and the previous time step
+        self.storage_mcm = np.zeros(num_scenarios)
+        self.prev_storage_mcm = np.zeros(num_scenarios)
+
+        # reservoirs upstream of Millerton Lake
+        network = get_network_index(self.model)
+        self.upstream_storage_nodes = [network.get_node(name) for name in network.upstream("Millerton Lake")
+                                       if hasattr(network.get_node(name), 'volume')]
+
+    def before(self):
+        super().before()
+        if self.model.mode == 'planning':
+            return
+        self.prev_storage_mcm[:] = self.storage_mcm
+        self.storage_mcm[:] = self.model.nodes["Millerton Lake"].volume
+
     def _value(self, timestep, scenario_index):
 
         if self.model.mode == 'planning':
@@ -68,7 +87,7 @@ class Millerton_Lake_Flood_Release_Requirement(WaterLPParameter):
             # TODO: update to use imperfect forecast?
             fnf_start = timestep.datetime
             fnf_end = datetime(timestep.year, 7, 31)
-            forecasted_inflow_mcm = self.model.parameters["Full Natural Flow"].dataframe[fnf_start:fnf_end].sum()
+            forecasted_inflow_mcm = self.get_dataframe_sum("Full Natural Flow", fnf_start, fnf_end, scenario_index)
 
             # 3.2. Calculate today's and forecasted irrigation demand.
             forecast_days = 14
@@ -99,10 +118,8 @@ class Millerton_Lake_Flood_Release_Requirement(WaterLPParameter):
 
             # 3.4.1. Get total previous storage in upstream reservoirs
             upstream_storage_space_mcm = 0.0
-            for node in self.model.nodes:
-                # TODO: make this more efficient
-                if hasattr(node, 'volume') and node.name != 'Millerton Lake':
-                    upstream_storage_space_mcm += node.volume[scenario_index.global_id]
+            for node in self.upstream_storage_nodes:
+                upstream_storage_space_mcm += node.volume[scenario_index.global_id]
 
             # 3.4.2. Calculate adjustment to storage space
             # Note: this is approximated from the upper right of the Flood Control Diagram (Fig. A-11)
@@ -176,9 +193,7 @@ class Millerton_Lake_Flood_Release_Requirement(WaterLPParameter):
 
             # Check if New Melones filled
             if millerton_storage_mcm > nov1_target and not self.should_drawdown[sid]:
-                day_before_yesterday = self.datetime + timedelta(days=-2)
-                millerton_storage_df = self.model.recorders["Millerton Lake/storage"].to_dataframe()
-                prev_millerton_storage_mcm = millerton_storage_df.loc[day_before_yesterday].values[sid]
+                prev_millerton_storage_mcm = self.prev_storage_mcm[sid]
                 if millerton_storage_mcm <= prev_millerton_storage_mcm:
                     self.should_drawdown[sid] = True
 
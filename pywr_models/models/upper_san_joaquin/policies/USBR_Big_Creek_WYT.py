@@ -8,7 +8,7 @@ class USBR_Big_Creek_WYT(WaterLPParameter):
 
     def _value(self, timestep, scenario_index):
 
-        Friant_Apr_Jul_runoff_af = self.model.tables['Seasonal Inflow at Friant'][self.operational_water_year]
+        Friant_Apr_Jul_runoff_af = self.get_table('Seasonal Inflow at Friant', scenario_index)[self.operational_water_year]
         if Friant_Apr_Jul_runoff_af <= 900000:
             wyt = 1  # dry
         else:
@@ -0,0 +1,56 @@
+import pandas as pd
+from pywr.parameters import DataFrameParameter
+from utilities.inflow_store import is_inflow_store, load_inflow_column
+from utilities.hydrology_store import in_store, load_dataframe
+
+
+def _load_dataframe(model, data):
+    # inflows are read from the inflow store once, rather than for each parameter, and other data from the hydrology
+    # store, if it is there
+    if is_inflow_store(data.get('url')):
+        return load_inflow_column(data.pop('url'), data.pop('column'))
+    return load_dataframe(model, data)
+
+
+def load_climate_dataframe(model, data, climate_urls):
+    """
+    Load the same data for several climates into one dataframe, with one column per climate.
+    :param model: The Pywr model
+    :param data: The dataframe definition (column, index_col, etc.), without the url
+    :param climate_urls: The data url for each climate, in the order of the Climate scenario
+    :return: A dataframe with one column per climate
+    """
+    columns = []
+    for url in climate_urls:
+        df = _load_dataframe(model, dict(data, url=url))
+        if isinstance(df, pd.DataFrame):
+            df = df.iloc[:, 0]
+        columns.append(df)
+    return pd.concat(columns, axis=1, keys=range(len(columns)))
+
+
+class ClimateDataframe(DataFrameParameter):
+    """
+    This parameter type extends the base DataFrameParameter by allowing a list of urls, one for each climate, in
+    which case the data is indexed by the "Climate" scenario.
+    """
+
+    @classmethod
+    def load(cls, model, data):
+        climate_urls = data.pop('climate_urls', None)
+        if climate_urls is None:
+            if not is_inflow_store(data.get('url')) and not in_store(data):
+                return super().load(model, data)
+            scenario = data.pop('scenario', None)
+            if scenario is not None:
+                scenario = model.scenarios[scenario]
+            df = _load_dataframe(model, data)
+            return cls(model, df, scenario=scenario, **data)
+
+        data.pop('url', None)
+        scenario = model.scenarios[data.pop('scenario', 'Climate')]
+        df = load_climate_dataframe(model, data, climate_urls)
+        return cls(model, df, scenario=scenario)
+
+
+ClimateDataframe.register()
@@ -1,7 +1,7 @@
-from pywr.parameters import DataFrameParameter
+from parameters.ClimateDataframe import ClimateDataframe
 
 
-class InflowDataframe(DataFrameParameter):
+class InflowDataframe(ClimateDataframe):
     """
     This parameter type extends the base DataFrameParameter by looking for a bias correction factor table
     in the model. If found, and the name of the parameter is in the table, then it will pull the correction factor
@@ -1,15 +1,21 @@
 from parameters import WaterLPParameter
 from dateutil.relativedelta import relativedelta
-from calendar import isleap
 import random
 import numpy as np
+from utilities.energy_prices import get_price_cube
+from utilities.monthly_tables import get_price_duration_month
 
 
 class PH_Water_Demand(WaterLPParameter):
     """"""
 
+    state_attrs = ['price_threshold']
+
     price_threshold = None
     cms_to_mcm = 0.0864
+    price_year_param = None
+    hourly_prices = None
+    price_blocks = None
 
     def __init__(self, model, node, block, **kwargs):
         super().__init__(model, **kwargs)
@@ -19,26 +25,22 @@ class PH_Water_Demand(WaterLPParameter):
     def setup(self):
         super().setup()
         self.price_threshold = np.zeros(self.num_scenarios, np.float)
+        self.price_year_param = self.model.parameters['Price Year']
+        self.hourly_prices = get_price_cube(self.model, 'All Energy Price Values')
+        self.price_blocks = get_price_cube(self.model, 'Energy Price Blocks')
 
     def _value(self, timestep, scenario_index):
 
-        all_energy_prices = self.model.tables['All Energy Price Values']
-
         powerhouse = self.model.nodes[self.res_name + self.month_suffix]  # powerhouse
         turbine_capacity_mcm = powerhouse.turbine_capacity
         if type(turbine_capacity_mcm) not in [float, int]:
             turbine_capacity_mcm = turbine_capacity_mcm.get_value(scenario_index)
 
-        price_year = int(self.model.parameters['Price Year'].value(timestep, scenario_index))
-
-        if self.datetime.month == 2 and self.datetime.day == 29:
-            price_date = self.datetime.strftime('{}-02-28'.format(price_year))
-        else:
-            price_date = self.datetime.strftime('{}-%m-%d'.format(price_year))
+        price_year = int(self.price_year_param.value(timestep, scenario_index))
 
         # calculate the price threshold if needed
         if self.model.mode == 'planning':
-            block = self.model.tables["Energy Price Blocks"].at[price_date, str(self.block)]
+            block = self.price_blocks.at(price_year, self.datetime, str(self.block))
             if self.block == 1:
                 spinning_flow_fraction = powerhouse.spinning_flow
                 block = max(spinning_flow_fraction, block)
@@ -53,13 +55,19 @@ class PH_Water_Demand(WaterLPParameter):
 
             if timestep.day == 1:
                 end = timestep.datetime + relativedelta(months=+1) - relativedelta(days=+1)
-                if not isleap(price_year) and timestep.month == 2:
-                    price_end = '{}-02-28'.format(price_year)
+                price_durations = self.model.tables.get('Energy Price Duration')
+                if price_durations is not None:
+                    # already sorted in descending order (see utilities.monthly_tables)
+                    month = get_price_duration_month(price_year, self.datetime)
+                    energy_prices = price_durations.loc[month].values
+                    energy_prices = energy_prices[~np.isnan(energy_prices)]
                 else:
-                    price_end = end.strftime('{}-%m-%d'.format(price_year))
-                energy_prices = all_energy_prices[price_date:price_end].values.flatten()
-                energy_prices[::-1].sort()  # sort in descending order
-                planning_release = self.model.planning.nodes[self.res_name + '/1'].flow[sid]
+                    # February 29 is only included if both this year and the price year are leap years
+                    energy_prices = self.hourly_prices.between(price_year, self.datetime, end).flatten()
+                    energy_prices[::-1].sort()  # sort in descending order
+                # the planning model may not be run every month, so read this month from the last plan
+                planning_month = getattr(self.model, 'planning_month', 1)
+                planning_release = self.model.planning.nodes['{}/{}'.format(self.res_name, planning_month)].flow[sid]
 
                 # for planning turbine capacity, note that the turbine capacities are the same
                 # in both models (i.e., cms)
@@ -73,11 +81,12 @@ class PH_Water_Demand(WaterLPParameter):
                     self.price_threshold[sid] = energy_prices[price_index]
 
             # calculate today's total release
-            energy_prices_today = all_energy_prices.loc[price_date].values
+            energy_prices_today = self.hourly_prices.row(price_year, self.datetime)
             if self.block == 1:
-                production_hours = len([1 for p in energy_prices_today if p >= self.price_threshold[sid]])
+                production_hours = np.count_nonzero(energy_prices_today >= self.price_threshold[sid])
             else:
-                production_hours = len([1 for p in energy_prices_today if 0.0 < p < self.price_threshold[sid]])
+                production_hours = np.count_nonzero((energy_prices_today > 0.0)
+                                                    & (energy_prices_today < self.price_threshold[sid]))
 
             max_flow_fraction = production_hours / 24
             # blocks = self.model.tables["Energy Price Blocks"].loc[timestep.datetime]
@@ -89,7 +98,7 @@ class PH_Water_Demand(WaterLPParameter):
             block = max_flow_fraction
 
         else:
-            block = self.model.tables["Energy Price Blocks"].at[price_date, str(self.block)]
+            block = self.price_blocks.at(price_year, self.datetime, str(self.block))
 
         # TODO: Extend the following to planning mode
         if self.res_name == 'Collierville PH' and self.block == 1:
@@ -14,7 +14,7 @@ class San_Joaquin_Valley_WYI(WaterLPParameter):
     """
 
     def _value(self, timestep, scenario_index):
-        sjvi = self.model.tables["San Joaquin Valley Index"]
+        sjvi = self.get_table("San Joaquin Valley Index", scenario_index)
         if 4 <= self.datetime.month <= 12:
             operational_water_year = self.datetime.year
         else:
@@ -1,8 +1,11 @@
+import copy
+import numpy as np
 import pandas as pd
 from calendar import monthrange
 from dateutil.relativedelta import relativedelta
 from pywr.parameters import Parameter
 from utilities.converter import convert
+from utilities.cumulative_sums import get_cumulative_series
 import random
 
 
@@ -37,6 +40,12 @@ class WaterLPParameter(Parameter):
     demand_constant_param = ''
     elevation_param = ''
     num_scenarios = 0
+    num_climates = 1
+    climate_idx = None
+
+    # Attributes that carry over between time steps (e.g., per-scenario arrays updated as the model runs), to be saved
+    # in checkpoints (see get_state)
+    state_attrs = []
 
     timestep = Timestep()
 
@@ -45,6 +54,11 @@ class WaterLPParameter(Parameter):
 
         self.num_scenarios = len(self.model.scenarios.combinations)
 
+        scenario_names = [s.name for s in self.model.scenarios.scenarios]
+        self.climate_idx = scenario_names.index('Climate') if 'Climate' in scenario_names else None
+        if self.climate_idx is not None:
+            self.num_climates = self.model.scenarios.scenarios[self.climate_idx].size
+
         self.mode = getattr(self.model, 'mode', self.mode)
 
         name_parts = self.name.split('/')
@@ -95,6 +109,75 @@ class WaterLPParameter(Parameter):
     def get(self, param, timestep, scenario_index):
         return self.model.parameters[param].value(timestep, scenario_index)
 
+    def get_climate(self, scenario_index):
+        """
+        Get the index of the climate of a scenario, if climates are run as a scenario (0 otherwise).
+        """
+        if self.climate_idx is None:
+            return 0
+        return scenario_index.indices[self.climate_idx]
+
+    def get_table(self, table_name, scenario_index):
+        """
+        Get a model table. If the table varies by climate, the table for the climate of the scenario is returned.
+        """
+        climate_tables = getattr(self.model, 'climate_tables', None)
+        if climate_tables and table_name in climate_tables:
+            return climate_tables[table_name][self.get_climate(scenario_index)]
+        return self.model.tables[table_name]
+
+    def get_climate_tables(self, table_name):
+        """
+        Get a model table for each climate, for use outside of value(), where there is no scenario.
+        """
+        climate_tables = getattr(self.model, 'climate_tables', None)
+        if climate_tables and table_name in climate_tables:
+            return climate_tables[table_name]
+        return [self.model.tables[table_name]] * self.num_climates
+
+    def get_dataframe(self, param_name, scenario_index):
+        """
+        Get the data of a dataframe parameter as a series. If the data varies by climate, the series for the climate
+        of the scenario is returned.
+        """
+        df = self.model.parameters[param_name].dataframe
+        if df.ndim == 2:
+            df = df.iloc[:, self.get_climate(scenario_index) if df.shape[1] > 1 else 0]
+        return df
+
+    def get_table_sum(self, table_name, start, end, scenario_index):
+        """
+        Sum a daily table from one date to another, inclusive, as get_table(...)[start:end].sum() would, but using the
+        table's prefix sums (see utilities.cumulative_sums).
+        """
+        table = self.get_table(table_name, scenario_index)
+        return get_cumulative_series(self.model, (table_name, self.get_climate(scenario_index)), table).sum(start, end)
+
+    def get_dataframe_sum(self, param_name, start, end, scenario_index):
+        """
+        Sum the data of a dataframe parameter from one date to another, inclusive, as
+        get_dataframe(...)[start:end].sum() would, but using the data's prefix sums (see utilities.cumulative_sums).
+        """
+        df = self.model.parameters[param_name].dataframe
+        column = None
+        if df.ndim == 2:
+            column = self.get_climate(scenario_index) if df.shape[1] > 1 else 0
+        return get_cumulative_series(self.model, param_name, df, column).sum(start, end)
+
+    def get_state(self):
+        """
+        Get the state kept by the parameter from one time step to the next, for checkpointing: the attributes listed
+        in state_attrs. Other attributes (e.g., tables and nodes looked up in setup) are set up again on resume.
+        """
+        return {name: copy.deepcopy(getattr(self, name)) for name in self.state_attrs if hasattr(self, name)}
+
+    def set_state(self, state):
+        """
+        Restore the state saved with get_state.
+        """
+        for name, value in state.items():
+            setattr(self, name, copy.deepcopy(value))
+
     def get_days_in_month(self, year=None, month=None):
         if year is None:
             year = self.year
@@ -130,6 +213,9 @@ class IFRParameter(WaterLPParameter):
 
 
 class MinFlowParameter(IFRParameter):
+    state_attrs = ['current_flow_period', 'water_year_type', 'prev_requirement', 'flood_days', 'flood_duration',
+                   'prev_flood_mcm', 'flood_year']
+
     current_flow_period = None
     water_year_type = None
     params = None
@@ -153,7 +239,7 @@ class MinFlowParameter(IFRParameter):
                 self.include_functional_flows = True
                 self.params = self.model.tables['functional flows parameters']
                 self.metrics = self.model.tables['functional flows metrics']
-                self.water_year_type = 'moderate'
+                self.water_year_type = ['moderate'] * self.num_climates
                 self.magnitude_col = 'moderate magnitude'
 
                 self.water_year_types = {
@@ -198,11 +284,11 @@ class MinFlowParameter(IFRParameter):
             if timestep.month == 10 and timestep.day == 1:
                 # update water year type, assuming perfect foresight
                 wy = timestep.year + 1
-                fnf = self.model.tables['Annual Full Natural Flow']
-                fnf_wy = fnf[wy]
-                terciles = fnf.quantile([0, 0.33, 0.66]).values
-                wyt = sum([1 for q in terciles if fnf_wy >= q])
-                self.water_year_type = self.water_year_types[wyt]
+                for i, fnf in enumerate(self.get_climate_tables('Annual Full Natural Flow')):
+                    fnf_wy = fnf[wy]
+                    terciles = fnf.quantile([0, 0.33, 0.66]).values
+                    wyt = sum([1 for q in terciles if fnf_wy >= q])
+                    self.water_year_type[i] = self.water_year_types[wyt]
 
     def get_down_ramp_ifr(self, timestep, scenario_index, value, initial_value=None, rate=0.25):
         """
@@ -270,8 +356,9 @@ class MinFlowParameter(IFRParameter):
         """
         sid = scenario_index.global_id
 
-        params = self.params[self.water_year_type]
-        metrics = self.metrics[self.water_year_type]
+        water_year_type = self.water_year_type[self.get_climate(scenario_index)]
+        params = self.params[water_year_type]
+        metrics = self.metrics[water_year_type]
         dowys = params['DOWY']
         flows = params['mag_cfs']
 
@@ -328,13 +415,13 @@ class MinFlowParameter(IFRParameter):
             if self.flood_days[sid] < self.flood_duration[sid]:
                 winter_flood_mcm = self.prev_flood_mcm[sid]  # TODO: make scenario-safe
 
-            elif self.water_year_type == 'moderate':
+            elif water_year_type == 'moderate':
                 flood_start = metrics['Peak_Tim_2']
                 if self.dowy == flood_start:
                     self.flood_duration[sid] = metrics['Peak_Dur_2']
                     winter_flood_cfs = metrics['Peak_2']
 
-            elif self.water_year_type == 'wet':
+            elif water_year_type == 'wet':
                 flood_starts = {}
                 for interval in [2, 5, 10]:
                     peak_timing = metrics['Peak_Tim_{}'.format(interval)]
@@ -382,7 +469,7 @@ class MinFlowParameter(IFRParameter):
         ifr_mcm = ifr_mcm or (ifr_cfs / 35.315 * 0.0864)
         ifr_mcm = max(ifr_mcm, winter_flood_mcm)
 
-        fnf_mcm = fnf.dataframe[timestep.datetime]
+        fnf_mcm = self.get_dataframe('Full Natural Flow', scenario_index)[timestep.datetime]
         ifr_mcm = min(ifr_mcm, fnf_mcm)
 
         self.prev_requirement[sid] = ifr_mcm
@@ -451,8 +538,10 @@ class MinFlowParameter(IFRParameter):
             # 5-year flood: 40760 cfs x 2 days = 199 mcm flood total
             # 10-year flood: 52940 cfs x 2 days = 259 mcm flood total
             forecast_start = timestep.datetime
-            fnf_forecast_7d = fnf.dataframe[forecast_start:forecast_start + relativedelta(days=7)].sum()
-            fnf_forecast_2d = fnf.dataframe[forecast_start:forecast_start + relativedelta(days=2)].sum()
+            fnf_forecast_7d = self.get_dataframe_sum('Full Natural Flow', forecast_start,
+                                                     forecast_start + relativedelta(days=7), scenario_index)
+            fnf_forecast_2d = self.get_dataframe_sum('Full Natural Flow', forecast_start,
+                                                     forecast_start + relativedelta(days=2), scenario_index)
 
             if self.flood_year[sid] and self.flood_days[sid] < self.flood_lengths[self.flood_year[sid]]:
                 winter_flood_mcm = self.prev_flood_mcm[sid]  # TODO: make scenario-safe
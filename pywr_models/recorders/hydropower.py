@@ -139,8 +139,11 @@ class HydropowerEnergyRecorder(NumpyArrayNodeRecorder):
         self.children.add(parameter)
         self._water_elevation_parameter = parameter
 
+    def _current_row(self):
+        return self.model.timestepper.current.index
+
     def after(self):
-        ts = self.model.timestepper.current
+        row = self._current_row()
 
         for scenario_index in self.model.scenarios.combinations:
 
@@ -173,7 +176,7 @@ class HydropowerEnergyRecorder(NumpyArrayNodeRecorder):
                                             flow_unit_conversion=self.flow_unit_conversion,
                                             energy_unit_conversion=self.energy_unit_conversion)
 
-            self._data[ts.index, scenario_index.global_id] = energy
+            self._data[row, scenario_index.global_id] = energy
 
     @classmethod
     def load(cls, model, data):
@@ -0,0 +1,138 @@
+"""
+Recorders that keep only the time steps that have not yet been written to the results file (see
+utilities.results.ResultsWriter), so that their memory does not grow with the length of the run.
+
+Each recorder holds a window of rows, starting at the first time step not yet written (its offset). Once the results
+writer has written the rows up to a time step, it releases them, and the window moves on. The window holds a water
+year, which is how often results are written; if rows are not released in time, it grows rather than losing data.
+Data from earlier in the current water year remains available with to_dataframe, e.g., for parameters that look back
+at recorded flows or storage (New_Melones_WYT, IFR_at_Shaffer_Bridge_Min_Flow).
+"""
+
+import numpy as np
+import pandas as pd
+from pywr.recorders import NumpyArrayNodeRecorder, NumpyArrayStorageRecorder, NumpyArrayLevelRecorder, \
+    NumpyArrayParameterRecorder
+
+from recorders.hydropower import HydropowerEnergyRecorder
+
+WINDOW_ROWS = 367  # a water year, and the first day of the next
+
+
+class WindowedRecorderMixin(object):
+    offset = 0
+
+    def setup(self):
+        ncomb = len(self.model.scenarios.combinations)
+        nts = len(self.model.timestepper)
+        self._data = np.zeros((min(WINDOW_ROWS, nts), ncomb))
+        self.offset = 0
+
+    def reset(self):
+        self._data[:, :] = 0.0
+        self.offset = 0
+
+    def _current_row(self):
+        # (this may grow the window, so get the row before indexing _data)
+        row = self.model.timestepper.current.index - self.offset
+        while row >= len(self._data):
+            self._data = np.concatenate([self._data, np.zeros_like(self._data)])
+        return row
+
+    def get_rows(self, start, stop):
+        """
+        Get the rows of a range of time steps, from the first not yet released.
+        """
+        if start < self.offset:
+            raise ValueError('Time steps before {} have already been released by {}'.format(self.offset, self.name))
+        return self._data[start - self.offset:stop - self.offset]
+
+    def release(self, stop):
+        """
+        Release the rows of the time steps before stop, e.g., once they have been written.
+        """
+        shift = stop - self.offset
+        if shift <= 0:
+            return
+        kept = max(len(self._data) - shift, 0)
+        self._data[:kept] = self._data[len(self._data) - kept:]
+        self._data[kept:] = 0.0
+        self.offset = stop
+
+    @property
+    def data(self):
+        return np.array(self._data)
+
+    def to_dataframe(self):
+        """
+        Get the rows held by the recorder (from the first time step not yet released) as a dataframe, as
+        NumpyArrayNodeRecorder.to_dataframe does for the whole run.
+        """
+        index = self.model.timestepper.datetime_index[self.offset:self.offset + len(self._data)]
+        sc_index = self.model.scenarios.multiindex
+        return pd.DataFrame(data=np.array(self._data[:len(index)]), index=index, columns=sc_index)
+
+
+class WindowedNodeRecorder(WindowedRecorderMixin, NumpyArrayNodeRecorder):
+    def after(self):
+        row = self._current_row()
+        self._data[row] = np.asarray(self.node.flow) * self.factor
+        return 0
+
+
+class WindowedStorageRecorder(WindowedRecorderMixin, NumpyArrayStorageRecorder):
+    def after(self):
+        row = self._current_row()
+        values = self.node.current_pc if self.proportional else self.node.volume
+        self._data[row] = np.asarray(values)
+        return 0
+
+
+class WindowedLevelRecorder(WindowedRecorderMixin, NumpyArrayLevelRecorder):
+    def after(self):
+        row = self._current_row()
+        for scenario_index in self.model.scenarios.combinations:
+            self._data[row, scenario_index.global_id] = self.node.get_level(scenario_index)
+        return 0
+
+
+class WindowedParameterRecorder(WindowedRecorderMixin, NumpyArrayParameterRecorder):
+    def after(self):
+        row = self._current_row()
+        self._data[row] = np.asarray(self._param.get_all_values())
+        return 0
+
+
+class WindowedHydropowerEnergyRecorder(WindowedRecorderMixin, HydropowerEnergyRecorder):
+    pass
+
+
+# recorder types (lower case, as Pywr registers them) and their windowed versions
+WINDOWED_TYPES = {
+    'numpyarraynoderecorder': WindowedNodeRecorder,
+    'numpyarraystoragerecorder': WindowedStorageRecorder,
+    'numpyarraylevelrecorder': WindowedLevelRecorder,
+    'numpyarrayparameterrecorder': WindowedParameterRecorder,
+    'hydropowerenergyrecorder': WindowedHydropowerEnergyRecorder,
+}
+
+
+def register_windowed_recorders():
+    for recorder_class in WINDOWED_TYPES.values():
+        recorder_class.register()
+
+
+def use_windowed_recorders(m):
+    """
+    Set up a model definition to use windowed recorders, for a run in which results are written as the model runs
+    (see utilities.results.ResultsWriter). The recorders must be registered with register_windowed_recorders.
+    """
+    for recorder in m.get('recorders', {}).values():
+        if not isinstance(recorder, dict):
+            continue
+        recorder_type = recorder.get('type', '').lower()
+        if not recorder_type.endswith('recorder'):
+            recorder_type += 'recorder'
+        if recorder_type in WINDOWED_TYPES:
+            recorder['type'] = WINDOWED_TYPES[recorder_type].__name__
+    return m
@@ -1,83 +1,291 @@
 import os
 import sys
 import json
+import copy
 from pywr.core import Model
 from importlib import import_module
 from tqdm import tqdm
 from datetime import datetime
 from dateutil.relativedelta import relativedelta
-from common.tests import get_planning_dataframe
-import pandas as pd
 import traceback
-from utilities import simplify_network, prepare_planning_model, save_model_results, create_schematic
+import multiprocessing
+from utilities import simplify_network, prepare_planning_model, create_schematic
+from utilities.results import get_base_results_path, ResultsWriter
+from utilities.cache import model_cache_key, is_cached, mark_cached, dump_json
+from utilities.rebind import rebind_model
+from utilities.climates import add_climate_scenario, load_climate_tables
+from utilities.components import get_component_index, get_required_modules
+from utilities.profiler import Profiler
+from utilities.driver import RunDriver
+from utilities.warm_start import IncrementalReset
+from utilities.planning_pool import PlanningPool, SCHEDULING_RECORDERS
+from utilities.planning_cache import PlanningCache
+from utilities.planning_schedule import PlanningSchedule, get_planning_model_path
+from utilities.planning_recorder import PlanningRecorder
+from utilities.monthly_tables import get_monthly_tables_path, get_table_key, build_monthly_tables, replace_climate, \
+    get_source_urls, PRICE_DURATION_TABLE
+from utilities.inflow_store import get_inflow_sources, get_inflow_store_path, get_climate_sources, build_inflow_store, \
+    use_inflow_store
+from utilities.hydrology_store import get_store_path, MANIFEST_FILENAME, use_hydrology_store, load_store_tables
+from utilities.shared_tables import attach_tables, use_shared_tables
+from utilities.checkpoint import get_checkpoint_path, save_checkpoint, resume_from_checkpoint, clear_checkpoint
+from recorders.windowed import use_windowed_recorders
 from loguru import logger
 
 SECONDS_IN_DAY = 3600 * 24
 
 
-def run_model(*args, **kwargs):
-    climate = args[0]
-    basin = args[1]
-    run_name = kwargs['run_name']
+def update_model(base_model, scenario_path):
+    """
+    Update the base model in place with the contents of a scenario file, if it exists.
+    """
+    if os.path.exists(scenario_path):
+        with open(scenario_path) as f:
+            scenario_model = json.load(f)
+        for key, scenario_items in scenario_model.items():
+            if key in base_model:
+                if type(scenario_items) == dict:
+                    base_model[key].update(scenario_items)
+                else:
+                    base_model[key].extend(scenario_items)
+            elif key in ['scenarios', 'nodes']:
+                items = {item['name']: item for item in base_model.get(key, [])}
+                new_items = {item['name']: item for item in scenario_items}
+                items.update(new_items)
+                base_model[key] = list(items.values())
+
+
+def assemble_model(basin, climate, start, end, scenarios=None, data_path=None):
+    """
+    Assemble the daily model definition for a basin and climate from the base model and any scenario files, with
+    data urls pointing to the climate's data.
+    :return: The model definition
+    """
+
+    here = os.path.dirname(os.path.realpath(__file__))
+    base_path = os.path.join(here, 'models', basin, 'pywr_model.json')
+    scenario_paths = [os.path.join(here, 'scenarios', '{}.json'.format(s)) for s in scenarios or []]
+
+    # first order of business: update file paths in json file
+    with open(base_path) as f:
+        base_model = json.load(f)
+
+    # update model with scenarios, if any
+    for scenario_path in scenario_paths:
+        update_model(base_model, scenario_path)
+
+    new_model_parts = {}
+    for model_part in ['tables', 'parameters']:
+        if model_part not in base_model:
+            continue
+        new_model_parts[model_part] = {}
+        for pname, param in base_model[model_part].items():
+            if 'observed' in pname.lower():
+                continue
+            url = param.get('url')
+            if url:
+                if data_path:
+                    url = url.replace('../data', data_path)
+                url = url.replace('historical/Livneh', climate)
+                param['url'] = url
+            new_model_parts[model_part][pname] = param
+
+    base_model.update(new_model_parts)
+    base_model['timestepper']['start'] = start
+    base_model['timestepper']['end'] = end
+    return base_model
+
+
+def prepare_model_files(basin, climate, start, end, scenarios=None, data_path=None, simplify=True,
+                        include_planning=False, planning_months=12, debug=False, use_cache=True, climates=None,
+                        planning_horizons=None):
+    """
+    Assemble the daily (and, optionally, planning) model files for a basin and climate.
+
+    If a list of climates is given, the models are assembled to run all of them at once as a "Climate" scenario, and
+    climate should be the first of these.
+
+    Assembled models are stored in models/<basin>/temp/cache/<key>, where the key is a hash of everything that goes
+    into the model: the base model, the scenario files, the climate, dates and planning settings. If a model with the
+    same key has already been assembled, the existing files are used as-is, unless the data files that the monthly
+    tables or inflow stores were derived from have changed since (by size or modified time).
+
+    If planning horizons shorter than planning_months are given, a planning model is also created for each of these
+    (see utilities.planning_schedule.get_planning_model_path).
+    :return: A tuple of (daily model path, planning model path or None)
+    """
 
+    here = os.path.dirname(os.path.realpath(__file__))
+    root_dir = os.path.join(here, 'models', basin)
+    base_path = os.path.join(root_dir, 'pywr_model.json')
+    scenario_paths = [os.path.join(here, 'scenarios', '{}.json'.format(s)) for s in scenarios or []]
+
+    settings = {}
+    if planning_horizons and planning_horizons != [planning_months]:
+        settings['planning_horizons'] = planning_horizons
+    store_manifest_path = os.path.join(get_store_path() or '', MANIFEST_FILENAME)
+    if os.path.exists(store_manifest_path):
+        settings['hydrology_store'] = os.path.getmtime(store_manifest_path)
+    key = model_cache_key(
+        base_path, scenario_paths,
+        climate=climate,
+        start=start,
+        end=end,
+        data_path=data_path,
+        sierra_data_path=os.environ.get('SIERRA_DATA_PATH'),
+        simplify=simplify,
+        include_planning=include_planning,
+        planning_months=planning_months,
+        debug=debug,
+        climates=climates,
+        **settings
+    )
+    cache_dir = os.path.join(root_dir, 'temp', 'cache', key)
+    model_path = os.path.join(cache_dir, 'pywr_model_simplified.json' if simplify else 'pywr_model.json')
+    planning_model_path = os.path.join(cache_dir, 'pywr_model_monthly.json') if include_planning else None
+
+    if use_cache and is_cached(cache_dir):
+        logger.info('Using cached model files ({})'.format(key))
+        return model_path, planning_model_path
+
+    if not os.path.exists(cache_dir):
+        os.makedirs(cache_dir, exist_ok=True)
+
+    model_json = assemble_model(basin, climate, start, end, scenarios=scenarios, data_path=data_path)
+
+    if simplify:
+        model_json = simplify_network(model_json, basin=basin, climate=climate, delete_gauges=True,
+                                      delete_observed=True)
+
+    daily_model_json = copy.deepcopy(model_json)
+
+    # data files that the monthly tables and inflow stores are derived from, checked when the cache is used
+    source_urls = []
+
+    if include_planning:
+        logger.info('Creating planning model (this may take a minute or two)')
+
+        # monthly tables are derived from the daily data once, for all planning horizons
+        monthly_tables_path = get_monthly_tables_path(cache_dir, climate)
+        monthly_sources = None
+
+        for horizon in sorted(set(planning_horizons or []) | {planning_months}, reverse=True):
+            path = planning_model_path
+            if horizon != planning_months:
+                path = get_planning_model_path(planning_model_path, horizon)
+
+            # write to a process-specific file first, since other runs may be reading the same cache
+            tmp_path = '{}.{}.tmp'.format(path, os.getpid())
+            sources = prepare_planning_model(copy.deepcopy(model_json), basin, climate, tmp_path, steps=horizon,
+                                             debug=debug, remove_rim_dams=True, monthly_tables_path=monthly_tables_path)
+            if monthly_sources is None:
+                monthly_sources = sources
+                for _climate in climates or [climate]:
+                    climate_sources = replace_climate(monthly_sources, climate, _climate)
+                    build_monthly_tables(climate_sources, get_monthly_tables_path(cache_dir, _climate))
+                    source_urls.extend(get_source_urls(climate_sources))
+            with open(tmp_path) as f:
+                planning_model_json = use_hydrology_store(json.load(f))
+            if climates:
+                planning_model_json = add_climate_scenario(planning_model_json, climates)
+            dump_json(planning_model_json, tmp_path, indent=4)
+            os.replace(tmp_path, path)
+
+        if get_table_key(PRICE_DURATION_TABLE) in monthly_sources:
+            daily_model_json['tables'][PRICE_DURATION_TABLE] = {
+                'url': monthly_tables_path,
+                'key': get_table_key(PRICE_DURATION_TABLE)
+            }
+
+    # daily inflows are read from one file for each climate, rather than one for each inflow
+    inflow_sources = get_inflow_sources(daily_model_json)
+    if inflow_sources:
+        for _climate in climates or [climate]:
+            climate_sources = get_climate_sources(inflow_sources, climate, _climate)
+            build_inflow_store(climate_sources, get_inflow_store_path(cache_dir, _climate))
+            source_urls.extend(spec['url'] for spec in climate_sources.values())
+        use_inflow_store(daily_model_json, inflow_sources, get_inflow_store_path(cache_dir, climate))
+
+    # hydrology data that has been converted to the binary store is read from it rather than from CSV files
+    daily_model_json = use_hydrology_store(daily_model_json)
+
+    if climates:
+        daily_model_json = add_climate_scenario(daily_model_json, climates)
+    dump_json(daily_model_json, model_path)
+
+    mark_cached(cache_dir, source_urls)
+
+    return model_path, planning_model_path
+
+
+def add_run_logger(run_name, basin, climate):
     logger_name = '{}-{}-{}.log'.format(run_name, basin, climate.replace('/', '_'))
     logs_dir = os.path.join('.', 'logs')
     if not os.path.exists(logs_dir):
         os.makedirs(logs_dir)
     logger_path = os.path.join(logs_dir, logger_name)
+    handler_id = None
     if os.path.exists(logger_path):
         try:
             os.remove(logger_path)
-            logger.add(logger_path)
+            handler_id = logger.add(logger_path)
         except:
             logger.warning('Failed to remove log file {}'.format(logger_path))
     else:
-        logger.add(logger_path)
+        handler_id = logger.add(logger_path)
+    return handler_id
+
+
+def run_model(*args, **kwargs):
+    """
+    Run a basin model for one climate.
+    :return: True if the run succeeded, False otherwise
+    """
+    climate = args[0]
+    basin = args[1]
+    run_name = kwargs['run_name']
 
+    handler_id = add_run_logger(run_name, basin, climate)
+
+    success = True
     try:
         _run_model(*args, **kwargs)
     except Exception as err:
         logger.exception(err)
         logger.error("Failed")
+        success = False
 
+    if handler_id is not None:
+        logger.remove(handler_id)
 
-def _run_model(climate,
-               basin,
-               start=None, end=None,
-               years=None,
-               run_name="default",
-               include_planning=False,
-               simplify=True,
-               use_multiprocessing=False,
-               debug=False,
-               planning_months=12,
-               scenarios=None,
-               show_progress=False,
-               data_path=None,
-               file_suffix=None):
-    logger.info("Running \"{}\" scenario for {} basin, {} climate".format(run_name, basin.upper(), climate.upper()))
+    return success
 
-    climate_set, climate_scenario = climate.split('/')
 
-    if debug:
-        from utilities import check_nan
-        basin_path = os.path.join(data_path, basin.replace('_', ' ').title() + ' River')
-        total_nan = check_nan(basin_path, climate)
+def run_model_climates(climates, basin, **kwargs):
+    """
+    Run several climates in one model, with the climates as a "Climate" scenario. The climates must share the same
+    dates (see get_run_dates).
+    """
+    run_name = kwargs['run_name']
 
-        try:
-            assert (total_nan == 0)
-            logger.info('No NaNs found in data files')
-        except AssertionError:
-            logger.warning('{} NaNs found in data files.'.format(total_nan))
+    handler_id = add_run_logger(run_name, basin, '{}+{}'.format(climates[0], len(climates) - 1))
 
-    # if debug:
-    #     from utilities import create_schematic
+    success = True
+    try:
+        _run_model(climates[0], basin, climates=climates, **kwargs)
+    except Exception as err:
+        logger.exception(err)
+        logger.error("Failed")
+        success = False
 
-    # Some adjustments
-    if basin in ['merced', 'tuolumne']:
-        include_planning = False
+    if handler_id is not None:
+        logger.remove(handler_id)
+
+    return success
 
-    # Set up dates
+
+def get_run_dates(climate, start=None, end=None):
+    climate_set, climate_scenario = climate.split('/')
 
     if start is None or end is None:
         if climate_scenario == 'Livneh':
@@ -97,261 +305,641 @@ def _run_model(climate,
         start = '{}-10-01'.format(start_year)
         end = '{}-09-30'.format(end_year)
 
-    # ========================
-    # Set up model environment
-    # ========================
+    return start, end
 
+
+def check_data(basin, climate, data_path, start=None, end=None, use_multiprocessing=False):
+    """
+    Check a basin's data for a climate before the model is loaded (see utilities.tests.validate_data). Files are only
+    read again if they have changed since the last check.
+    :param use_multiprocessing: Whether the check runs in one of several parallel jobs, in which case files are read
+        in this process only, rather than each job starting a process for every core
+    :raises Exception: If the climate's hydrology does not cover the run dates
+    """
+    from utilities.tests import validate_data
     here = os.path.dirname(os.path.realpath(__file__))
-    os.chdir(here)
+    basin_path = os.path.join(data_path, basin.replace('_', ' ').title() + ' River')
+    manifest_path = os.path.join(here, 'models', basin, 'temp', 'data_manifest.json')
+    results = validate_data(basin_path, climate, start=start, end=end, manifest_path=manifest_path,
+                            workers=1 if use_multiprocessing else None)
+
+    for path in results['nan_files']:
+        logger.warning('NaN found in {}'.format(path))
+    if results['nan']:
+        logger.warning('{} NaNs found in data files.'.format(results['nan']))
+    else:
+        logger.info('No NaNs found in data files')
+    for path in results['errors']:
+        logger.warning('Could not read {}'.format(path))
 
-    root_dir = os.path.join(here, 'models', basin)
-    temp_dir = os.path.join(root_dir, 'temp')
-    if not os.path.exists(temp_dir):
-        os.makedirs(temp_dir)
+    if results['short']:
+        raise Exception('Data files do not cover {} to {}:\n{}'.format(start, end, '\n'.join(results['short'])))
 
-    bucket = 'openagua-networks'
-    base_filename = 'pywr_model.json'
-    model_filename_base = 'pywr_model_{}'.format(climate_scenario)
-    model_filename = model_filename_base + '.json'
 
-    base_path = os.path.join(root_dir, base_filename)
-    model_path = os.path.join(temp_dir, model_filename)
+def register_components(basin, debug=False, model_paths=None):
+    """
+    Import and register the custom components (parameters, domains and recorders) needed to load a basin's models.
 
-    # first order of business: update file paths in json file
-    with open(base_path) as f:
-        base_model = json.load(f)
+    If model paths are given, only the custom parameter modules for the types used in those models are imported (see
+    utilities.components); otherwise, all of the basin's custom parameter modules are imported.
+    :param model_paths: The model files to be loaded, e.g., the daily and planning models (None entries are ignored)
+    """
 
-    # update model with scenarios, if any
-    def update_model(scenario_path):
-        if os.path.exists(scenario_path):
-            with open(scenario_path) as f:
-                scenario_model = json.load(f)
-            for key, scenario_items in scenario_model.items():
-                if key in base_model:
-                    if type(scenario_items) == dict:
-                        base_model[key].update(scenario_items)
-                    else:
-                        base_model[key].extend(scenario_items)
-                elif key in ['scenarios', 'nodes']:
-                    items = {item['name']: item for item in base_model.get(key, [])}
-                    new_items = {item['name']: item for item in scenario_items}
-                    items.update(new_items)
-                    base_model[key] = list(items.values())
-
-    if scenarios is not None:
-        for s in scenarios:
-            # update from scenarios folder
-            scenario_path = os.path.join(root_dir, '../../scenarios/{}.json'.format(s))
-            update_model(scenario_path)
-
-    new_model_parts = {}
-    for model_part in ['tables', 'parameters']:
-        if model_part not in base_model:
-            continue
-        new_model_parts[model_part] = {}
-        for pname, param in base_model[model_part].items():
-            if 'observed' in pname.lower():
-                continue
-            url = param.get('url')
-            if url:
-                if data_path:
-                    url = url.replace('../data', data_path)
-                url = url.replace('historical/Livneh', climate)
-                param['url'] = url
-            new_model_parts[model_part][pname] = param
-
-    base_model.update(new_model_parts)
-    base_model['timestepper']['start'] = start
-    base_model['timestepper']['end'] = end
-    with open(model_path, 'w') as f:
-        json.dump(base_model, f, indent=4)
-
-    # =========================================
-    # Load and register global model parameters
-    # =========================================
-
-    # sys.path.insert(0, os.getcwd())
-    policy_folder = 'parameters'
-    for filename in os.listdir(policy_folder):
-        if '__init__' in filename:
-            continue
-        policy_name = os.path.splitext(filename)[0]
-        policy_module = 'parameters.{policy_name}'.format(policy_name=policy_name)
-        import_module(policy_module, policy_folder)
-
-    # =========================================
-    # Load and register custom model parameters
-    # =========================================
+    # ================================================
+    # Load and register global and custom parameters
+    # ================================================
 
     sys.path.insert(0, os.getcwd())
-    policy_folder = os.path.join('models', basin, '_parameters')
-    for filename in os.listdir(policy_folder):
-        if '__init__' in filename:
-            continue
-        policy_name = os.path.splitext(filename)[0]
-        policy_module = 'models.{basin}._parameters.{policy_name}'.format(basin=basin, policy_name=policy_name)
-        import_module(policy_module, policy_folder)
+    if model_paths:
+        model_jsons = [_load_json(path) for path in model_paths if path]
+        modules = get_required_modules(basin, model_jsons)
+    else:
+        modules = sorted(set(get_component_index(basin).values()))
+    for module_name in modules:
+        import_module(module_name)
+    if debug:
+        logger.info("{} parameter modules imported".format(len(modules)))
 
     # import domains
     import_module('.domains', 'domains')
     if debug:
         logger.info("Domains imported")
 
-    # import custom policies
-    try:
-        import_module('{}.policies'.format(basin))
-    except:
-        pass
-
     # =========================================
     # Load and register custom model recorders
     # =========================================
 
     from recorders.hydropower import HydropowerEnergyRecorder
     HydropowerEnergyRecorder.register()
+    from recorders.windowed import register_windowed_recorders
+    register_windowed_recorders()
 
-    # prepare the model files
-    if simplify or include_planning:
-        with open(model_path, 'r') as f:
-            model_json = json.load(f)
-
-    if simplify:
-        # simplify model
-        simplified_filename = model_filename_base + '_simplified.json'
-        simplified_model_path = os.path.join(temp_dir, simplified_filename)
 
-        model_json = simplify_network(model_json, basin=basin, climate=climate, delete_gauges=True,
-                                      delete_observed=True)
-        with open(simplified_model_path, 'w') as f:
-            f.write(json.dumps(model_json, indent=4))
+def load_planning_model(planning_model_path):
+    # create pywr model
+    try:
+        with open(planning_model_path) as f:
+            planning_model_json = use_shared_tables(json.load(f))
+        planning_model = Model.load(planning_model_json, path=planning_model_path)
+        load_store_tables(planning_model, planning_model_json)
+        load_climate_tables(planning_model, planning_model_json)
+    except Exception as err:
+        logger.error("Planning model failed to load")
+        # logger.error(err)
+        raise
 
-        if debug:
-            try:
-                create_schematic(basin, 'simplified')
-            except FileNotFoundError as err:
-                logger.warning('Could not create schematic from Livneh model.')
+    # set model mode to planning
+    planning_model.mode = 'planning'
 
-        model_path = simplified_model_path
+    planning_model.setup()
 
-    # Area for testing monthly model
-    save_results = debug
-    planning_model = None
-    df_planning = None
+    # if debug == 'm':
+    #     test_planning_model(planning_model, months=planning_months, save_results=save_results)
+    #     return
 
-    if include_planning:
+    return planning_model
 
-        logger.info('Creating planning model (this may take a minute or two)')
 
-        # create filenames, etc.
-        monthly_filename = model_filename_base + '_monthly.json'
-        planning_model_path = os.path.join(temp_dir, monthly_filename)
+def load_daily_model(model_path, planning_model=None, planning_months=12, windowed=True):
+    """
+    Load the daily (scheduling) model.
+    :param windowed: Use windowed recorders, which hold only the results not yet written by the ResultsWriter (see
+        recorders.windowed), rather than the whole run
+    """
+    logger.info('Loading daily model')
+    try:
+        with open(model_path) as f:
+            model_json = use_shared_tables(json.load(f))
+        if windowed:
+            model_json = use_windowed_recorders(model_json)
+        model = Model.load(model_json, path=model_path)
+        load_store_tables(model, model_json)
+        load_climate_tables(model, model_json)
+    except Exception as err:
+        logger.error(err)
+        raise
 
-        prepare_planning_model(model_json, basin, climate, planning_model_path, steps=planning_months, debug=debug,
-                               remove_rim_dams=True)
+    model.setup()
 
-        if debug:
-            try:
-                create_schematic(basin, 'monthly')
-            except ExecutableNotFound:
-                logger.warning('Graphviz executable not found. Monthly schematic not created.')
+    if planning_model:
+        set_scheduling_end(model, planning_months)
+    model.mode = 'scheduling'
+    model.planning = None
+    model.planning_month = 1  # the month of the last plan that the scheduling model is in
+    if planning_model:
+        model.planning = planning_model
+        model.planning.scheduling = model
 
-        # create pywr model
-        try:
-            planning_model = Model.load(planning_model_path, path=planning_model_path)
-        except Exception as err:
-            logger.error("Planning model failed to load")
-            # logger.error(err)
-            raise
+    return model
 
-        # set model mode to planning
-        planning_model.mode = 'planning'
 
-        # set time steps
-        # start = planning_model.timestepper.start
-        end = planning_model.timestepper.end
-        end -= relativedelta(months=planning_months)
+def load_planning_pool(model, planning_model_path, basin, workers, planning_months=12, incremental=False,
+                       cache_size=0):
+    """
+    Run the planning model in several processes, each with a share of the scenarios (see utilities.planning_pool).
+    """
+    set_scheduling_end(model, planning_months)
+    model.planning = PlanningPool(model, planning_model_path, load_planning_model, workers,
+                                  recorders=SCHEDULING_RECORDERS.get(basin), incremental=incremental,
+                                  cache_size=cache_size)
+    return model.planning
 
-        planning_model.setup()
 
-        # if debug == 'm':
-        #     test_planning_model(planning_model, months=planning_months, save_results=save_results)
-        #     return
+def get_planning_schedule(settings, planning_months=12, planning_workers=1):
+    """
+    Create a PlanningSchedule (see utilities.planning_schedule).
+    :param settings: A dict of PlanningSchedule settings (interval, storage_threshold, etc.), or None for monthly
+    """
+    planning_schedule = PlanningSchedule(months=planning_months, **(settings or {}))
+    if planning_schedule.shrink_horizon and planning_workers > 1:
+        logger.warning('A shrinking planning horizon is not available with planning workers; using a fixed horizon')
+        planning_schedule.shrink_horizon = False
+    logger.info(planning_schedule)
+    return planning_schedule
 
-    # ==================
-    # Create daily model
-    # ==================
-    logger.info('Loading daily model')
-    try:
-        model = Model.load(model_path, path=model_path)
-    except Exception as err:
-        logger.error(err)
-        raise
 
-    model.setup()
+def set_scheduling_end(model, planning_months):
+    # IMPORTANT: The following can be embedded into the scheduling model via
+    # the 'before' and 'after' functions.
+    end = model.timestepper.end
+    new_end = end + relativedelta(months=-planning_months)
+    model.timestepper.end = new_end
+
+
+def simulate(model, debug=False, show_progress=False, checkpoint_path=None, resume=False, results_writer=None,
+             profiler=None, incremental_planning=False, planning_cache_size=0, planning_schedule=None,
+             planning_recorder=None):
+    """
+    Run the daily scheduling model, running the planning model (if any) at the start of each month.
+
+    If a results writer is given, results are written at the end of each water year and at the end of the run.
+    If a checkpoint path is given, the model state is saved there at the end of each water year, and, if resuming, the
+    run restarts from the last checkpoint. Checkpoints are taken on Sep 30, so the planning model, which is reset at
+    the start of each month, does not need to be restored mid-month.
+    :param checkpoint_path: The checkpoint directory (see utilities.checkpoint)
+    :param resume: Restart from the last checkpoint, if any
+    :param results_writer: A ResultsWriter
+    :param profiler: A Profiler, already added to the model, to time the run
+    :param incremental_planning: Reset the planning model incrementally and warm start its LP (see
+        utilities.warm_start)
+    :param planning_cache_size: The number of planning results to keep for reuse by scenario inputs, if any (see
+        utilities.planning_cache)
+    :param planning_schedule: A PlanningSchedule, to run the planning model less often than every month (see
+        utilities.planning_schedule)
+    :param planning_recorder: A PlanningRecorder, to record the decisions of each planning model run. In debug mode,
+        one is created if not given.
+    :return: The planning recorder, if any
+    """
+
+    include_planning = model.planning is not None
+    planning_pool = isinstance(model.planning, PlanningPool)
 
     # run model
-    # note that tqdm + step adds a little bit of overhead.
-    # use model.run() instead if seeing progress is not important
+    # the daily model is stepped in a tight loop between hooks (see utilities.driver), so the progress bar and date
+    # checks add no per-step overhead
+
+    start_step = 0
+    if checkpoint_path:
+        if resume:
+            rows_written = results_writer.get_rows_written() if results_writer else None
+            start_step = resume_from_checkpoint(model, checkpoint_path, rows_written=rows_written)
+        else:
+            clear_checkpoint(checkpoint_path)
+    if results_writer:
+        results_writer.start(start_step)
 
-    # IMPORTANT: The following can be embedded into the scheduling model via
-    # the 'before' and 'after' functions.
-    days_to_omit = 0
-    if include_planning:
-        end = model.timestepper.end
-        new_end = end + relativedelta(months=-planning_months)
-        model.timestepper.end = new_end
-    step = -1
     now = datetime.now()
     monthly_seconds = 0
-    model.mode = 'scheduling'
-    model.planning = None
-    if include_planning:
-        model.planning = planning_model
-        model.planning.scheduling = model
+    if profiler:
+        profiler.start()
 
     disable_progress_bar = not debug and not show_progress
     n_timesteps = len(model.timestepper.datetime_index)
-    for date in tqdm(model.timestepper.datetime_index, ncols=60, disable=disable_progress_bar):
-        step += 1
-        if disable_progress_bar and date.month == 9 and date.day == 30:
-            logger.info('{}% complete (finsished year {})'.format(round(step / n_timesteps * 100), date.year))
-        try:
 
-            # Step 1: run planning model
-            if include_planning and date.day == 1:
+    driver = RunDriver(model)
 
-                # update planning model
-                model.planning.reset(start=date.to_timestamp())
+    if include_planning and planning_schedule is None:
+        planning_schedule = PlanningSchedule()
+    if include_planning and not planning_schedule.planning_models:
+        planning_schedule.set_planning_models(model.planning)
+    model.planning_month = 1
 
-                # run planning model (intial conditions are set within the model step)
-                model.planning.step()
+    if include_planning and debug and planning_recorder is None and not planning_pool:
+        planning_recorder = PlanningRecorder(model, model.planning, months=planning_schedule.months)
 
-                if debug and save_results:
-                    df_month = get_planning_dataframe(model.planning)
-                    if df_planning is None:
-                        df_planning = df_month
-                    else:
-                        df_planning = pd.concat([df_planning, df_month])
+    incremental_resets = {}
 
-            # Step 2: run daily model
-            model.step()
-        except Exception as err:
-            traceback.print_exc()
-            logger.error('Failed at step {}'.format(date))
-            raise
+    def reset_planning_model(planning_model, start):
+        if incremental_planning and not planning_pool:
+            # (the pool's replicas are reset incrementally by the pool itself)
+            if id(planning_model) not in incremental_resets:
+                incremental_resets[id(planning_model)] = IncrementalReset(planning_model)
+            incremental_resets[id(planning_model)].reset(start=start)
+        else:
+            planning_model.reset(start=start)
+
+    planning_cache = None
+    if include_planning and planning_cache_size and not planning_pool:
+        # (the pool's replicas have their own caches)
+        planning_cache = PlanningCache(model.planning, size=planning_cache_size)
+
+    # Step 1: run planning model at the start of each month, as scheduled
+    def run_planning(step, date):
+        nonlocal monthly_seconds
+        monthly_start = datetime.now()
+
+        # update and run planning model (intial conditions are set within the model step)
+        reason = planning_schedule.run(date, model, reset_planning_model)
+        if reason and planning_recorder:
+            planning_recorder.record(date, model.planning, reason=reason)
+
+        monthly_seconds += (datetime.now() - monthly_start).total_seconds()
+
+    if include_planning:
+        driver.on_month_start(run_planning)
+
+    # Step 2: run daily model, in chunks between planning runs and water year ends
+    def end_water_year(step, date):
+        if disable_progress_bar:
+            logger.info('{}% complete (finsished year {})'.format(round(step / n_timesteps * 100), date.year))
+        if step < n_timesteps - 1:
+            # results first, so that a checkpoint never gets ahead of the results
+            if results_writer:
+                results_writer.write(step + 1)
+            if checkpoint_path:
+                save_checkpoint(model, checkpoint_path, step)
+
+    driver.on_water_year_end(end_water_year)
+
+    progress_bar = tqdm(ncols=60, initial=start_step, total=n_timesteps, disable=disable_progress_bar)
+    try:
+        driver.run(start_step=start_step, progress=progress_bar.update)
+    except Exception as err:
+        traceback.print_exc()
+        logger.error('Failed at step {}'.format(model.timestepper.datetime_index[driver.current_step]))
+        raise
+    finally:
+        progress_bar.close()
+        if planning_cache:
+            planning_cache.restore()
+            planning_cache.log_stats()
+        if include_planning:
+            # back to the full planning model, for the next run of a loaded model
+            model.planning = planning_schedule.planning_models[planning_schedule.months]
+            planning_schedule.log_stats()
+
+    if results_writer:
+        results_writer.write(n_timesteps)
+
+    if profiler:
+        profiler.stop()
 
     if debug:
         total_seconds = (datetime.now() - now).total_seconds()
         logger.debug('Total run: {} seconds'.format(total_seconds))
         monthly_pct = monthly_seconds / total_seconds * 100
         logger.debug('Monthly overhead: {} seconds ({:02}% of total)'.format(monthly_seconds, monthly_pct))
+        logger.debug('Daily steps: {steps:.1f} seconds; month start hooks: {month_start:.1f} seconds; '
+                     'water year end hooks: {water_year_end:.1f} seconds'.format(**driver.timings))
+
+    return planning_recorder
 
-    # save results to CSV
+
+def get_results_path(run_name, basin, climate, file_suffix, debug=False):
     # results_path = os.path.join('./results', run_name, basin, climate)
+    base_results_path = get_base_results_path(debug=debug)
+
+    return os.path.join(base_results_path, run_name, basin, climate + file_suffix)
+
+
+def save_profile(profiler, model, run_name, basin, climate, file_suffix, debug=False):
+    """
+    Remove the profiler's timers and save its report to <results>/<run name>/<basin>/profile-<climate>-<suffix>.csv.
+    """
+    profiler.restore()
+    profiler.add_solver_stats(model)
+    profile_path = os.path.join(get_base_results_path(debug=debug), run_name, basin,
+                                'profile-{}-{}.csv'.format(climate.replace('/', '_'), file_suffix))
+    os.makedirs(os.path.dirname(profile_path), exist_ok=True)
+    profiler.save(profile_path)
+
+
+def save_results(results_writer, results_format='csv'):
+    """
+    Finish saving results written during a run.
+    :param results_format: 'hdf5' to keep the results as written (results-<suffix>.h5), or 'csv' to save them to one
+        CSV file per dataset, as before
+    """
+    if results_format == 'csv':
+        results_writer.to_csv()
+        results_writer.remove()
+
+
+def _run_model(climate,
+               basin,
+               start=None, end=None,
+               years=None,
+               run_name="default",
+               include_planning=False,
+               simplify=True,
+               use_multiprocessing=False,
+               debug=False,
+               planning_months=12,
+               scenarios=None,
+               show_progress=False,
+               data_path=None,
+               file_suffix=None,
+               use_cache=True,
+               climates=None,
+               checkpoint=True,
+               resume=False,
+               results_format='csv',
+               profile=False,
+               incremental_planning=False,
+               planning_workers=1,
+               planning_cache=0,
+               planning_schedule=None,
+               save_planning=False,
+               shared_tables=None):
+    if climates:
+        logger.info("Running {} climates as a scenario: {}".format(len(climates), ', '.join(climates)))
+    logger.info("Running \"{}\" scenario for {} basin, {} climate".format(run_name, basin.upper(), climate.upper()))
+
+    # tables published in shared memory by the main process (see utilities.shared_tables)
+    attach_tables(shared_tables)
+
+    # if debug:
+    #     from utilities import create_schematic
+
+    # Some adjustments
+    if basin in ['merced', 'tuolumne']:
+        include_planning = False
+
+    # Set up dates
+    start, end = get_run_dates(climate, start, end)
+
     if debug:
-        base_results_path = '../results'
+        for _climate in climates or [climate]:
+            check_data(basin, _climate, data_path, start=start, end=end, use_multiprocessing=use_multiprocessing)
+
+    schedule = None
+    if include_planning:
+        schedule = get_planning_schedule(planning_schedule, planning_months, planning_workers)
+
+    # ========================
+    # Set up model environment
+    # ========================
+
+    here = os.path.dirname(os.path.realpath(__file__))
+    os.chdir(here)
+
+    model_path, planning_model_path = prepare_model_files(
+        basin, climate, start, end,
+        scenarios=scenarios,
+        data_path=data_path,
+        simplify=simplify,
+        include_planning=include_planning,
+        planning_months=planning_months,
+        planning_horizons=schedule.get_horizons() if include_planning else None,
+        debug=debug,
+        use_cache=use_cache,
+        climates=climates
+    )
+
+    register_components(basin, debug=debug, model_paths=[model_path, planning_model_path])
+
+    if debug and simplify:
+        try:
+            create_schematic(basin, 'simplified', model_path=model_path)
+        except FileNotFoundError as err:
+            logger.warning('Could not create schematic from Livneh model.')
+
+    planning_model = None
+
+    use_planning_pool = include_planning and planning_workers > 1
+    if use_planning_pool and multiprocessing.current_process().daemon:
+        logger.warning('Planning workers cannot be started from a multiprocessing pool; running planning serially')
+        use_planning_pool = False
+
+    if include_planning:
+
+        if debug:
+            try:
+                create_schematic(basin, 'monthly', model_path=planning_model_path)
+            except ExecutableNotFound:
+                logger.warning('Graphviz executable not found. Monthly schematic not created.')
+
+        if not use_planning_pool:
+            planning_model = load_planning_model(planning_model_path)
+
+    # ==================
+    # Create daily model
+    # ==================
+    model = load_daily_model(model_path, planning_model=planning_model, planning_months=planning_months)
+
+    if use_planning_pool:
+        load_planning_pool(model, planning_model_path, basin, planning_workers, planning_months=planning_months,
+                           incremental=incremental_planning, cache_size=planning_cache)
+
+    if include_planning:
+        schedule.set_planning_models(model.planning, planning_model_path, load_planning_model)
+
+    checkpoint_path = None
+    if checkpoint:
+        checkpoint_name = '{}+{}'.format(climate, len(climates) - 1) if climates else climate
+        checkpoint_path = get_checkpoint_path(run_name, basin, checkpoint_name, debug=debug)
+
+    if climates:
+        # save each climate to its usual location
+        results_path = {c: get_results_path(run_name, basin, c, file_suffix, debug=debug) for c in climates}
     else:
-        base_results_path = os.environ.get('SIERRA_RESULTS_PATH', '../results')
+        results_path = get_results_path(run_name, basin, climate, file_suffix, debug=debug)
+    results_writer = ResultsWriter(model, results_path, file_suffix)
+
+    planning_recorder = None
+    if include_planning and save_planning:
+        if use_planning_pool:
+            logger.warning('Planning decisions are not saved with planning workers')
+        else:
+            planning_recorder = PlanningRecorder(model, model.planning, months=planning_months)
+
+    profiler = None
+    if profile:
+        profiler = Profiler()
+        profiler.instrument(model)
+
+    try:
+        planning_recorder = simulate(
+            model, debug=debug, show_progress=show_progress, checkpoint_path=checkpoint_path, resume=resume,
+            results_writer=results_writer, profiler=profiler, incremental_planning=incremental_planning,
+            planning_cache_size=planning_cache, planning_schedule=schedule, planning_recorder=planning_recorder)
+    finally:
+        if use_planning_pool:
+            model.planning.close()
+        if profiler:
+            profile_name = '{}+{}'.format(climate, len(climates) - 1) if climates else climate
+            save_profile(profiler, model, run_name, basin, profile_name, file_suffix, debug=debug)
+
+    save_results(results_writer, results_format)
+    if planning_recorder:
+        planning_recorder.save(results_path, file_suffix)
+
+    if checkpoint_path:
+        clear_checkpoint(checkpoint_path)
+
+
+def run_models_warm(climates, basin, **kwargs):
+    """
+    Run a basin model for several climates, loading the model only once.
+
+    The first climate is run as usual. For each subsequent climate, the already loaded daily (and planning) model is
+    switched to the new climate's data by reloading only the tables and dataframe parameters that differ, and then
+    reset, rather than loading and setting up the model again.
+    :return: A dict of climate: True if the run succeeded, False otherwise
+    """
+    run_name = kwargs['run_name']
+    results = {}
+    for climate in climates:
+        handler_id = add_run_logger(run_name, basin, climate)
+        results[climate] = True
+        try:
+            _run_model_warm(climate, basin, **kwargs)
+        except Exception as err:
+            logger.exception(err)
+            logger.error("Failed")
+            results[climate] = False
+            # start over with a freshly loaded model for the next climate
+            _warm_models.pop(basin, None)
+        if handler_id is not None:
+            logger.remove(handler_id)
+    return results
+
+
+# Loaded models, by basin, along with the model definitions they currently represent
+_warm_models = {}
+
+
+def _load_json(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def _run_model_warm(climate,
+                    basin,
+                    start=None, end=None,
+                    run_name="default",
+                    include_planning=False,
+                    simplify=True,
+                    debug=False,
+                    planning_months=12,
+                    scenarios=None,
+                    show_progress=False,
+                    data_path=None,
+                    file_suffix=None,
+                    use_cache=True,
+                    checkpoint=True,
+                    resume=False,
+                    results_format='csv',
+                    profile=False,
+                    incremental_planning=False,
+                    planning_workers=1,
+                    planning_cache=0,
+                    planning_schedule=None,
+                    save_planning=False,
+                    use_multiprocessing=False,
+                    shared_tables=None,
+                    **kwargs):
+    logger.info("Running \"{}\" scenario for {} basin, {} climate (warm)".format(run_name, basin.upper(),
+                                                                                 climate.upper()))
+
+    attach_tables(shared_tables)
+
+    if basin in ['merced', 'tuolumne']:
+        include_planning = False
+
+    if include_planning and planning_workers > 1:
+        logger.warning('Planning workers are not used when keeping models loaded; running planning serially')
+
+    start, end = get_run_dates(climate, start, end)
 
-    results_path = os.path.join(base_results_path, run_name, basin, climate+file_suffix)
-    save_model_results(model, results_path, file_suffix)
+    if debug:
+        check_data(basin, climate, data_path, start=start, end=end, use_multiprocessing=use_multiprocessing)
+
+    schedule = None
+    if include_planning:
+        schedule = get_planning_schedule(planning_schedule, planning_months)
+
+    here = os.path.dirname(os.path.realpath(__file__))
+    os.chdir(here)
+
+    model_path, planning_model_path = prepare_model_files(
+        basin, climate, start, end,
+        scenarios=scenarios,
+        data_path=data_path,
+        simplify=simplify,
+        include_planning=include_planning,
+        planning_months=planning_months,
+        planning_horizons=schedule.get_horizons() if include_planning else None,
+        debug=debug,
+        use_cache=use_cache
+    )
+
+    model_json = _load_json(model_path)
+    planning_json = _load_json(planning_model_path) if include_planning else None
+
+    warm = _warm_models.get(basin)
+    rebound = False
+    if warm is not None:
+        model, old_model_json, planning_model, old_planning_json = warm
+        rebound = rebind_model(model, old_model_json, model_json)
+        if rebound and planning_model is not None:
+            rebound = rebind_model(planning_model, old_planning_json, planning_json)
+        if rebound and model.timestepper.dirty:
+            # dates have changed
+            if planning_model is not None:
+                planning_model.setup()
+                set_scheduling_end(model, planning_months)
+        if rebound:
+            logger.info('Reusing loaded model')
+        else:
+            logger.info('Model structure has changed; reloading')
+
+    if not rebound:
+        register_components(basin, debug=debug, model_paths=[model_path, planning_model_path])
+        planning_model = load_planning_model(planning_model_path) if include_planning else None
+        model = load_daily_model(model_path, planning_model=planning_model, planning_months=planning_months)
+
+    _warm_models[basin] = (model, model_json, planning_model, planning_json)
+
+    if include_planning:
+        schedule.set_planning_models(model.planning, planning_model_path, load_planning_model)
+
+    checkpoint_path = get_checkpoint_path(run_name, basin, climate, debug=debug) if checkpoint else None
+
+    results_path = get_results_path(run_name, basin, climate, file_suffix, debug=debug)
+    results_writer = ResultsWriter(model, results_path, file_suffix)
+
+    planning_recorder = None
+    if include_planning and save_planning:
+        planning_recorder = PlanningRecorder(model, model.planning, months=planning_months)
+
+    profiler = None
+    if profile:
+        profiler = Profiler()
+        profiler.instrument(model)
+
+    try:
+        planning_recorder = simulate(
+            model, debug=debug, show_progress=show_progress, checkpoint_path=checkpoint_path, resume=resume,
+            results_writer=results_writer, profiler=profiler, incremental_planning=incremental_planning,
+            planning_cache_size=planning_cache, planning_schedule=schedule, planning_recorder=planning_recorder)
+    finally:
+        if profiler:
+            save_profile(profiler, model, run_name, basin, climate, file_suffix, debug=debug)
+
+    save_results(results_writer, results_format)
+    if planning_recorder:
+        planning_recorder.save(results_path, file_suffix)
+
+    if checkpoint_path:
+        clear_checkpoint(checkpoint_path)
@@ -0,0 +1,6 @@
+import os
+import sys
+
+# modules are imported as from the pywr_models folder (e.g., utilities.monthly_tables), and some as pywr_models.*
+here = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+sys.path[:0] = [here, os.path.dirname(here)]
@@ -0,0 +1,65 @@
+from datetime import date, datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+from utilities.cumulative_sums import CumulativeSeries, get_cumulative_series
+
+
+def daily_series(start='2000-10-01', periods=1000, seed=0):
+    rng = np.random.default_rng(seed)
+    values = rng.gamma(2.0, 3.0, periods)
+    values[rng.choice(periods, 20, replace=False)] = np.nan
+    return pd.Series(values, index=pd.date_range(start, periods=periods, freq='D'))
+
+
+def random_windows(series, n=200, seed=1):
+    rng = np.random.default_rng(seed)
+    first = series.index[0] - timedelta(days=30)
+    for _ in range(n):
+        start = first + timedelta(days=int(rng.integers(0, len(series) + 60)))
+        end = start + timedelta(days=int(rng.integers(-5, 400)))
+        yield start.to_pydatetime(), end.to_pydatetime()
+
+
+def test_window_sums_match_slicing():
+    series = daily_series()
+    cumulative = CumulativeSeries(series)
+    assert cumulative.contiguous
+    for start, end in random_windows(series):
+        assert np.isclose(cumulative.sum(start, end), series[start:end].sum())
+
+
+def test_window_sums_with_gaps():
+    series = daily_series()
+    series = series.drop(series.index[100:130]).drop(series.index[500:501])
+    cumulative = CumulativeSeries(series)
+    assert not cumulative.contiguous
+    for start, end in random_windows(series):
+        assert np.isclose(cumulative.sum(start, end), series[start:end].sum())
+
+
+def test_dates_and_datetimes():
+    series = daily_series()
+    cumulative = CumulativeSeries(series)
+    expected = series['2001-04-01':'2001-07-31'].sum()
+    assert np.isclose(cumulative.sum(date(2001, 4, 1), date(2001, 7, 31)), expected)
+    assert np.isclose(cumulative.sum(datetime(2001, 4, 1, 12), datetime(2001, 7, 31)), expected)
+    assert cumulative.sum(date(1990, 1, 1), date(1990, 12, 31)) == 0.0
+    assert cumulative.sum(date(2001, 4, 2), date(2001, 4, 1)) == 0.0
+
+
+class _Model(object):
+    pass
+
+
+def test_cache_by_data():
+    df = pd.concat([daily_series(seed=0), daily_series(seed=1)], axis=1)
+    model = _Model()
+    first = get_cumulative_series(model, 'Runoff', df, 1)
+    assert get_cumulative_series(model, 'Runoff', df, 1) is first
+    assert np.isclose(first.sum(date(2001, 1, 1), date(2001, 1, 31)), df.iloc[:, 1]['2001-01-01':'2001-01-31'].sum())
+
+    # other columns, and replaced data (e.g., for another climate), get their own prefix sums
+    assert get_cumulative_series(model, 'Runoff', df, 0) is not first
+    assert get_cumulative_series(model, 'Runoff', df.copy(), 1) is not first
@@ -0,0 +1,72 @@
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from utilities.energy_prices import PriceCube, get_price_cube
+
+
+def price_table(start, end, freq='D', columns=3):
+    dates = pd.date_range(start, end, freq=freq)
+    values = np.arange(len(dates) * columns, dtype=float).reshape(len(dates), columns)
+    return pd.DataFrame(values, index=dates.strftime('%Y-%m-%d'), columns=[str(c) for c in range(1, columns + 1)])
+
+
+def test_lookups_match_table():
+    table = price_table('2004-01-01', '2005-12-31')
+    cube = PriceCube(table)
+    for date in ['2004-01-01', '2004-06-15', '2005-02-28', '2005-12-31']:
+        d = datetime.strptime(date, '%Y-%m-%d')
+        assert cube.at(d.year, d, '2') == table.at[date, '2']
+        assert np.array_equal(cube.row(d.year, d), table.loc[date].values)
+
+    # the same month and day in another price year
+    assert cube.at(2005, datetime(2030, 7, 4), '3') == table.at['2005-07-04', '3']
+
+
+def test_february_29():
+    table = price_table('2004-01-01', '2005-12-31')  # 2004 is a leap year
+    cube = PriceCube(table)
+
+    # in a leap simulation year, February 29 is priced as February 28, in leap and non-leap price years
+    assert np.array_equal(cube.row(2004, datetime(2008, 2, 29)), table.loc['2004-02-28'].values)
+    assert np.array_equal(cube.row(2005, datetime(2008, 2, 29)), table.loc['2005-02-28'].values)
+
+    # February 29 prices are only included in a month if both the simulation year and the price year are leap years
+    assert len(cube.between(2004, datetime(2008, 2, 1), datetime(2008, 2, 29))) == 29
+    assert len(cube.between(2005, datetime(2008, 2, 1), datetime(2008, 2, 29))) == 28
+    assert len(cube.between(2004, datetime(2009, 2, 1), datetime(2009, 2, 28))) == 28
+    assert np.array_equal(cube.between(2004, datetime(2009, 2, 1), datetime(2009, 2, 28)),
+                          table.loc['2004-02-01':'2004-02-28'].values)
+
+    # the days after February are in the same position in leap and non-leap years
+    assert np.array_equal(cube.row(2005, datetime(2008, 3, 1)), table.loc['2005-03-01'].values)
+    assert np.array_equal(cube.row(2004, datetime(2009, 3, 1)), table.loc['2004-03-01'].values)
+
+
+def test_missing_prices():
+    cube = PriceCube(price_table('2004-01-01', '2005-12-31', freq='MS'))  # monthly
+    assert cube.at(2004, datetime(2010, 5, 1), '1') == 12  # the fifth row
+    with pytest.raises(KeyError):
+        cube.at(2004, datetime(2010, 5, 2), '1')
+    with pytest.raises(KeyError):
+        cube.at(2003, datetime(2010, 5, 1), '1')
+    assert len(cube.between(2005, datetime(2010, 1, 1), datetime(2010, 12, 31))) == 12
+
+
+class _Model(object):
+    def __init__(self, tables):
+        self.tables = tables
+
+
+def test_price_cube_cache():
+    model = _Model({'Energy Price Values': price_table('2004-01-01', '2004-12-31')})
+    cube = get_price_cube(model, 'Energy Price Values')
+    assert get_price_cube(model, 'Energy Price Values') is cube
+    assert get_price_cube(model, 'Energy Price Blocks') is None
+
+    # a replaced table (e.g., for another climate) gets a new cube
+    model.tables['Energy Price Values'] = price_table('2005-01-01', '2005-12-31')
+    assert get_price_cube(model, 'Energy Price Values') is not cube
+    assert 2005 in get_price_cube(model, 'Energy Price Values').years
@@ -0,0 +1,59 @@
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from utilities.energy_prices import PriceCube
+from utilities.monthly_tables import get_price_duration, get_price_duration_month
+
+
+def hourly_prices(start, end):
+    dates = pd.date_range(start, end, freq='D')
+    rng = np.random.default_rng(0)
+    return pd.DataFrame(rng.uniform(10, 100, (len(dates), 24)), index=dates.strftime('%Y-%m-%d'),
+                        columns=[str(h) for h in range(1, 25)])
+
+
+def test_price_duration_february():
+    prices = hourly_prices('2004-01-01', '2005-12-31')  # 2004 is a leap year
+    durations = get_price_duration(prices)
+
+    assert '2004-02' in durations.index and '2004-02-29' in durations.index
+    assert '2005-02-29' not in durations.index
+    assert durations.loc['2004-02'].notna().sum() == 28 * 24
+    assert durations.loc['2004-02-29'].notna().sum() == 29 * 24
+    assert durations.loc['2005-02'].notna().sum() == 28 * 24
+    assert durations.loc['2004-03'].notna().sum() == 31 * 24
+
+    # descending, and the same prices as the month's rows
+    values = durations.loc['2004-02-29'].dropna().values
+    assert np.all(np.diff(values) <= 0)
+    expected = np.sort(prices.loc['2004-02-01':'2004-02-29'].values.ravel())[::-1]
+    assert np.array_equal(values, expected)
+    expected = np.sort(prices.loc['2004-02-01':'2004-02-28'].values.ravel())[::-1]
+    assert np.array_equal(durations.loc['2004-02'].dropna().values, expected)
+
+
+def test_price_duration_month():
+    # leap simulation year
+    assert get_price_duration_month(2004, datetime(2008, 2, 1)) == '2004-02-29'
+    assert get_price_duration_month(2005, datetime(2008, 2, 1)) == '2005-02'
+    # non-leap simulation year
+    assert get_price_duration_month(2004, datetime(2009, 2, 1)) == '2004-02'
+    assert get_price_duration_month(2005, datetime(2009, 2, 1)) == '2005-02'
+    assert get_price_duration_month(2004, datetime(2008, 3, 1)) == '2004-03'
+
+
+def test_price_duration_matches_daily_prices():
+    # the price duration of a month is the same as sorting the month's hourly prices from the price cube, as
+    # PH_Water_Demand does without the table
+    prices = hourly_prices('2004-01-01', '2005-12-31')
+    durations = get_price_duration(prices)
+    cube = PriceCube(prices)
+    for year in [2008, 2009]:
+        start = datetime(year, 2, 1)
+        end = datetime(year, 2, 29 if year == 2008 else 28)
+        for price_year in [2004, 2005]:
+            expected = np.sort(cube.between(price_year, start, end).flatten())[::-1]
+            values = durations.loc[get_price_duration_month(price_year, start)].dropna().values
+            assert np.array_equal(values, expected)
@@ -0,0 +1,92 @@
+import random
+
+import pytest
+
+from utilities.network_index import NetworkIndex
+
+
+def small_network():
+    # two reservoirs on branches joining above a gauge, with a diversion around the lower one
+    return {
+        'nodes': [
+            {'name': 'Upper Inflow', 'type': 'Catchment'},
+            {'name': 'Upper Lake', 'type': 'Reservoir'},
+            {'name': 'Upper PH', 'type': 'Hydropower'},
+            {'name': 'Side Inflow', 'type': 'Catchment'},
+            {'name': 'Side Lake', 'type': 'Reservoir'},
+            {'name': 'Junction', 'type': 'Link'},
+            {'name': 'Diversion', 'type': 'Link'},
+            {'name': 'Gauge', 'type': 'Link'},
+            {'name': 'Outflow', 'type': 'Output'},
+        ],
+        'edges': [
+            ['Upper Inflow', 'Upper Lake'], ['Upper Lake', 'Upper PH'], ['Upper PH', 'Junction'],
+            ['Side Inflow', 'Side Lake'], ['Side Lake', 'Junction'], ['Junction', 'Gauge'],
+            ['Upper Lake', 'Diversion'], ['Diversion', 'Gauge'], ['Gauge', 'Outflow'],
+            ['Gauge', 'Outflow'],  # duplicate
+        ],
+        'parameters': {'Upper Lake/Storage Value': {}, 'Upper PH/Demand': {}, 'Price Year': {}},
+        'recorders': {'Upper Lake/storage': {'node': 'Upper Lake'}, 'Gauge/flow': {'node': 'Gauge'}},
+    }
+
+
+def test_closures():
+    network = NetworkIndex.from_json(small_network())
+    assert network.upstream('Junction') == ['Upper Inflow', 'Upper Lake', 'Upper PH', 'Side Inflow', 'Side Lake']
+    assert network.upstream('Upper Inflow') == []
+    assert network.downstream('Upper Lake') == ['Upper PH', 'Junction', 'Diversion', 'Gauge', 'Outflow']
+    assert network.downstream('Outflow') == []
+
+    # closures are copies, so callers can change them
+    network.upstream('Gauge').clear()
+    assert len(network.upstream('Gauge')) == 7
+
+
+def test_lookups():
+    network = NetworkIndex.from_json(small_network())
+    assert len(network.edges) == 9
+    assert network.nodes_of_type('reservoir') == ['Upper Lake', 'Side Lake']
+    assert network.nodes_of_type('Reservoir', 'hydropower') == ['Upper Lake', 'Upper PH', 'Side Lake']
+    assert network.parameters_of('Upper Lake') == ['Upper Lake/Storage Value']
+    assert network.recorders_of('Gauge') == ['Gauge/flow']
+    assert network.recorders_of('Side Lake') == []
+
+
+def test_topological_order():
+    network = NetworkIndex.from_json(small_network())
+    order = network.topological_order()
+    assert sorted(order) == sorted(network.nodes)
+    position = {name: i for i, name in enumerate(order)}
+    assert all(position[a] < position[b] for a, b in network.edges)
+
+    m = small_network()
+    m['edges'].append(['Outflow', 'Upper Lake'])
+    with pytest.raises(ValueError):
+        NetworkIndex.from_json(m).topological_order()
+
+
+def _reachable(name, edges):
+    # the nodes reachable from a node, by repeatedly adding the targets of edges from nodes already reached
+    reached = {name}
+    while True:
+        new = {b for a, b in edges if a in reached} - reached
+        if not new:
+            break
+        reached |= new
+    reached.discard(name)
+    return reached
+
+
+def test_closures_match_reachability():
+    rng = random.Random(0)
+    nodes = ['n{}'.format(i) for i in range(60)]
+    edges = set()
+    for _ in range(120):
+        i, j = sorted(rng.sample(range(len(nodes)), 2))
+        edges.add((nodes[i], nodes[j]))
+    network = NetworkIndex(nodes, sorted(edges))
+    reversed_edges = {(b, a) for a, b in edges}
+    for name in nodes:
+        assert set(network.downstream(name)) == _reachable(name, edges)
+        assert set(network.upstream(name)) == _reachable(name, reversed_edges)
+        assert network.upstream(name) == sorted(network.upstream(name), key=nodes.index)
@@ -0,0 +1,38 @@
+import numpy as np
+
+from utilities.planning_cache import get_input_digests
+
+
+def test_same_inputs_same_key():
+    values = np.array([[1.0, 2.0, 1.0], [0.5, 0.5, 0.5]])  # by parameter and scenario
+    volumes = np.array([[100.0, 100.0, 100.0]])
+    digests = get_input_digests(10, 31, values, volumes)
+    assert len(digests) == 3
+    assert digests[0] == digests[2] != digests[1]
+
+    # the same inputs in a later month (e.g., a later year) give the same keys
+    assert get_input_digests(10, 31, values.copy(), volumes.copy()) == digests
+
+
+def test_inputs_in_key():
+    values = np.array([[1.0, 2.0], [0.5, 0.5]])
+    volumes = np.array([[100.0, 100.0], [20.0, 20.0]])
+    digests = get_input_digests(10, 31, values, volumes)
+
+    assert get_input_digests(11, 31, values, volumes)[0] != digests[0]  # start month
+    assert get_input_digests(10, 30, values, volumes)[0] != digests[0]  # time step length
+
+    changed = values.copy()
+    changed[1, 0] = 0.5000001
+    assert get_input_digests(10, 31, changed, volumes) != digests
+    assert get_input_digests(10, 31, changed, volumes)[1] == digests[1]
+
+    changed = volumes.copy()
+    changed[1, 1] = 21.0
+    assert get_input_digests(10, 31, values, changed)[0] == digests[0]
+    assert get_input_digests(10, 31, values, changed)[1] != digests[1]
+
+
+def test_lists_and_no_storage():
+    values = [np.array([1.0, 2.0]), np.array([3.0, 4.0])]  # e.g., memoryviews from get_all_values()
+    assert get_input_digests(1, 31, values, []) == get_input_digests(1, 31, np.array(values), np.zeros((0, 2)))
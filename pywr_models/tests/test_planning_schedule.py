@@ -0,0 +1,88 @@
+from types import SimpleNamespace
+
+import pandas as pd
+import pytest
+
+from utilities.planning_schedule import PlanningSchedule, get_planning_model_path, months_to_water_year_end
+
+
+def run_schedule(schedule, start='2000-10-01', end='2002-09-30'):
+    """
+    Run a schedule at the start of each month, with a stand-in planning model.
+    :return: A dict of month (YYYY-MM): (reason, horizon, planning month) for each month
+    """
+    model = SimpleNamespace(planning=None, planning_month=1)
+    planning_models = {h: SimpleNamespace(horizon=h, step=lambda: None) for h in schedule.get_horizons()}
+    schedule.set_planning_models(planning_models[schedule.months])
+    schedule.planning_models.update(planning_models)
+
+    runs = {}
+    for date in pd.period_range(start, end, freq='M').asfreq('D', how='start'):
+        reason = schedule.run(date, model, lambda planning_model, start: None)
+        runs[date.strftime('%Y-%m')] = (reason, model.planning.horizon, model.planning_month)
+    return runs
+
+
+def test_monthly():
+    runs = run_schedule(PlanningSchedule())
+    assert runs['2000-10'] == ('first', 12, 1)
+    assert all(reason == 'interval' for reason, horizon, month in list(runs.values())[1:])
+
+
+@pytest.mark.parametrize('interval, months', [
+    (3, ['10', '01', '04', '07']),
+    (6, ['10', '04']),
+    (12, ['10']),
+])
+def test_intervals(interval, months):
+    schedule = PlanningSchedule(interval=interval)
+    runs = run_schedule(schedule)
+    planned = sorted({key[5:] for key, (reason, horizon, month) in runs.items() if reason})
+    assert planned == sorted(months)
+
+    # between plans, the scheduling model reads later months of the last plan
+    assert runs['2001-10'][2] == 1
+    if interval > 1:
+        assert runs['2001-11'] == (None, 12, 2)
+    assert sum(schedule.plans.values()) == 24 // interval
+
+
+def test_invalid_interval():
+    with pytest.raises(ValueError):
+        PlanningSchedule(interval=5)
+
+
+def test_horizon_and_forecast_months():
+    # a plan that ends before the next regular planning month is renewed
+    schedule = PlanningSchedule(months=2, interval=3)
+    runs = run_schedule(schedule, end='2001-09-30')
+    assert [runs[m][0] for m in ['2000-10', '2000-11', '2000-12', '2001-01']] == ['first', None, 'horizon', 'interval']
+
+    schedule = PlanningSchedule(interval=12, forecast_months=[2, 3])
+    runs = run_schedule(schedule, end='2001-09-30')
+    assert {m: r[0] for m, r in runs.items() if r[0]} == {'2000-10': 'first', '2001-02': 'forecast',
+                                                          '2001-03': 'forecast'}
+    assert schedule.plans == {'first': 1, 'forecast': 2}
+
+
+def test_shrinking_horizon():
+    assert [months_to_water_year_end(pd.Timestamp(2001, m, 1)) for m in [10, 11, 1, 9]] == [12, 11, 9, 1]
+
+    schedule = PlanningSchedule(shrink_horizon=True)
+    assert schedule.get_horizons() == list(range(1, 13))
+    runs = run_schedule(schedule, end='2001-09-30')
+    assert [runs[m][1] for m in ['2000-10', '2001-03', '2001-09']] == [12, 7, 1]
+
+    # a quarterly plan made in July covers July to September
+    schedule = PlanningSchedule(months=6, interval=3, shrink_horizon=True)
+    runs = run_schedule(schedule, end='2001-09-30')
+    assert [runs[m][1] for m in ['2000-10', '2001-01', '2001-04', '2001-07']] == [6, 6, 6, 3]
+    assert runs['2001-09'] == (None, 3, 3)
+
+
+def test_planning_model_paths():
+    assert get_planning_model_path('models/pywr_model_monthly.json', 3) == 'models/pywr_model_monthly_3.json'
+    schedule = PlanningSchedule(months=3, shrink_horizon=True)
+    schedule.set_planning_models(None, 'models/pywr_model_monthly.json')
+    assert schedule.planning_model_paths == {1: 'models/pywr_model_monthly_1.json',
+                                             2: 'models/pywr_model_monthly_2.json'}
@@ -1,4 +1,5 @@
 from .network import simplify_network
+from .network_index import NetworkIndex
 from .planning import prepare_planning_model
 from .schematics import create_schematic
 from .results import save_model_results
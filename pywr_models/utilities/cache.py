@@ -0,0 +1,97 @@
+import os
+import json
+import hashlib
+from loguru import logger
+
+# Source files whose contents determine the assembled model JSON. If any of these change, the cache is invalidated.
+BUILD_SOURCES = ['network.py', 'network_index.py', 'planning.py', 'inflow_store.py', 'hydrology_store.py',
+                 'monthly_tables.py', 'climates.py']
+
+COMPLETE_FLAG = '.complete'
+
+
+def _hash_file(h, path):
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+
+
+def model_cache_key(base_path, scenario_paths=None, **settings):
+    """
+    Create a content-addressed key for an assembled model.
+    :param base_path: Path to the base pywr_model.json
+    :param scenario_paths: Paths to scenario overlay files, in the order they are applied
+    :param settings: Other settings that affect the assembled model (climate, dates, planning options, etc.)
+    :return: A hex digest
+    """
+    h = hashlib.sha256()
+    _hash_file(h, base_path)
+
+    for scenario_path in scenario_paths or []:
+        h.update(scenario_path.encode())
+        if os.path.exists(scenario_path):
+            _hash_file(h, scenario_path)
+
+    here = os.path.dirname(os.path.realpath(__file__))
+    for filename in BUILD_SOURCES:
+        _hash_file(h, os.path.join(here, filename))
+
+    h.update(json.dumps(settings, sort_keys=True, default=str).encode())
+
+    return h.hexdigest()[:16]
+
+
+def get_file_stamps(paths):
+    """
+    Get the size and modified time of each of a list of files, or None for files that do not exist.
+    """
+    stamps = {}
+    for path in paths:
+        try:
+            stat = os.stat(path)
+            stamps[path] = [stat.st_size, stat.st_mtime]
+        except OSError:
+            stamps[path] = None
+    return stamps
+
+
+def is_cached(cache_dir):
+    """
+    Check if a model has been assembled in a cache directory, and the data files it was derived from (see mark_cached)
+    have not changed since.
+    """
+    path = os.path.join(cache_dir, COMPLETE_FLAG)
+    if not os.path.exists(path):
+        return False
+    with open(path) as f:
+        text = f.read()
+    if not text:
+        return True
+    stamps = json.loads(text)
+    if get_file_stamps(stamps) != stamps:
+        logger.info('Data files have changed since the model files were assembled; assembling them again')
+        return False
+    return True
+
+
+def mark_cached(cache_dir, sources=None):
+    """
+    Mark a model as assembled in a cache directory.
+    :param sources: Data files that cached data was derived from (e.g., the daily data of the monthly tables), so
+        that the model is assembled again if any of them change
+    """
+    write_atomic(os.path.join(cache_dir, COMPLETE_FLAG), json.dumps(get_file_stamps(sources or [])))
+
+
+def write_atomic(path, text):
+    """
+    Write text to a file such that concurrent readers never see a partially written file.
+    """
+    tmp_path = '{}.{}.tmp'.format(path, os.getpid())
+    with open(tmp_path, 'w') as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+def dump_json(data, path, indent=None):
+    write_atomic(path, json.dumps(data, indent=indent))
@@ -0,0 +1,180 @@
+import os
+import shutil
+import pickle
+import numpy as np
+from pywr._core import AbstractNode, AbstractStorage
+from pywr.parameters import IndexParameter
+from loguru import logger
+
+from utilities.results import get_base_results_path
+from utilities.planning_pool import PlanningPool
+
+CHECKPOINT_DIR = '_checkpoints'
+STATE_FILE = 'state.pkl'
+
+
+def get_checkpoint_path(run_name, basin, climate, debug=False):
+    """
+    Get the checkpoint directory for a basin and climate, which holds the latest simulation state (state.pkl).
+    """
+    return os.path.join(get_base_results_path(debug=debug), run_name, CHECKPOINT_DIR, basin, climate)
+
+
+def clear_checkpoint(checkpoint_path):
+    if os.path.exists(checkpoint_path):
+        shutil.rmtree(checkpoint_path)
+
+
+def _model_signature(model):
+    # used to check that a checkpoint was made with the same model
+    return dict(
+        start=str(model.timestepper.start),
+        end=str(model.timestepper.end),
+        scenarios=[(s.name, s.size) for s in model.scenarios.scenarios],
+        nodes=len(model.nodes),
+        parameters=len(model.parameters),
+    )
+
+
+def get_model_state(model):
+    """
+    Get the state of a model that carries over from one time step to the next: node flows in the previous time step,
+    storage volumes, the last values (and indices) of all parameters, and the state kept by custom parameters (see
+    WaterLPParameter.get_state).
+    """
+    nodes = {}
+    for node in model.nodes:
+        if isinstance(node, AbstractStorage):
+            nodes[node.name] = dict(volume=np.array(node.volume), current_pc=np.array(node.current_pc))
+        else:
+            nodes[node.name] = dict(prev_flow=node.prev_flow)
+
+    parameters = {}
+    for parameter in model.parameters:
+        if not parameter.name:
+            continue
+        parameter_state = dict(values=np.array(parameter.get_all_values()))
+        if isinstance(parameter, IndexParameter):
+            parameter_state['indices'] = np.array(parameter.get_all_indices())
+        if hasattr(parameter, 'get_state'):
+            parameter_state['state'] = parameter.get_state()
+        parameters[parameter.name] = parameter_state
+
+    return dict(nodes=nodes, parameters=parameters)
+
+
+def _set_prev_flow(node, prev_flow):
+    # Pywr has no setter for prev_flow: it is only copied from the node's flow at the end of a time step (in
+    # AbstractNode.after). So the flow is set to prev_flow, copied and set back to zero, leaving only prev_flow
+    # changed. The base class methods are used, so that no subclass overrides run (e.g., passing flows on to a parent
+    # node). This is safe for non-storage nodes, whose only state between time steps is prev_flow, and whose flow is
+    # zero after the reset; storage nodes are not set this way, since their volumes are restored directly.
+    prev_flow = np.asarray(prev_flow, dtype=np.float64)
+    AbstractNode.commit_all(node, prev_flow)
+    AbstractNode.after(node, None)
+    AbstractNode.commit_all(node, -prev_flow)
+
+
+def set_model_state(model, state):
+    """
+    Restore a model state saved with get_model_state. The model should already be reset to the next time step.
+    """
+    for node in model.nodes:
+        node_state = state['nodes'].get(node.name)
+        if node_state is None:
+            continue
+        if isinstance(node, AbstractStorage):
+            node.volume[:] = node_state['volume']
+            node.current_pc[:] = node_state['current_pc']
+        elif np.any(node_state['prev_flow']):
+            _set_prev_flow(node, node_state['prev_flow'])
+
+    for parameter in model.parameters:
+        parameter_state = state['parameters'].get(parameter.name)
+        if parameter_state is None:
+            continue
+        np.asarray(parameter.get_all_values())[:] = parameter_state['values']
+        if 'indices' in parameter_state:
+            np.asarray(parameter.get_all_indices())[:] = parameter_state['indices']
+        if 'state' in parameter_state:
+            parameter.set_state(parameter_state['state'])
+
+
+def read_checkpoint(checkpoint_path):
+    path = os.path.join(checkpoint_path, STATE_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path, 'rb') as f:
+        return pickle.load(f)
+
+
+def _get_planning_model(model):
+    # a planning pool (see utilities.planning_pool) keeps its replicas in worker processes, which are reset at the
+    # start of each month anyway, so it has no state to save
+    planning_model = getattr(model, 'planning', None)
+    if isinstance(planning_model, PlanningPool):
+        return None
+    return planning_model
+
+
+def save_checkpoint(model, checkpoint_path, step):
+    """
+    Save the state of a model (and its planning model, if any) after a time step. Results up to the checkpoint are
+    not saved here, but should already have been written with a ResultsWriter.
+    :param model: The daily model
+    :param checkpoint_path: The checkpoint directory
+    :param step: The index of the time step just completed
+    """
+    os.makedirs(checkpoint_path, exist_ok=True)
+
+    planning_model = _get_planning_model(model)
+    state = dict(
+        step=step,
+        signature=_model_signature(model),
+        model=get_model_state(model),
+        planning=get_model_state(planning_model) if planning_model is not None else None,
+    )
+
+    path = os.path.join(checkpoint_path, STATE_FILE)
+    tmp_path = '{}.{}.tmp'.format(path, os.getpid())
+    with open(tmp_path, 'wb') as f:
+        pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, path)
+
+
+def resume_from_checkpoint(model, checkpoint_path, rows_written=None):
+    """
+    Restore a model (and its planning model, if any) to its state at the last checkpoint, if there is one.
+    :param rows_written: The number of time steps already in the results, if known. The checkpoint is not used if
+        results are missing for any time steps before it.
+    :return: The index of the next time step to run (0 if there is no usable checkpoint)
+    """
+    state = read_checkpoint(checkpoint_path)
+    if state is None:
+        return 0
+
+    if state['signature'] != _model_signature(model):
+        logger.warning('Checkpoint does not match the model; starting from the beginning')
+        clear_checkpoint(checkpoint_path)
+        return 0
+
+    if rows_written is not None and rows_written < state['step'] + 1:
+        logger.warning('Results are missing before the checkpoint; starting from the beginning')
+        clear_checkpoint(checkpoint_path)
+        return 0
+
+    if model.dirty or model.timestepper.dirty:
+        model.setup()
+
+    next_step = state['step'] + 1
+    next_date = model.timestepper.datetime_index[next_step]
+    model.reset(start=next_date.to_timestamp())
+    set_model_state(model, state['model'])
+
+    planning_model = _get_planning_model(model)
+    if planning_model is not None and state['planning'] is not None:
+        set_model_state(planning_model, state['planning'])
+
+    logger.info('Resuming from checkpoint at {}'.format(next_date))
+
+    return next_step
@@ -0,0 +1,76 @@
+from .hydrology_store import load_dataframe
+
+CLIMATE_SCENARIO = 'Climate'
+
+# Dataframe parameter types that can be indexed by climate
+CLIMATE_PARAMETER_TYPES = {
+    'dataframe': 'ClimateDataframe',
+    'dataframeparameter': 'ClimateDataframe',
+    'climatedataframe': 'ClimateDataframe',
+    'inflowdataframe': 'InflowDataframe',
+}
+
+
+def _climate_urls(url, climate, climates):
+    climate_path = '/{}/'.format(climate)
+    if climate_path not in url:
+        return None
+    return [url.replace(climate_path, '/{}/'.format(c)) for c in climates]
+
+
+def add_climate_scenario(m, climates):
+    """
+    Convert a model assembled for the first of several climates into one that runs all of the climates, with the
+    climates as a "Climate" scenario. All climates must share the same dates.
+
+    Parameters with climate-specific data become scenario-indexed dataframe parameters. Climate-specific tables
+    are listed in "climate_tables", which should be loaded into the model with load_climate_tables.
+    :param m: The model definition, with data urls for the first climate
+    :param climates: The list of climates, e.g., ['gcms/CanESM2_rcp45', 'gcms/CanESM2_rcp85']
+    :return: The updated model definition
+    """
+    climate = climates[0]
+
+    scenarios = [s for s in m.get('scenarios', []) if s['name'] != CLIMATE_SCENARIO]
+    scenarios.append({
+        'name': CLIMATE_SCENARIO,
+        'size': len(climates),
+        'ensemble_names': list(climates)
+    })
+    m['scenarios'] = scenarios
+
+    for param in m.get('parameters', {}).values():
+        if not isinstance(param, dict) or 'url' not in param:
+            continue
+        param_type = CLIMATE_PARAMETER_TYPES.get(param.get('type', '').lower())
+        climate_urls = _climate_urls(param['url'], climate, climates)
+        if param_type and climate_urls:
+            param['type'] = param_type
+            param['climate_urls'] = climate_urls
+            param['scenario'] = CLIMATE_SCENARIO
+
+    climate_tables = {}
+    tables = dict(m.get('tables', {}), **m.get('store_tables', {}))
+    for table_name, table in tables.items():
+        climate_urls = _climate_urls(table.get('url', ''), climate, climates)
+        if climate_urls:
+            climate_tables[table_name] = climate_urls
+    m['climate_tables'] = climate_tables
+
+    return m
+
+
+def load_climate_tables(model, m):
+    """
+    Load the climate-specific tables listed in a model definition into model.climate_tables, as a list of tables
+    (one per climate) for each table name. The tables for the first climate are also in model.tables, as usual.
+    :param model: The loaded Pywr model
+    :param m: The model definition
+    """
+    model.climate_tables = {}
+    for table_name, climate_urls in m.get('climate_tables', {}).items():
+        tables = [model.tables[table_name]]
+        table = m['tables'][table_name] if table_name in m['tables'] else m['store_tables'][table_name]
+        for url in climate_urls[1:]:
+            tables.append(load_dataframe(model, dict(table, url=url)))
+        model.climate_tables[table_name] = tables
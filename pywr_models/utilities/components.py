@@ -0,0 +1,111 @@
+import os
+import re
+import json
+from glob import glob
+from loguru import logger
+
+from utilities.cache import dump_json
+
+INDEX_FILENAME = 'component_index.json'
+
+# custom components register themselves at the end of their module, e.g., "IFR_bl_Relief_Reservoir.register()"
+REGISTER_PATTERN = re.compile(r'^(\w+)\.register\(\)', re.MULTILINE)
+
+
+def _component_files(basin):
+    """
+    List the modules that can define custom components for a basin, as (module name, path) tuples.
+    """
+    folders = [
+        ('parameters', 'parameters'),
+        (os.path.join('models', basin, '_parameters'), 'models.{}._parameters'.format(basin)),
+        (os.path.join('models', basin, 'policies'), 'models.{}.policies'.format(basin)),
+    ]
+    files = []
+    for folder, package in folders:
+        for path in sorted(glob(os.path.join(folder, '*.py'))):
+            module_name = os.path.splitext(os.path.basename(path))[0]
+            if module_name == '__init__':
+                continue
+            files.append(('{}.{}'.format(package, module_name), path))
+    return files
+
+
+def build_component_index(basin):
+    """
+    Find the module of each custom component type for a basin by scanning the source files for register() calls,
+    without importing them.
+    :return: A dict of lower case type (as looked up by Pywr): module name
+    """
+    index = {}
+    for module_name, path in _component_files(basin):
+        with open(path, encoding='utf-8') as f:
+            source = f.read()
+        for class_name in REGISTER_PATTERN.findall(source):
+            index[class_name.lower()] = module_name
+    return index
+
+
+def get_component_index(basin):
+    """
+    Get the type: module index for a basin, from models/<basin>/temp/component_index.json if none of the component
+    files have changed since it was built, or otherwise by building it again.
+    """
+    files = {path: os.path.getmtime(path) for _, path in _component_files(basin)}
+    index_path = os.path.join('models', basin, 'temp', INDEX_FILENAME)
+
+    if os.path.exists(index_path):
+        try:
+            with open(index_path) as f:
+                saved = json.load(f)
+            if saved['files'] == files:
+                return saved['index']
+        except (ValueError, KeyError):
+            pass
+
+    index = build_component_index(basin)
+    os.makedirs(os.path.dirname(index_path), exist_ok=True)
+    dump_json(dict(files=files, index=index), index_path, indent=2)
+
+    return index
+
+
+def get_model_types(model_json):
+    """
+    Get all component types used in a model definition, including those of parameters defined inline in nodes and
+    other parameters, in lower case.
+    """
+    types = set()
+
+    def _walk(item):
+        if isinstance(item, dict):
+            _type = item.get('type')
+            if isinstance(_type, str):
+                types.add(_type.lower())
+            for value in item.values():
+                _walk(value)
+        elif isinstance(item, list):
+            for value in item:
+                _walk(value)
+
+    for part in ['nodes', 'parameters', 'recorders']:
+        _walk(model_json.get(part))
+
+    return types
+
+
+def get_required_modules(basin, model_jsons):
+    """
+    Get the custom component modules needed to load one or more model definitions.
+    :return: A sorted list of module names
+    """
+    index = get_component_index(basin)
+    modules = set()
+    for model_json in model_jsons:
+        for _type in get_model_types(model_json):
+            # Pywr also looks for the type with "parameter" appended
+            module_name = index.get(_type) or index.get(_type + 'parameter')
+            if module_name:
+                modules.add(module_name)
+    logger.debug('{} of {} component modules needed'.format(len(modules), len(set(index.values()))))
+    return sorted(modules)
@@ -0,0 +1,65 @@
+import numpy as np
+import pandas as pd
+
+ORDINAL_1970 = 719163  # date(1970, 1, 1).toordinal()
+
+
+class CumulativeSeries(object):
+    """
+    A daily series (e.g., full natural flow or runoff) with prefix sums, so that the sum over any window of dates
+    takes two lookups instead of a label slice and a sum. Dates are located by their day number, which is an offset
+    into the series if it has no gaps, as is usual, or otherwise found by binary search.
+    """
+
+    def __init__(self, series):
+        """
+        :param series: A series indexed by date, in order
+        """
+        self.days = pd.DatetimeIndex(series.index).values.astype('datetime64[D]').astype(np.int64) + ORDINAL_1970
+        self.cumsum = np.concatenate([[0.0], np.cumsum(np.nan_to_num(np.asarray(series.values, dtype=float)))])
+        self.size = len(self.days)
+        self.first_day = int(self.days[0]) if self.size else 0
+        self.contiguous = bool(np.all(np.diff(self.days) == 1))
+
+    def _left(self, day):
+        if self.contiguous:
+            return min(max(day - self.first_day, 0), self.size)
+        return int(np.searchsorted(self.days, day, side='left'))
+
+    def _right(self, day):
+        if self.contiguous:
+            return min(max(day - self.first_day + 1, 0), self.size)
+        return int(np.searchsorted(self.days, day, side='right'))
+
+    def sum(self, start, end):
+        """
+        Sum the series from one date to another, inclusive, as series[start:end].sum() would (missing values are
+        skipped, and dates outside of the series add nothing).
+        :param start: The first date (a date or datetime)
+        :param end: The last date
+        """
+        left = self._left(start.toordinal())
+        right = self._right(end.toordinal())
+        if right <= left:
+            return 0.0
+        return self.cumsum[right] - self.cumsum[left]
+
+
+def get_cumulative_series(model, key, data, column=None):
+    """
+    Get the prefix sums of a model table or parameter dataframe, building them the first time they are needed, or if
+    the data has been replaced (e.g., by rebind_model).
+    :param model: The Pywr model, where the prefix sums are kept
+    :param key: A key for the data, e.g., the table name and climate
+    :param data: A series, or a dataframe
+    :param column: The position of the column to sum, for a dataframe
+    :return: The CumulativeSeries
+    """
+    cache = getattr(model, 'cumulative_series', None)
+    if cache is None:
+        cache = model.cumulative_series = {}
+    cached = cache.get((key, column))
+    if cached is None or cached[0] is not data:
+        series = data.iloc[:, column] if column is not None else data
+        cached = cache[(key, column)] = (data, CumulativeSeries(series))
+    return cached[1]
@@ -0,0 +1,91 @@
+import time
+import numpy as np
+
+
+class RunDriver(object):
+    """
+    Run a daily model in chunks of time steps, with hooks at the start of each month and at the end of each water year.
+
+    The steps between hooks are run in a tight loop, with no per-day checks of the date, so the Python overhead per
+    step is just the call to model.step(). Without month-start hooks (i.e., without a planning model), each chunk is a
+    whole water year.
+
+    Hooks are called with the index of the time step and its date:
+
+    - month-start hooks before the model steps on the first day of a month (e.g., to run the planning model)
+    - water-year-end hooks after the model steps on Sep 30 (e.g., to save results and checkpoints)
+
+    The time spent in model steps and in hooks is kept in timings.
+    """
+
+    def __init__(self, model):
+        self.model = model
+        self.month_start_hooks = []
+        self.water_year_end_hooks = []
+        self.timings = dict(steps=0.0, month_start=0.0, water_year_end=0.0)
+        self.current_step = None
+
+    def on_month_start(self, hook):
+        self.month_start_hooks.append(hook)
+
+    def on_water_year_end(self, hook):
+        self.water_year_end_hooks.append(hook)
+
+    def get_events(self):
+        """
+        Get the time step indices of month starts and water year ends.
+        :return: A tuple of (month start steps, water year end steps), as sets
+        """
+        dates = self.model.timestepper.datetime_index
+        days = np.asarray(dates.day)
+        months = np.asarray(dates.month)
+        month_starts = set(np.flatnonzero(days == 1).tolist())
+        water_year_ends = set(np.flatnonzero((months == 9) & (days == 30)).tolist())
+        return month_starts, water_year_ends
+
+    def _call_hooks(self, hooks, step, timing):
+        t0 = time.perf_counter()
+        date = self.model.timestepper.datetime_index[step]
+        for hook in hooks:
+            hook(step, date)
+        self.timings[timing] += time.perf_counter() - t0
+
+    def _run_steps(self, start, stop):
+        model_step = self.model.step
+        step = start
+        t0 = time.perf_counter()
+        try:
+            for step in range(start, stop):
+                model_step()
+        finally:
+            self.current_step = step
+            self.timings['steps'] += time.perf_counter() - t0
+
+    def run(self, start_step=0, progress=None):
+        """
+        Run the model from a time step to the end.
+        :param start_step: The index of the first time step to run
+        :param progress: A function called with the number of steps run after each chunk (e.g., tqdm's update)
+        """
+        n_timesteps = len(self.model.timestepper.datetime_index)
+        month_starts, water_year_ends = self.get_events()
+        if not self.month_start_hooks:
+            month_starts = set()
+        if not self.water_year_end_hooks:
+            water_year_ends = set()
+
+        # the steps at which to stop running the model and call hooks
+        boundaries = month_starts | {step + 1 for step in water_year_ends} | {n_timesteps}
+        boundaries = sorted(b for b in boundaries if start_step < b <= n_timesteps)
+
+        step = start_step
+        for stop in boundaries:
+            self.current_step = step
+            if step in month_starts:
+                self._call_hooks(self.month_start_hooks, step, 'month_start')
+            self._run_steps(step, stop)
+            if stop - 1 in water_year_ends:
+                self._call_hooks(self.water_year_end_hooks, stop - 1, 'water_year_end')
+            if progress:
+                progress(stop - step)
+            step = stop
@@ -0,0 +1,96 @@
+import numpy as np
+import pandas as pd
+
+# position of each (month, day) in a leap year, so that every year has the same 366 days
+DAY_SLOTS = np.zeros((13, 32), dtype=int)
+DAY_SLOTS[1:, 1:] = -1
+_dates = pd.date_range('2000-01-01', '2000-12-31')
+DAY_SLOTS[_dates.month, _dates.day] = np.arange(len(_dates))
+del _dates
+
+
+class PriceCube(object):
+    """
+    An energy price table (e.g., "Energy Price Values", "Energy Price Blocks" or the hourly "All Energy Price Values")
+    as a dense array by (price year, day of year, column), for integer lookups instead of date strings. Days are
+    counted as in a leap year, so that a date has the same position in every year; positions without prices (e.g.,
+    February 29 of other years, or all but the first day of the month in monthly tables) are marked as missing.
+
+    As with the tables, the prices of a date in another price year are those of the same month and day in that year,
+    with February 29 priced as February 28.
+    """
+
+    def __init__(self, table):
+        """
+        :param table: A price table, indexed by date (YYYY-MM-DD), with a column for each block or hour
+        """
+        dates = pd.to_datetime(table.index)
+        years = np.unique(dates.year)
+        self.years = {year: i for i, year in enumerate(years)}
+        self.columns = {str(column): j for j, column in enumerate(table.columns)}
+
+        year_ids = np.searchsorted(years, dates.year)
+        slots = DAY_SLOTS[dates.month, dates.day]
+        self.values = np.full((len(years), 366, len(table.columns)), np.nan)
+        self.values[year_ids, slots] = table.values
+        self.valid = np.zeros((len(years), 366), dtype=bool)
+        self.valid[year_ids, slots] = True
+        self.values.flags.writeable = False
+
+    def _position(self, price_year, month, day):
+        try:
+            year_id = self.years[price_year]
+        except KeyError:
+            raise KeyError('No energy prices for {}'.format(price_year))
+        if month == 2 and day == 29:
+            day = 28
+        slot = DAY_SLOTS[month, day]
+        if not self.valid[year_id, slot]:
+            raise KeyError('No energy prices for {}-{:02}-{:02}'.format(price_year, month, day))
+        return year_id, slot
+
+    def at(self, price_year, date, column):
+        """
+        Get the price (or other value) of a column for a date, in a price year.
+        :param price_year: The price year
+        :param date: The date (e.g., the parameter's datetime), of which the month and day are used
+        :param column: The column name, e.g., the block number as a string
+        """
+        year_id, slot = self._position(price_year, date.month, date.day)
+        return self.values[year_id, slot, self.columns[column]]
+
+    def row(self, price_year, date):
+        """
+        Get all columns for a date, in a price year, e.g., the day's hourly prices, as a read-only view.
+        """
+        year_id, slot = self._position(price_year, date.month, date.day)
+        return self.values[year_id, slot]
+
+    def between(self, price_year, start, end):
+        """
+        Get the rows from one date to another (inclusive), in a price year, as a new array.
+        """
+        try:
+            year_id = self.years[price_year]
+        except KeyError:
+            raise KeyError('No energy prices for {}'.format(price_year))
+        slots = slice(DAY_SLOTS[start.month, start.day], DAY_SLOTS[end.month, end.day] + 1)
+        return self.values[year_id, slots][self.valid[year_id, slots]]
+
+
+def get_price_cube(model, table_name):
+    """
+    Get the price cube of a model table, building it the first time it is needed, or if the table has been replaced
+    (e.g., by rebind_model).
+    :return: The PriceCube, or None if the model does not have the table
+    """
+    table = model.tables.get(table_name)
+    if table is None:
+        return None
+    cubes = getattr(model, 'price_cubes', None)
+    if cubes is None:
+        cubes = model.price_cubes = {}
+    cached = cubes.get(table_name)
+    if cached is None or cached[0] is not table:
+        cached = cubes[table_name] = (table, PriceCube(table))
+    return cached[1]
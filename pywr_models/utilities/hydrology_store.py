@@ -0,0 +1,309 @@
+"""
+A binary copy of the hydrology data in SIERRA_DATA_PATH, read by memory mapping instead of parsing CSV files.
+
+Each time series (runoff, full natural flow, water year types, etc.) is saved as .npy arrays of its values, its index
+and, if the index holds dates, the parsed dates, listed in a manifest by the file's path relative to
+SIERRA_DATA_PATH. Tables and dataframe parameters keep their urls: if a url is in the store, and its definition only
+uses arguments that the store can reproduce (index_col, header, parse_dates, squeeze and column), the data is mapped
+from the store, so that it is shared through the OS cache by parallel runs; otherwise the CSV file is read as usual.
+Files that have changed since they were stored (by size or modified time) are also read from the CSV file.
+
+Build or update the store from the pywr_models folder with:
+
+    python -m utilities.hydrology_store
+"""
+
+import os
+import json
+import argparse
+import numpy as np
+import pandas as pd
+from loguru import logger
+
+from .cache import dump_json
+from .shared_tables import get_shared_table
+
+HYDROLOGY_STORE_DIRNAME = 'hydrology_store'
+MANIFEST_FILENAME = 'manifest.json'
+
+# keys of table and dataframe parameter definitions that are not passed on to pandas
+NON_DATA_KEYS = ['url', 'type', 'name', 'comment', 'scenario']
+
+_manifests = {}  # store path: (modified time, manifest)
+_stale = set()  # files found to have changed since they were stored, already warned about
+
+
+def get_store_path(data_path=None):
+    data_path = data_path or os.environ.get('SIERRA_DATA_PATH')
+    if not data_path:
+        return None
+    return os.path.join(data_path, HYDROLOGY_STORE_DIRNAME)
+
+
+def _load_manifest(store_path):
+    path = os.path.join(store_path, MANIFEST_FILENAME)
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return {}
+    cached = _manifests.get(store_path)
+    if cached is None or cached[0] != mtime:
+        with open(path) as f:
+            cached = _manifests[store_path] = (mtime, json.load(f))
+    return cached[1]
+
+
+def _relative_url(url, data_path):
+    relpath = os.path.relpath(os.path.abspath(url), os.path.abspath(data_path))
+    if relpath.startswith('..'):
+        return None
+    return relpath.replace(os.sep, '/')
+
+
+def _get_entry(url):
+    store_path = get_store_path()
+    if not store_path or not url:
+        return None, None
+    relpath = _relative_url(url, os.path.dirname(store_path))
+    entry = _load_manifest(store_path).get(relpath) if relpath else None
+    if entry is not None and _is_stale(url, entry):
+        if relpath not in _stale:
+            _stale.add(relpath)
+            logger.warning('{} has changed since the hydrology store was built; reading the CSV file instead. '
+                           'Update the store with: python -m utilities.hydrology_store'.format(relpath))
+        entry = None
+    return store_path, entry
+
+
+def _is_stale(url, entry):
+    # the stored copy is used only if the CSV file has not changed since it was stored
+    try:
+        stat = os.stat(url)
+    except OSError:
+        return False
+    return stat.st_size != entry['size'] or stat.st_mtime != entry['mtime']
+
+
+def _is_supported(spec, entry):
+    for key, value in spec.items():
+        if key in NON_DATA_KEYS or key == 'column':
+            continue
+        if key == 'index_col':
+            if value not in [0, entry['index_name']]:
+                return False
+        elif key == 'header':
+            if value not in [0, 'infer']:
+                return False
+        elif key == 'parse_dates':
+            if value and (entry['dates'] is None or value not in [True, [0], [entry['index_name']]]):
+                return False
+        elif key != 'squeeze':
+            return False
+    return 'index_col' in spec
+
+
+def in_store(spec):
+    """
+    Check if the data of a table or dataframe parameter definition can be read from the hydrology store.
+    """
+    if not isinstance(spec, dict):
+        return False
+    _, entry = _get_entry(spec.get('url'))
+    return entry is not None and _is_supported(spec, entry)
+
+
+def read_store(spec):
+    """
+    Read the data of a table or dataframe parameter definition from the hydrology store, as pandas would read it from
+    the original file. The values are a read-only memory map of the store.
+    :return: A DataFrame or Series, or None if the data is not in the store
+    """
+    store_path, entry = _get_entry(spec.get('url'))
+    if entry is None or not _is_supported(spec, entry):
+        return None
+
+    values = np.load(os.path.join(store_path, entry['values']), mmap_mode='r')
+    if spec.get('parse_dates'):
+        index = pd.DatetimeIndex(np.load(os.path.join(store_path, entry['dates'])), name=entry['index_name'],
+                                 freq=entry['freq'])
+    else:
+        index = pd.Index(np.load(os.path.join(store_path, entry['index'])), name=entry['index_name'])
+    df = pd.DataFrame(values, index=index, columns=entry['columns'], copy=False)
+
+    if spec.get('squeeze') and len(df.columns) == 1:
+        df = df.iloc[:, 0]
+    if spec.get('column') is not None:
+        column = spec['column']
+        try:
+            df = df[tuple(column) if isinstance(column, list) else column]
+        except KeyError:
+            raise KeyError('Column "{}" not found in dataset "{}"'.format(column, spec['url']))
+    return df
+
+
+def load_dataframe(model, data):
+    """
+    Load a dataframe for a table or dataframe parameter, from shared memory (see utilities.shared_tables) or the
+    hydrology store if it is there, or otherwise with Pywr's load_dataframe. Like Pywr's load_dataframe, this consumes
+    the keys of data.
+    """
+    df = get_shared_table(data)
+    if df is None and in_store(data):
+        df = read_store(data)
+    if df is not None:
+        data.clear()
+        return df
+    from pywr.dataframe_tools import load_dataframe as pywr_load_dataframe
+    return pywr_load_dataframe(model, data)
+
+
+def use_hydrology_store(m):
+    """
+    Set up a model definition to read its hydrology data from the store, where possible. Dataframe parameters become
+    ClimateDataframe (or InflowDataframe) parameters, which read from the store, and tables are deferred (see
+    defer_tables).
+    """
+    from .climates import CLIMATE_PARAMETER_TYPES
+
+    for param in m.get('parameters', {}).values():
+        if in_store(param) and param.get('type', '').lower() in CLIMATE_PARAMETER_TYPES:
+            param['type'] = CLIMATE_PARAMETER_TYPES[param['type'].lower()]
+
+    return defer_tables(m, in_store)
+
+
+def defer_tables(m, condition):
+    """
+    Move the tables of a model definition that meet a condition from "tables" to "store_tables", so that Pywr does not
+    read them when the model is loaded; load them with load_store_tables after the model is loaded. Tables that are
+    referred to by parameters are left in place, since these are needed to load the model.
+    :param condition: A function of a table definition
+    """
+    referenced = set()
+
+    def _walk(item):
+        if isinstance(item, dict):
+            if isinstance(item.get('table'), str):
+                referenced.add(item['table'])
+            for value in item.values():
+                _walk(value)
+        elif isinstance(item, list):
+            for value in item:
+                _walk(value)
+
+    _walk(m.get('parameters', {}))
+    _walk(m.get('nodes', []))
+
+    store_tables = m.setdefault('store_tables', {})
+    for table_name, table in list(m.get('tables', {}).items()):
+        if table_name not in referenced and condition(table):
+            store_tables[table_name] = m['tables'].pop(table_name)
+    return m
+
+
+def load_store_tables(model, m):
+    """
+    Load the tables moved to "store_tables" by defer_tables into model.tables.
+    """
+    for table_name, table in m.get('store_tables', {}).items():
+        model.tables[table_name] = load_dataframe(model, dict(table))
+
+
+def _read_csv(path, parse_dates=False):
+    return pd.read_csv(path, index_col=0, parse_dates=parse_dates)
+
+
+def convert_file(path, store_path, relpath):
+    """
+    Save a CSV time series to the store.
+    :return: The manifest entry, or None if the file cannot be stored (e.g., it has mixed column types)
+    """
+    df = _read_csv(path)
+    if df.empty or len(set(df.dtypes)) != 1 or not pd.api.types.is_numeric_dtype(df.dtypes.iloc[0]):
+        return None
+    numeric_index = pd.api.types.is_numeric_dtype(df.index)
+    if not numeric_index and not all(isinstance(v, str) for v in df.index):
+        return None
+
+    dates = _read_csv(path, parse_dates=True).index
+    if not isinstance(dates, pd.DatetimeIndex):
+        dates = None
+
+    name = os.path.splitext(relpath)[0]
+    return dict(
+        values=_save(store_path, name + '.values.npy', np.ascontiguousarray(df.values)),
+        index=_save(store_path, name + '.index.npy', np.asarray(df.index.values, dtype=None if numeric_index else str)),
+        dates=_save(store_path, name + '.dates.npy', dates.values) if dates is not None else None,
+        freq=pd.infer_freq(dates) if dates is not None and len(dates) > 2 else None,
+        index_name=df.index.name,
+        columns=[str(c) for c in df.columns],
+        size=os.path.getsize(path),
+        mtime=os.path.getmtime(path),
+    )
+
+
+def _save(store_path, name, array):
+    path = os.path.join(store_path, name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = '{}.{}.tmp.npy'.format(path[:-4], os.getpid())
+    np.save(tmp_path, array)
+    os.replace(tmp_path, path)
+    return name
+
+
+def build_hydrology_store(data_path=None, folder='hydrology', force=False):
+    """
+    Convert the CSV files in the hydrology folders of SIERRA_DATA_PATH to the hydrology store. Files that have not
+    changed since they were last converted are skipped.
+    :param data_path: The data path (default: SIERRA_DATA_PATH)
+    :param folder: Only convert files with a folder of this name in their path
+    :param force: Convert all files again
+    :return: The manifest
+    """
+    data_path = data_path or os.environ['SIERRA_DATA_PATH']
+    store_path = get_store_path(data_path)
+    manifest = {} if force else dict(_load_manifest(store_path))
+
+    converted = skipped = 0
+    for dirpath, dirnames, filenames in os.walk(data_path):
+        dirnames[:] = sorted(d for d in dirnames if d != HYDROLOGY_STORE_DIRNAME)
+        for filename in sorted(filenames):
+            if not filename.endswith('.csv'):
+                continue
+            path = os.path.join(dirpath, filename)
+            relpath = _relative_url(path, data_path)
+            if folder and folder not in relpath.split('/')[:-1]:
+                continue
+            entry = manifest.get(relpath)
+            if entry and entry['size'] == os.path.getsize(path) and entry['mtime'] == os.path.getmtime(path):
+                continue
+            try:
+                entry = convert_file(path, store_path, relpath)
+            except (ValueError, pd.errors.ParserError) as err:
+                logger.warning('Could not convert {}: {}'.format(relpath, err))
+                entry = None
+            if entry is None:
+                manifest.pop(relpath, None)
+                skipped += 1
+                continue
+            manifest[relpath] = entry
+            converted += 1
+
+    os.makedirs(store_path, exist_ok=True)
+    dump_json(manifest, os.path.join(store_path, MANIFEST_FILENAME))
+    logger.info('Hydrology store updated: {} files converted, {} skipped, {} in total'.format(
+        converted, skipped, len(manifest)))
+    return manifest
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Convert hydrology CSV files to a memory-mapped binary store')
+    parser.add_argument("-d", "--data_path", help="Data path (default: SIERRA_DATA_PATH)")
+    parser.add_argument("-f", "--folder", help="Only convert files in folders of this name", default='hydrology')
+    parser.add_argument("--force", help="Convert all files again", action='store_true')
+    args = parser.parse_args()
+    build_hydrology_store(args.data_path, folder=args.folder, force=args.force)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,127 @@
+import os
+import json
+import numpy as np
+import pandas as pd
+from loguru import logger
+
+from utilities.climates import CLIMATE_PARAMETER_TYPES
+from utilities.monthly_tables import read_table
+from utilities.cache import dump_json
+from utilities.hydrology_store import _save
+
+INFLOW_STORE_FILENAME = 'inflows.json'
+INFLOW_VALUES_FILENAME = 'inflows.values.npy'
+INFLOW_DATES_FILENAME = 'inflows.dates.npy'
+
+_stores = {}  # path: (modified time, dataframe)
+
+
+def get_inflow_store_path(cache_dir, climate):
+    """
+    Get the path of the inflow store of a climate. As with the monthly tables, the climate is part of the path, so that
+    models that run several climates as a scenario can find the store of each climate.
+    """
+    return os.path.join(cache_dir, 'inflows', climate, INFLOW_STORE_FILENAME)
+
+
+def is_inflow_store(url):
+    return bool(url) and os.path.basename(url) == INFLOW_STORE_FILENAME
+
+
+def get_inflow_sources(m):
+    """
+    Find the runoff parameters of a model definition that read their own data file, e.g., the aggregated inflows
+    created by simplify_network.
+    :return: A dict of parameter name: parameter definition
+    """
+    sources = {}
+    for name, param in m.get('parameters', {}).items():
+        if not isinstance(param, dict) or not name.endswith('/Runoff'):
+            continue
+        if param.get('type', '').lower() in CLIMATE_PARAMETER_TYPES and param.get('url', '').endswith('.csv'):
+            sources[name] = param
+    return sources
+
+
+def build_inflow_store(sources, path):
+    """
+    Save the daily inflows of a model to one array, with a column for each runoff parameter, read once when the
+    model is loaded (see read_inflow_store) instead of one data file per parameter. As with the hydrology store, the
+    values and dates are saved as .npy files, listed with the columns in the store's index file (the path).
+    :param sources: A dict of parameter name: parameter definition (see get_inflow_sources)
+    :param path: The store's index file (see get_inflow_store_path)
+    """
+    columns = {}
+    for name, spec in sources.items():
+        df = read_table(spec)
+        if isinstance(df, pd.DataFrame):
+            df = df.iloc[:, 0]
+        columns[name] = df.astype(float)
+    df = pd.concat(columns, axis=1).sort_index()
+    df = df.asfreq(pd.infer_freq(df.index) or 'D')
+
+    store_path = os.path.dirname(path)
+    os.makedirs(store_path, exist_ok=True)
+    index = dict(
+        values=_save(store_path, INFLOW_VALUES_FILENAME, np.ascontiguousarray(df.values)),
+        dates=_save(store_path, INFLOW_DATES_FILENAME, df.index.values),
+        freq=df.index.freqstr,
+        columns=list(df.columns),
+    )
+    # the index file is written last, so the store is complete once it exists
+    dump_json(index, path)
+    logger.info('Inflows saved to {} ({} columns)'.format(path, len(df.columns)))
+
+
+def get_climate_sources(sources, climate, other_climate):
+    """
+    Get the inflow sources of another climate, for models that run several climates as a scenario.
+    """
+    climate_path = '/{}/'.format(climate)
+    return {name: dict(spec, url=spec['url'].replace(climate_path, '/{}/'.format(other_climate)))
+            for name, spec in sources.items()}
+
+
+def use_inflow_store(m, sources, path):
+    """
+    Point the runoff parameters of a model definition to the inflow store.
+    """
+    for name, spec in sources.items():
+        m['parameters'][name] = {
+            'type': CLIMATE_PARAMETER_TYPES[spec['type'].lower()],
+            'url': path,
+            'column': name,
+        }
+    return m
+
+
+def read_inflow_store(path):
+    """
+    Read an inflow store, once per process, as long as the file does not change. The values are a read-only memory
+    map of the store, so that they are shared through the OS cache by parallel runs.
+    """
+    path = os.path.abspath(path)
+    mtime = os.path.getmtime(path)
+    cached = _stores.get(path)
+    if cached is None or cached[0] != mtime:
+        with open(path) as f:
+            index = json.load(f)
+        store_path = os.path.dirname(path)
+        values = np.load(os.path.join(store_path, index['values']), mmap_mode='r')
+        dates = pd.DatetimeIndex(np.load(os.path.join(store_path, index['dates'])), freq=index['freq'])
+        df = pd.DataFrame(values, index=dates, columns=index['columns'], copy=False)
+        cached = _stores[path] = (mtime, df)
+    return cached[1]
+
+
+def load_inflow_column(url, column):
+    """
+    Get the inflows of a runoff parameter from the inflow store, as a view of the store's column, trimmed to the
+    dates of the original data file.
+    """
+    df = read_inflow_store(url)
+    try:
+        series = df[column]
+    except KeyError:
+        raise KeyError('Column "{}" not found in dataset "{}"'.format(column, url))
+    return series.loc[series.first_valid_index():series.last_valid_index()]
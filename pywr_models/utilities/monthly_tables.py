@@ -0,0 +1,264 @@
+import os
+import re
+import warnings
+from calendar import isleap
+import numpy as np
+import pandas as pd
+from loguru import logger
+
+from .hydrology_store import in_store, read_store
+
+MONTHLY_TABLES_FILENAME = 'monthly_tables.h5'
+
+HOURLY_PRICES_TABLE = 'All Energy Price Values'
+PRICE_VALUES_TABLE = 'Energy Price Values'
+PRICE_BLOCKS_TABLE = 'Energy Price Blocks'
+PRICE_DURATION_TABLE = 'Energy Price Duration'  # for PH_Water_Demand, in the daily model
+
+# pandas arguments in table and dataframe parameter definitions; anything else is for Pywr
+READ_ARGS = ['index_col', 'header', 'names', 'parse_dates', 'sheet_name', 'skiprows', 'usecols', 'sep']
+
+# a non-leap year, for day-weighted monthly means of calendar schedules
+CALENDAR_DAYS = pd.date_range('2001-01-01', '2001-12-31', freq='D')
+
+
+def get_monthly_tables_path(cache_dir, climate):
+    """
+    Get the path of the monthly tables of a climate. The climate is part of the path, so that models that run several
+    climates as a scenario can find the tables of each climate in the same way as other climate data (see
+    utilities.climates).
+    """
+    return os.path.join(cache_dir, 'monthly', climate, MONTHLY_TABLES_FILENAME)
+
+
+def _slug(name):
+    return re.sub(r'\W+', '_', name).strip('_').lower()
+
+
+def get_table_key(table_name):
+    return 'tables/{}'.format(_slug(table_name))
+
+
+def get_runoff_key(url):
+    return 'runoff/{}'.format(_slug(os.path.splitext(os.path.basename(url))[0]))
+
+
+def get_forecast_url(url):
+    return url.replace('/runoff_aggregated/', '/runoff_monthly_forecasts/')
+
+
+def get_monthly_url(url):
+    # the monthly version of a daily data file, if it has been prepared (e.g., the piecewise energy prices)
+    return url.replace('daily', 'monthly')
+
+
+def read_table(spec):
+    """
+    Read the data of a table or dataframe parameter definition, as Pywr would, from the hydrology store if it is there.
+    """
+    if in_store(spec):
+        return read_store(spec)
+    url = spec['url']
+    kwargs = {k: spec[k] for k in READ_ARGS if k in spec}
+    if url.endswith(('.xls', '.xlsx')):
+        kwargs.pop('sep', None)
+        df = pd.read_excel(url, **kwargs)
+    else:
+        kwargs.pop('sheet_name', None)
+        df = pd.read_csv(url, **kwargs)
+    if spec.get('squeeze') and isinstance(df, pd.DataFrame) and len(df.columns) == 1:
+        df = df.iloc[:, 0]
+    if spec.get('column') is not None:
+        df = df[spec['column']]
+    return df
+
+
+def daily_to_monthly_timeseries(df):
+    """
+    Sum daily volumes (e.g., mcm) to monthly volumes, indexed by the first day of each month.
+    """
+    return df.resample('MS').sum()
+
+
+def daily_to_monthly_schedule(df):
+    """
+    Convert a calendar schedule indexed by (month, day), with a row for each day or for each day the schedule changes,
+    to the mean of each month, indexed by (month, 1).
+    """
+    breakpoints = np.array([m * 100 + d for m, d in df.index])
+    order = np.argsort(breakpoints)
+    days = CALENDAR_DAYS.month * 100 + CALENDAR_DAYS.day
+    # each day takes the value of the last change on or before it, wrapping around from the end of the year
+    positions = order[(np.searchsorted(breakpoints[order], days, side='right') - 1) % len(order)]
+    daily = pd.DataFrame(df.values[positions], columns=df.columns) if df.ndim > 1 \
+        else pd.Series(df.values[positions], name=df.name)
+    monthly = daily.groupby(CALENDAR_DAYS.month).mean()
+    monthly.index = pd.MultiIndex.from_tuples([(m, 1) for m in monthly.index], names=df.index.names)
+    return monthly
+
+
+def daily_to_monthly_columns(df):
+    """
+    Convert a table with a column for each month, and, for months in which the values change, a column for each
+    change (e.g., "11-1" and "11-16"), so that each month column is the mean of the month.
+    """
+    df = df.copy()
+    changes = {}
+    for column in df.columns:
+        match = re.match(r'^(\d+)-(\d+)$', str(column))
+        if match:
+            changes.setdefault(int(match.group(1)), []).append((int(match.group(2)), column))
+    for month, month_changes in changes.items():
+        month_changes.sort()
+        days = CALENDAR_DAYS[CALENDAR_DAYS.month == month].day
+        positions = np.searchsorted([day for day, _ in month_changes], days, side='right') - 1
+        weights = np.bincount(positions.clip(0), minlength=len(month_changes)) / len(days)
+        df[month] = sum(df[column] * w for (_, column), w in zip(month_changes, weights))
+    return df
+
+
+def get_price_duration(hourly_prices):
+    """
+    Get the hourly prices of each month, sorted in descending order, as used by PH_Water_Demand to find the price
+    threshold that uses up the planned release. As in PH_Water_Demand, February 29 is only counted in leap years of the
+    simulation, so February of a leap price year has two rows: YYYY-02, without the 29th, and YYYY-02-29, with it.
+    :param hourly_prices: Hourly prices, indexed by date (YYYY-MM-DD), with a column for each hour
+    :return: A table indexed by month (YYYY-MM, or YYYY-02-29), with the month's prices in descending order, followed
+        by NaNs
+    """
+    dates = pd.Index(hourly_prices.index.astype(str).str[:10])
+    months = dates.str[:7]
+    leap_days = dates.str[5:] == '02-29'
+    leap_months = months.isin(months[leap_days])
+    rows = np.concatenate([np.flatnonzero(~leap_days), np.flatnonzero(leap_months)])
+    labels = np.concatenate([months[~leap_days], months[leap_months] + '-29'])
+
+    month_ids, periods = pd.factorize(labels, sort=True)
+    hours = hourly_prices.shape[1]
+    prices = hourly_prices.values[rows].ravel().astype(float)
+    ids = np.repeat(month_ids, hours)
+    order = np.lexsort((-prices, ids))
+    prices, ids = prices[order], ids[order]
+    positions = np.arange(len(ids)) - np.searchsorted(ids, ids)
+    df = np.full((len(periods), 31 * hours), np.nan)
+    df[ids, positions] = prices
+    return pd.DataFrame(df, index=pd.Index(periods, name='Month'))
+
+
+def get_price_duration_month(price_year, date):
+    """
+    Get the row of the price duration table (see get_price_duration) for the month of a date, in a price year.
+    February 29 is only counted if both the date's year and the price year are leap years.
+    """
+    month = '{}-{:02}'.format(price_year, date.month)
+    if date.month == 2 and isleap(date.year) and isleap(price_year):
+        month += '-29'
+    return month
+
+
+def daily_to_monthly_table(table_name, df):
+    """
+    Derive the monthly version of a daily table, by the shape of the table.
+    """
+    if isinstance(df.index, pd.DatetimeIndex):
+        return daily_to_monthly_timeseries(df)
+    if isinstance(df.index, pd.MultiIndex) and df.index.nlevels == 2:
+        return daily_to_monthly_schedule(df)
+    if isinstance(df, pd.DataFrame) and any(re.match(r'^\d+-\d+$', str(c)) for c in df.columns):
+        return daily_to_monthly_columns(df)
+    raise ValueError('Cannot derive a monthly table for "{}" from its daily data'.format(table_name))
+
+
+def get_runoff_forecasts(spec):
+    """
+    Get the monthly runoff forecasts (a column for each of the next 12 months, from each month) of a runoff parameter,
+    from runoff_monthly_forecasts.
+    :raises ValueError: If there are no forecasts for the runoff
+    """
+    forecast_url = get_forecast_url(spec['url'])
+    if forecast_url == spec['url'] or not os.path.exists(forecast_url):
+        raise ValueError('No monthly runoff forecasts for {} (expected {})'.format(spec['url'], forecast_url))
+    df = pd.read_csv(forecast_url, index_col=0, parse_dates=True)
+    return df.asfreq('MS')
+
+
+def get_monthly_table(table_name, spec):
+    """
+    Get the monthly version of a daily table: its monthly data file, if there is one, as is, or otherwise the table
+    derived from its daily data (see daily_to_monthly_table).
+    """
+    monthly_url = get_monthly_url(spec['url'])
+    if monthly_url != spec['url'] and os.path.exists(monthly_url):
+        return read_table(dict(spec, url=monthly_url))
+    logger.info('No monthly data for "{}"; deriving it from {}'.format(table_name, spec['url']))
+    return daily_to_monthly_table(table_name, read_table(spec))
+
+
+def get_monthly_prices(spec):
+    """
+    Get the monthly piecewise energy prices (or blocks) of a daily price table. These are linearized from the hourly
+    prices of each month by preprocessing/energy_prices/piecewise_linearization, so they are read from its output, as
+    is, rather than derived from the daily blocks.
+    :raises ValueError: If there is no monthly price file
+    """
+    monthly_url = get_monthly_url(spec['url'])
+    if monthly_url == spec['url'] or not os.path.exists(monthly_url):
+        raise ValueError('No monthly energy prices for {} (expected {}); create them with '
+                         'preprocessing/energy_prices/piecewise_linearization'.format(spec['url'], monthly_url))
+    return read_table(dict(spec, url=monthly_url))
+
+
+def build_monthly_tables(sources, path):
+    """
+    Build the monthly tables of a planning model from their daily sources, and save them to one HDF5 file, read by
+    the planning model (and PH_Water_Demand) instead of separate monthly data files.
+    :param sources: A dict of key: (kind, spec), where kind is "table" (a daily table), "prices" (spec is a tuple
+        of daily price values and blocks), "price duration" (hourly prices) or "runoff" (a daily runoff parameter)
+    :param path: The output file
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = '{}.{}.tmp'.format(path, os.getpid())
+    with warnings.catch_warnings():
+        # tables with mixed column types (e.g., 1, 2, ..., "11-1") are pickled
+        warnings.simplefilter('ignore', pd.errors.PerformanceWarning)
+        with pd.HDFStore(tmp_path, mode='w', complevel=5, complib='blosc') as store:
+            for key, (kind, spec) in sources.items():
+                if kind == 'table':
+                    store.put(key, get_monthly_table(key, spec))
+                elif kind == 'prices':
+                    values_spec, blocks_spec = spec
+                    store.put(get_table_key(PRICE_VALUES_TABLE), get_monthly_prices(values_spec))
+                    store.put(get_table_key(PRICE_BLOCKS_TABLE), get_monthly_prices(blocks_spec))
+                elif kind == 'price duration':
+                    store.put(key, get_price_duration(read_table(spec)))
+                elif kind == 'runoff':
+                    store.put(key, get_runoff_forecasts(spec))
+    os.replace(tmp_path, path)
+    logger.info('Monthly tables saved to {}'.format(path))
+
+
+def get_source_urls(sources):
+    """
+    Get the data files that the monthly tables are derived from, including runoff forecasts and monthly data files.
+    """
+    urls = []
+    for kind, spec in sources.values():
+        for s in spec if isinstance(spec, tuple) else [spec]:
+            urls.append(s['url'])
+            if kind == 'runoff':
+                urls.append(get_forecast_url(s['url']))
+            elif kind in ['table', 'prices']:
+                urls.append(get_monthly_url(s['url']))
+    return urls
+
+
+def replace_climate(sources, climate, other_climate):
+    """
+    Get the sources of the monthly tables of another climate, for models that run several climates as a scenario.
+    """
+    def _replace(spec):
+        if isinstance(spec, tuple):
+            return tuple(_replace(s) for s in spec)
+        return dict(spec, url=spec['url'].replace('/{}/'.format(climate), '/{}/'.format(other_climate)))
+
+    return {key: (kind, _replace(spec)) for key, (kind, spec) in sources.items()}
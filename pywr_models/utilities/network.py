@@ -1,12 +1,134 @@
 import os
 import json
+import heapq
+from collections import Counter, defaultdict
+from .network_index import NetworkIndex
+
+
+def _get_removable(nodes, delete_gauges=False):
+    """
+    Find the nodes that can be removed from the network, depending on how they are connected.
+    :return: A tuple of (links that can be removed next to a hydropower facility, pass-through nodes that can be
+        removed: simple links without "keep" metadata, gauges if delete_gauges, and reservoirs without a max volume)
+    """
+    hydropower_links = set()
+    pass_through = set()
+    for node in nodes:
+        node_name = node['name']
+        node_type = node['type'].lower()
+        metadata = json.loads(node.get('comment', '{}'))
+        keys_set = set(node.keys())
+        if len({'cost', 'max_flow'} & keys_set) >= 1 \
+                and 'hydropower' not in node_type \
+                and 'reservoir' not in node_type:
+            hydropower_links.add(node_name)
+        if keys_set in [{'name', 'type'}, {'name', 'type', 'comment'}] and not metadata.get('keep') \
+                or delete_gauges and node_type == 'rivergauge' \
+                or node_type == 'reservoir' and not node.get('max_volume'):
+            pass_through.add(node_name)
+    return hydropower_links, pass_through
+
+
+def reduce_network(nodes, edges, delete_gauges=False, network=None):
+    """
+    Remove pass-through nodes from a network, reconnecting their neighbours.
+
+    Nodes are removed one at a time, always the first removable node in the node list, which gives the same network
+    (including the order of the edges) as scanning the node list from the top after each removal. Since removing a
+    node only changes what can be removed next to it, only its neighbours are looked at again, using a heap of node
+    positions and adjacency maps, so the network is reduced in one pass.
+    :param nodes: The model nodes
+    :param edges: The model edges
+    :param delete_gauges: Remove river gauges
+    :param network: The NetworkIndex of the nodes and edges, if already built
+    :return: A tuple of (nodes, edges, names of removed nodes)
+    """
+    hydropower_links, pass_through = _get_removable(nodes, delete_gauges=delete_gauges)
+    names = [n['name'] for n in nodes]
+    node_lookup = {n['name']: n for n in nodes}
+    positions = {name: i for i, name in enumerate(names)}
+
+    # edges in order, and each node's upstream and downstream edges, in the same order
+    if network is None:
+        network = NetworkIndex(names, edges)
+    all_edges = dict.fromkeys(network.edges)
+    up_edges = defaultdict(dict, {b: dict.fromkeys((a, b) for a in up) for b, up in network.predecessors.items()})
+    down_edges = defaultdict(dict, {a: dict.fromkeys((a, b) for b in down) for a, down in network.successors.items()})
+
+    # duplicate edges count until the first node is removed, when they are dropped
+    extra_up = Counter()
+    extra_down = Counter()
+    for (a, b), count in Counter(tuple(edge) for edge in edges).items():
+        if count > 1:
+            extra_down[a] += count - 1
+            extra_up[b] += count - 1
+
+    removed = []
+    heap = list(range(len(nodes)))
+    while heap:
+        node_name = names[heapq.heappop(heap)]
+        if node_name not in node_lookup:
+            continue  # already removed
+        n_up = len(up_edges[node_name]) + extra_up[node_name]
+        n_down = len(down_edges[node_name]) + extra_down[node_name]
+
+        obsolete_edges = None
+        new_edges = []
+
+        # delete links adjacent to hydropower facilities
+        if node_name in hydropower_links and n_up == 1 and n_down == 1:
+            up_edge = next(iter(up_edges[node_name]))
+            down_edge = next(iter(down_edges[node_name]))
+            up_type = node_lookup[up_edge[0]]['type'].lower()
+            down_type = node_lookup[down_edge[1]]['type'].lower()
+            if 'hydropower' in up_type or 'hydropower' in down_type:
+                obsolete_edges = [up_edge, down_edge]
+                new_edges.append((up_edge[0], down_edge[1]))
+
+        if obsolete_edges is None and node_name in pass_through:
+            if n_up == 0:
+                # upstream-most node
+                obsolete_edges = list(down_edges[node_name])[:1]
+            elif n_down == 1:
+                down_edge = next(iter(down_edges[node_name]))
+                obsolete_edges = [down_edge]
+                for up_edge in up_edges[node_name]:
+                    obsolete_edges.append(up_edge)
+                    new_edges.append((up_edge[0], down_edge[1]))
+
+        if obsolete_edges is None:
+            continue  # looked at again if its neighbours change
+
+        removed.append(node_name)
+        del node_lookup[node_name]
+        neighbours = set()
+        if extra_up or extra_down:
+            neighbours.update(extra_up, extra_down)
+            extra_up.clear()
+            extra_down.clear()
+        for edge in obsolete_edges:
+            all_edges.pop(edge, None)
+            down_edges[edge[0]].pop(edge, None)
+            up_edges[edge[1]].pop(edge, None)
+            neighbours.update(edge)
+        for edge in new_edges:
+            if edge not in all_edges:
+                all_edges[edge] = None
+                down_edges[edge[0]][edge] = None
+                up_edges[edge[1]][edge] = None
+            neighbours.update(edge)
+        for name in neighbours:
+            if name in node_lookup and name in positions:
+                heapq.heappush(heap, positions[name])
+
+    nodes = [node for node in nodes if node['name'] in node_lookup]
+    edges = [list(edge) for edge in all_edges]
+    return nodes, edges, removed
 
 
 def simplify_network(m, scenario_path=None, basin=None, climate=None, delete_gauges=False, delete_observed=True, delete_scenarios=False,
                      aggregate_runoff=True, create_graphs=False):
     # simplify the network
-    mission_complete = False
-    obsolete_gauges = []
 
     if delete_scenarios:
         # scenarios = []
@@ -18,104 +140,28 @@ def simplify_network(m, scenario_path=None, basin=None, climate=None, delete_gau
         #         scenarios.append(scen)
         # m['scenarios'] = scenarios
         m.pop('scenarios', None)
-    obsolete_nodes = []
-
-    while not mission_complete:
-        mission_complete = True
-        up_nodes = []
-        down_nodes = []
-        up_edges = {}
-        down_edges = {}
-        for edge in m['edges']:
-            a, b = edge
-            up_nodes.append(a)
-            down_nodes.append(b)
-            down_edges[a] = [edge] if a not in down_edges else down_edges[a] + [edge]
-            up_edges[b] = [edge] if b not in up_edges else up_edges[b] + [edge]
-
-        obsolete_edges = []
-        new_edges = []
 
-        node_lookup = {n['name']: n for n in m['nodes']}
-
-        for node in m['nodes']:
-            # is the node a simple link? if so, we might be able to remove it
-            node_name = node['name']
-            node_type = node['type'].lower()
-            metadata = json.loads(node.get('comment', '{}'))
-            keys_set = set(node.keys())
-
-            # delete links adjacent to hydropower facilities
-            if len({'cost', 'max_flow'} & keys_set) >= 1 and up_nodes.count(
-                    node_name) == 1 \
-                    and down_nodes.count(node_name) == 1 \
-                    and 'hydropower' not in node_type \
-                    and 'reservoir' not in node_type:
-                up_edge = up_edges[node_name][0]
-                up_node = node_lookup[up_edge[0]]
-                up_type = up_node['type'].lower()
-                down_edge = down_edges[node_name][0]
-                down_node = node_lookup[down_edge[1]]
-                down_type = down_node['type'].lower()
-                # print(node_name, down_type)
-                if 'hydropower' in up_type or 'hydropower' in down_type:
-                    obsolete_nodes.append(node_name)
-                    obsolete_edges.extend([up_edge, down_edge])
-                    new_edges.append([up_node['name'], down_node['name']])
-                    mission_complete = False
-                    break
-
-            if keys_set in [{'name', 'type'}, {'name', 'type', 'comment'}] and not metadata.get('keep') \
-                    or delete_gauges and node_type == 'rivergauge' \
-                    or node_type == 'reservoir' and not node.get('max_volume'):
-                if delete_gauges and node_type == 'rivergauge':
-                    obsolete_gauges.append(node_name)
-                if down_nodes.count(node_name) == 0:
-                    # upstream-most node
-                    down_edge = down_edges[node_name][0]
-                    obsolete_nodes.append(node_name)
-                    obsolete_edges.append(down_edge)
-                    mission_complete = False
-                    break
-                elif up_nodes.count(node_name) == 1:
-                    down_edge = down_edges[node_name][0]
-                    obsolete_nodes.append(node_name)
-                    obsolete_edges.append(down_edge)
-                    for up_edge in up_edges[node_name]:
-                        obsolete_edges.append(up_edge)
-                        new_edges.append([up_edge[0], down_edge[1]])
-                    mission_complete = False
-                    break
-
-        m['nodes'] = [node for node in m['nodes'] if node['name'] not in obsolete_nodes]
-        m['edges'] = [edge for edge in m['edges'] if edge not in obsolete_edges] + new_edges
-        edges_set = []
-        for edge in m['edges']:
-            if edge not in edges_set:
-                edges_set.append(edge)
-        m['edges'] = edges_set
+    network = NetworkIndex.from_json(m)
+    m['nodes'], m['edges'], obsolete_nodes = reduce_network(m['nodes'], m['edges'], delete_gauges=delete_gauges,
+                                                            network=network)
+    node_lookup = {n['name']: n for n in m['nodes']}
+    obsolete_gauges = []
+    if delete_gauges:
+        obsolete_gauges = [n['name'] for n in m['nodes'] if n['type'].lower() == 'rivergauge']
 
     # delete obsolete parameters and recorders
-    obsolete_gauges_set = set(obsolete_gauges)
-    obsolete_nodes_set = set(obsolete_nodes)
-    for p in list(m['parameters']):
-        parts = p.split('/')
-        if parts[0] in obsolete_gauges:
+    for node_name in obsolete_gauges + obsolete_nodes:
+        for p in network.parameters_of(node_name):
             m['parameters'].pop(p, None)
-        elif delete_observed and '/observed' in p.lower():
-            m['parameters'].pop(p, None)
-        elif parts[0] in obsolete_nodes:
-            m['parameters'].pop(p, None)
-
-    for r in list(m['recorders']):
-        name_parts = r.split('/')[0:1]
-        node_parts = m['recorders'][r].get('node', '').split('/')
-        parameter_parts = m['recorders'][r].get('parameter', '').split('/')
-        names_set = set(name_parts + node_parts + parameter_parts)
-        if names_set & obsolete_gauges_set or names_set & obsolete_nodes_set:
-            m['recorders'].pop(r, None)
-        elif delete_observed and '/observed' in r:
+        for r in network.recorders_of(node_name):
             m['recorders'].pop(r, None)
+    if delete_observed:
+        for p in list(m['parameters']):
+            if '/observed' in p.lower():
+                m['parameters'].pop(p, None)
+        for r in list(m['recorders']):
+            if '/observed' in r:
+                m['recorders'].pop(r, None)
 
     if aggregate_runoff:
         subwat_groups = {}
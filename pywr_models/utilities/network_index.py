@@ -0,0 +1,188 @@
+from collections import deque
+
+
+def _recorder_names(name, node=None, parameter=None):
+    # the names a recorder refers to, as in simplify_network: its own node part, and the parts of its node and parameter
+    return set(name.split('/')[0:1] + (node or '').split('/') + (parameter or '').split('/'))
+
+
+class NetworkIndex(object):
+    """
+    The topology of a model network, built once from a model definition (from_json) or a loaded Pywr model
+    (from_model), for the utilities and parameters that need it: adjacency, topological order, upstream and downstream
+    closures, nodes by type, and the parameters and recorders of each node, by the "<node>/<attribute>" naming
+    convention.
+
+    The index is not updated if the network changes; build a new one instead.
+    """
+
+    def __init__(self, nodes, edges, types=None, parameters=None, recorders=None, objects=None):
+        """
+        :param nodes: Node names, in model order
+        :param edges: (upstream node, downstream node) pairs, in model order; duplicates are ignored
+        :param types: A dict of node name: node type, in lower case
+        :param parameters: Parameter names
+        :param recorders: A dict of recorder name: names of the nodes (and parameters) it refers to
+        :param objects: A dict of node name: node, for a loaded model
+        """
+        self.nodes = list(nodes)
+        self.edges = list(dict.fromkeys(tuple(edge) for edge in edges))
+        self.types = types or {}
+        self.objects = objects or {}
+
+        self.successors = {name: [] for name in self.nodes}
+        self.predecessors = {name: [] for name in self.nodes}
+        for a, b in self.edges:
+            for name in (a, b):
+                if name not in self.successors:
+                    self.nodes.append(name)  # not defined as a node
+                    self.successors[name] = []
+                    self.predecessors[name] = []
+            self.successors[a].append(b)
+            self.predecessors[b].append(a)
+        self.positions = {name: i for i, name in enumerate(self.nodes)}
+
+        self.nodes_by_type = {}
+        for name in self.nodes:
+            self.nodes_by_type.setdefault(self.types.get(name), []).append(name)
+
+        self.node_parameters = {}
+        for parameter in parameters or []:
+            self.node_parameters.setdefault(parameter.split('/')[0], []).append(parameter)
+        self.node_recorders = {}
+        for recorder, names in (recorders or {}).items():
+            for name in names:
+                self.node_recorders.setdefault(name, []).append(recorder)
+
+        self._upstream = {}
+        self._downstream = {}
+        self._topological_order = None
+
+    @classmethod
+    def from_json(cls, m):
+        """
+        Build the index of a model definition.
+        """
+        recorders = {name: _recorder_names(name, r.get('node'), r.get('parameter'))
+                     for name, r in m.get('recorders', {}).items()}
+        return cls(
+            nodes=[n['name'] for n in m['nodes']],
+            edges=m['edges'],
+            types={n['name']: n['type'].lower() for n in m['nodes']},
+            parameters=list(m.get('parameters', {})),
+            recorders=recorders,
+        )
+
+    @classmethod
+    def from_model(cls, model):
+        """
+        Build the index of a loaded Pywr model. Edges to and from child nodes (e.g., a storage node's inputs) are edges
+        of their parent.
+        """
+
+        def _top(node):
+            while node.parent is not None:
+                node = node.parent
+            return node.name
+
+        nodes = list(model.nodes)
+        edges = [(_top(a), _top(b)) for a, b in model.graph.edges()]
+        recorders = {}
+        for recorder in model.recorders:
+            if recorder.name is None:
+                continue
+            node = getattr(recorder, 'node', None)
+            parameter = getattr(recorder, 'parameter', None)
+            recorders[recorder.name] = _recorder_names(recorder.name, node.name if node is not None else None,
+                                                       parameter.name if parameter is not None else None)
+        return cls(
+            nodes=[node.name for node in nodes],
+            edges=[(a, b) for a, b in edges if a != b],
+            types={node.name: type(node).__name__.lower() for node in nodes},
+            parameters=[p.name for p in model.parameters if p.name],
+            recorders=recorders,
+            objects={node.name: node for node in nodes},
+        )
+
+    def get_node(self, name):
+        """
+        Get a node of a loaded model by name, without searching the model's nodes.
+        """
+        return self.objects[name]
+
+    def nodes_of_type(self, *types):
+        """
+        Get the nodes of one or more types (e.g., "reservoir", "hydropower"), in model order.
+        """
+        if len(types) == 1:
+            return list(self.nodes_by_type.get(types[0].lower(), []))
+        types = {t.lower() for t in types}
+        return [name for name in self.nodes if self.types.get(name) in types]
+
+    def parameters_of(self, name):
+        """
+        Get the parameters of a node, i.e., parameters named "<node>" or "<node>/...".
+        """
+        return list(self.node_parameters.get(name, []))
+
+    def recorders_of(self, name):
+        """
+        Get the recorders of a node: recorders named "<node>/...", or recording the node or one of its parameters.
+        """
+        return list(self.node_recorders.get(name, []))
+
+    def _closure(self, name, adjacency, cache):
+        closure = cache.get(name)
+        if closure is None:
+            visited = set()
+            to_visit = [name]
+            while to_visit:
+                for neighbour in adjacency.get(to_visit.pop(), []):
+                    if neighbour not in visited:
+                        visited.add(neighbour)
+                        to_visit.append(neighbour)
+            closure = cache[name] = sorted(visited, key=self.positions.get)
+        return list(closure)
+
+    def upstream(self, name):
+        """
+        Get all nodes upstream of a node, in model order.
+        """
+        return self._closure(name, self.predecessors, self._upstream)
+
+    def downstream(self, name):
+        """
+        Get all nodes downstream of a node, in model order.
+        """
+        return self._closure(name, self.successors, self._downstream)
+
+    def topological_order(self):
+        """
+        Get the nodes in topological order, i.e., each node after all nodes upstream of it.
+        """
+        if self._topological_order is None:
+            in_degree = {name: len(self.predecessors[name]) for name in self.nodes}
+            to_visit = deque(name for name in self.nodes if not in_degree[name])
+            order = []
+            while to_visit:
+                name = to_visit.popleft()
+                order.append(name)
+                for b in self.successors[name]:
+                    in_degree[b] -= 1
+                    if not in_degree[b]:
+                        to_visit.append(b)
+            if len(order) < len(self.nodes):
+                raise ValueError('The network has a cycle through {}'.format(
+                    ', '.join(name for name in self.nodes if in_degree[name])))
+            self._topological_order = order
+        return list(self._topological_order)
+
+
+def get_network_index(model):
+    """
+    Get the network index of a loaded model, building it the first time it is needed.
+    """
+    network = getattr(model, 'network_index', None)
+    if network is None:
+        network = model.network_index = NetworkIndex.from_model(model)
+    return network
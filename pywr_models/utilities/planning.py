@@ -1,5 +1,9 @@
 import json
 from pywr_models.utilities import simplify_network
+from pywr_models.utilities.cache import dump_json
+from pywr_models.utilities.network_index import NetworkIndex
+from pywr_models.utilities.monthly_tables import get_table_key, get_runoff_key, HOURLY_PRICES_TABLE, \
+    PRICE_VALUES_TABLE, PRICE_BLOCKS_TABLE, PRICE_DURATION_TABLE
 
 RIM_DAMS = {
     'stanislaus': 'New Melones Lake',
@@ -25,7 +29,7 @@ PARAMETERS_TO_REMOVE = {
 
 
 def prepare_planning_model(m, basin, climate, outpath, steps=12, blocks=8, parameters_to_expand=None, debug=False,
-                           remove_rim_dams=False):
+                           remove_rim_dams=False, monthly_tables_path=None):
     """
     Convert the daily scheduling model to a planning model.
     :param m:
@@ -35,14 +39,17 @@ def prepare_planning_model(m, basin, climate, outpath, steps=12, blocks=8, param
     :param parameters_to_expand:
     :param debug:
     :param include_rim_dams: Not used.
-    :return:
+    :param monthly_tables_path: The monthly tables file (see utilities.monthly_tables). If given, monthly tables and
+        runoff forecasts are read from this file, which should be built from the returned sources with
+        build_monthly_tables. Otherwise, they are read from monthly data files, found by name.
+    :return: The daily sources of the monthly tables, as a dict of key: (kind, spec)
     """
     # update time step
     # m['timestepper']['end'] = m['timestepper']['start']
     # m['timestepper']['timestep'] = 'M'
     # m['metadata']['title'] += ' - planning'
 
-    parameters_to_expand = PARAMETERS_TO_EXPAND.get(basin, []) + PARAMETERS_TO_EXPAND.get('common', [])
+    parameters_to_expand = set(PARAMETERS_TO_EXPAND.get(basin, []) + PARAMETERS_TO_EXPAND.get('common', []))
 
     m = simplify_network(m, basin=basin, climate=climate, delete_gauges=True, delete_observed=True,
                          delete_scenarios=False)
@@ -62,24 +69,19 @@ def prepare_planning_model(m, basin, climate, outpath, steps=12, blocks=8, param
 
     gauges = {}
 
-    parameters_to_expand = parameters_to_expand or []
-    parameters_to_delete = []
+    parameters_to_delete = set()
+    monthly_sources = {}
     # black_list = ['min_volume', 'max_volume']
     black_list = ['max_volume']
     storage_recorders = {}
 
     if remove_rim_dams:
         rim_dam = RIM_DAMS.get(basin)
-        parameters_to_remove = PARAMETERS_TO_REMOVE.get(basin, [])
-        downstream_nodes = []
-        downstream_edges = []
-        finished = False
-        while not finished:
-            finished = True
-            for n1, n2 in m['edges']:
-                if (n1 == rim_dam or n1 in downstream_nodes) and n2 not in downstream_nodes:
-                    downstream_nodes.append(n2)
-                    finished = False
+        parameters_to_remove = set(PARAMETERS_TO_REMOVE.get(basin, []))
+
+        # find all nodes downstream of the rim dam
+        downstream_nodes = set(NetworkIndex.from_json(m).downstream(rim_dam))
+
         m['nodes'] = [n for n in m['nodes'] if n['name'] not in downstream_nodes]
         m['edges'] = [e for e in m['edges'] if e[1] not in downstream_nodes and e[0]]
         for section in ['parameters', 'recorders']:
@@ -114,8 +116,7 @@ def prepare_planning_model(m, basin, climate, outpath, steps=12, blocks=8, param
             if node_type == 'Reservoir' and key == 'cost':
                 continue
             if type(value) == str and value in m['parameters']:
-                if value not in parameters_to_expand:
-                    parameters_to_expand.append(value)
+                parameters_to_expand.add(value)
 
         res_class = 'network'
         # res_name = 'network'
@@ -178,8 +179,7 @@ def prepare_planning_model(m, basin, climate, outpath, steps=12, blocks=8, param
                 if 'min_volume' in node:
                     min_volume = node['min_volume']
                     if type(min_volume) == str:
-                        if min_volume not in parameters_to_expand:
-                            parameters_to_expand.append(min_volume)
+                        parameters_to_expand.add(min_volume)
                         min_volume += month
                     storage_link['min_flow'] = min_volume
                 if 'max_volume' in node:
@@ -187,8 +187,7 @@ def prepare_planning_model(m, basin, climate, outpath, steps=12, blocks=8, param
                 cost = node.get('cost', None)
                 if cost:
                     if type(cost) == str:
-                        if cost not in parameters_to_expand:
-                            parameters_to_expand.append(cost)
+                        parameters_to_expand.add(cost)
                         cost += '/{}'.format(t)
                     storage_link['cost'] = cost
                 # for now, set cost to zero (by omission)
@@ -251,8 +250,7 @@ def prepare_planning_model(m, basin, climate, outpath, steps=12, blocks=8, param
                     if type(value) == str and value in m['parameters']:
                         if key not in black_list:
                             new_node[key] += month
-                            if value not in parameters_to_expand:
-                                parameters_to_expand.append(value)
+                            parameters_to_expand.add(value)
 
                     elif type(value) in [float, int]:
                         if key in ["max_flow", "turbine_capacity"]:
@@ -263,8 +261,7 @@ def prepare_planning_model(m, basin, climate, outpath, steps=12, blocks=8, param
                         new_values = []
                         for j, v in enumerate(value):
                             if type(v) == str:
-                                if v not in parameters_to_expand:
-                                    parameters_to_expand.append(v)
+                                parameters_to_expand.add(v)
                                 parts = v.split('/')
                                 if j == 0 or len(parts) == 2:
                                     for b in range(blocks):
@@ -305,13 +302,13 @@ def prepare_planning_model(m, basin, climate, outpath, steps=12, blocks=8, param
                 updated_node_names.get(new_n2, new_n2),
             ])
 
-    block_params_expanded = []
+    block_params_expanded = set()
 
     for param_name, param in m['parameters'].items():
         if 'control_curves' in param:
             for cc in param['control_curves']:
-                if type(cc) == str and cc not in parameters_to_expand:
-                    parameters_to_expand.append(cc)
+                if type(cc) == str:
+                    parameters_to_expand.add(cc)
 
     for param_name in m['parameters']:
 
@@ -347,11 +344,16 @@ def prepare_planning_model(m, basin, climate, outpath, steps=12, blocks=8, param
                     block_param = (res_name, attribute, t)
                     if block_param in block_params_expanded:
                         continue  # continue if we have
-                    block_params_expanded.append(block_param)
+                    block_params_expanded.add(block_param)
 
                 new_param = param.copy()
                 if attribute == 'Runoff':
-                    new_param['url'] = new_param['url'].replace('/runoff_aggregated/', '/runoff_monthly_forecasts/')
+                    if monthly_tables_path:
+                        key = get_runoff_key(param['url'])
+                        monthly_sources[key] = ('runoff', param)
+                        new_param = {'type': param['type'], 'url': monthly_tables_path, 'key': key}
+                    else:
+                        new_param['url'] = new_param['url'].replace('/runoff_aggregated/', '/runoff_monthly_forecasts/')
                     new_param['column'] = '{:02}'.format(t)
                     # new_param['parse_dates'] = False
                 elif attribute == 'Turbine Capacity':
@@ -389,9 +391,21 @@ def prepare_planning_model(m, basin, climate, outpath, steps=12, blocks=8, param
     for table_name, table in m.get('tables', {}).items():
         if 'observed' in table_name.lower():
             continue
-        if 'url' in table:
-            table['url'] = table['url'].replace('daily', 'monthly')
+        if 'daily' in table.get('url', ''):
+            if monthly_tables_path:
+                if table_name in [PRICE_VALUES_TABLE, PRICE_BLOCKS_TABLE]:
+                    # derived together
+                    monthly_sources[get_table_key(PRICE_VALUES_TABLE)] = \
+                        ('prices', (m['tables'][PRICE_VALUES_TABLE], m['tables'][PRICE_BLOCKS_TABLE]))
+                else:
+                    monthly_sources[get_table_key(table_name)] = ('table', table)
+                table = {'url': monthly_tables_path, 'key': get_table_key(table_name)}
+            else:
+                table['url'] = table['url'].replace('daily', 'monthly')
         new_tables[table_name] = table
+    if monthly_tables_path and HOURLY_PRICES_TABLE in new_tables:
+        # for PH_Water_Demand in the daily model
+        monthly_sources[get_table_key(PRICE_DURATION_TABLE)] = ('price duration', new_tables[HOURLY_PRICES_TABLE])
 
     if debug:
         for n in new_nodes:
@@ -488,6 +502,6 @@ def prepare_planning_model(m, basin, climate, outpath, steps=12, blocks=8, param
     m['parameters'] = new_parameters
     m['recorders'] = new_recorders
 
-    with open(outpath, 'w') as f:
-        json.dump(m, f, indent=4)
-    return
+    # written in one go (and atomically), rather than in many small writes
+    dump_json(m, outpath, indent=4)
+    return monthly_sources
@@ -0,0 +1,133 @@
+import time
+import hashlib
+from collections import OrderedDict
+import numpy as np
+from loguru import logger
+
+
+def get_input_digests(month, days, values, volumes):
+    """
+    Get a digest of the planning inputs of each scenario: the start month and length of the time step, and the
+    scenario's parameter values and storage volumes.
+    :param values: The parameter values, by parameter and scenario
+    :param volumes: The storage volumes, by reservoir and scenario
+    :return: A list of digests (bytes), one for each scenario
+    """
+    values = np.asarray(values, dtype=np.float64)
+    volumes = np.asarray(volumes, dtype=np.float64) if len(volumes) else np.zeros((0, values.shape[1]))
+    header = '{}/{}'.format(month, days).encode()
+    digests = []
+    for i in range(values.shape[1]):
+        digest = hashlib.blake2b(header, digest_size=16)
+        digest.update(values[:, i].tobytes())
+        digest.update(volumes[:, i].tobytes())
+        digests.append(digest.digest())
+    return digests
+
+
+class PlanningCache(object):
+    """
+    Reuse planning model results for scenarios whose planning inputs have been seen before.
+
+    The planning LP of a scenario is fully determined by the values of the model's parameters (initial storages via
+    Planning_Initial_Storage, the price year, runoff forecasts, IFR requirements, etc.), the storage volumes and the
+    length of the time step. After the model calculates its parameter values, each scenario's inputs are hashed,
+    together with the start month, and only scenarios with new inputs are solved; each distinct set of inputs is
+    solved once, even if several scenarios share it in the same month. For the others, the node flows of the earlier
+    solve are committed as the solver would have.
+
+    This replaces the planning model's solve() until restore() is called. Results are kept for up to `size` sets of
+    inputs, dropping the least recently used.
+    """
+
+    def __init__(self, model, size=1000):
+        from pywr._core import AbstractStorage
+        self.model = model
+        self.size = size
+        self.results = OrderedDict()  # digest: node flows
+        self.hits = 0
+        self.misses = 0
+        self.solved = 0
+        self.solve_seconds = 0.0
+
+        self.nodes = list(model.graph.nodes())  # including child nodes (e.g., StorageInput), as committed by the solver
+        self.storages = [node for node in self.nodes if isinstance(node, AbstractStorage)]
+        self.parameters = list(model.parameters)
+
+        self._original_solve = model.__dict__.get('solve')
+        self._solve = model.solve
+        model.solve = self.solve
+
+    def restore(self):
+        if self._original_solve is None:
+            del self.model.solve
+        else:
+            self.model.solve = self._original_solve
+
+    def get_digests(self):
+        """
+        Get a digest of the planning inputs of each scenario.
+        """
+        timestep = self.model.timestep
+        values = [parameter.get_all_values() for parameter in self.parameters]
+        volumes = [node.volume for node in self.storages]
+        return get_input_digests(timestep.month, timestep.days, values, volumes)
+
+    def solve(self):
+        combinations = self.model.scenarios.combinations
+        digests = self.get_digests()
+
+        to_solve = {}  # digest: first scenario with these inputs
+        for scenario_index in combinations:
+            digest = digests[scenario_index.global_id]
+            if digest in self.results:
+                self.results.move_to_end(digest)
+                self.hits += 1
+            elif digest in to_solve:
+                self.hits += 1
+            else:
+                to_solve[digest] = scenario_index
+                self.misses += 1
+
+        ret = None
+        if to_solve:
+            # the solver solves model.scenarios.combinations, which is read-only, but can be changed in place
+            all_combinations = list(combinations)
+            combinations[:] = list(to_solve.values())
+            t0 = time.perf_counter()
+            try:
+                ret = self._solve()
+            finally:
+                combinations[:] = all_combinations
+            self.solve_seconds += time.perf_counter() - t0
+            self.solved += len(to_solve)
+
+            flows = np.array([node.flow for node in self.nodes])
+            for digest, scenario_index in to_solve.items():
+                self.results[digest] = flows[:, scenario_index.global_id].copy()
+
+        solved_ids = {scenario_index.global_id for scenario_index in to_solve.values()}
+        cached_flows = None
+        for scenario_index in combinations:
+            sid = scenario_index.global_id
+            if sid in solved_ids:
+                continue
+            if cached_flows is None:
+                cached_flows = np.zeros((len(self.nodes), len(combinations)))
+            cached_flows[:, sid] = self.results[digests[sid]]
+        if cached_flows is not None:
+            for node, node_flows in zip(self.nodes, cached_flows):
+                node.commit_all(node_flows)
+
+        while len(self.results) > self.size:
+            self.results.popitem(last=False)
+
+        return ret
+
+    def log_stats(self):
+        lookups = self.hits + self.misses
+        if not lookups:
+            return
+        seconds_saved = self.solve_seconds / self.solved * self.hits if self.solved else 0.0
+        logger.info('Planning cache: {} of {} scenario solves reused ({:.0%}), saving about {:.1f} seconds'.format(
+            self.hits, lookups, self.hits / lookups, seconds_saved))
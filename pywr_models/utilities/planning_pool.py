@@ -0,0 +1,207 @@
+import traceback
+import multiprocessing
+import numpy as np
+import pandas as pd
+from loguru import logger
+from pywr._core import AbstractStorage
+
+from utilities.warm_start import IncrementalReset
+from utilities.planning_cache import PlanningCache
+from utilities.results import _recorder_data
+
+# Scheduling model recorders read by planning model parameters (in addition to storage volumes), by basin
+SCHEDULING_RECORDERS = {
+    'stanislaus': ['New Melones Lake/storage'],
+}
+
+
+class _Node(object):
+    def __init__(self, name, **kwargs):
+        self.name = name
+        self.__dict__.update(kwargs)
+
+
+class _Recorder(object):
+    """
+    A replica's running copy of a scheduling model recorder, to which the rows recorded since the last planning step
+    are added at each step.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.blocks = []
+        self.df = None
+
+    def append(self, df):
+        self.blocks.append(df)
+        self.df = None
+
+    def to_dataframe(self):
+        if self.df is None and self.blocks:
+            self.df = pd.concat(self.blocks)
+            self.blocks = [self.df]
+        return self.df
+
+
+class SchedulingState(object):
+    """
+    The parts of the scheduling model that planning model parameters read, for the scenarios of one planning replica:
+    storage volumes (e.g., for Planning_Initial_Storage) and some recorders (see SCHEDULING_RECORDERS). Scenarios
+    are in the replica's order, so they can be indexed with the replica's scenario global ids.
+
+    Only the recorder rows since the last state sent to the replica are included; the replica adds them to its own
+    running copy of the recorders (see update_recorders), so the state sent each month does not grow with the run.
+    """
+
+    def __init__(self, model, scenario_ids, recorders=None, start=0):
+        """
+        :param start: The first time step not yet sent to the replica, or 0 to send the recorders from the start
+        """
+        self.nodes = {}
+        for node in model.nodes:
+            if isinstance(node, AbstractStorage):
+                self.nodes[node.name] = _Node(node.name, volume=np.asarray(node.volume)[scenario_ids])
+        current = model.timestepper.current
+        self.stop = current.index + 1 if current is not None else 0
+        self.restart = start == 0
+        self.recorder_rows = {}
+        for name in recorders or []:
+            recorder = model.recorders[name]
+            # windowed recorders (see recorders.windowed) no longer have the rows already written to results
+            first = min(max(start, getattr(recorder, 'offset', 0)), self.stop)
+            data = _recorder_data(recorder, first, self.stop)[:, scenario_ids]
+            dates = model.timestepper.datetime_index[first:self.stop]
+            self.recorder_rows[name] = pd.DataFrame(data, index=dates, columns=model.scenarios.multiindex[scenario_ids])
+        self.recorders = {}
+
+    def update_recorders(self, recorders):
+        """
+        Add the new recorder rows to a replica's running copy of the recorders, and use it.
+        :param recorders: The replica's running copy, a dict of name: _Recorder
+        """
+        if self.restart:
+            recorders.clear()
+        for name, df in self.recorder_rows.items():
+            recorder = recorders.setdefault(name, _Recorder(name))
+            if len(df):
+                recorder.append(df)
+        self.recorder_rows = {}
+        self.recorders = recorders
+
+
+def _run_replica(conn, load_planning_model, planning_model_path, combinations, incremental=False, cache_size=0):
+    """
+    Run a planning model replica for some scenario combinations, in a worker process.
+    """
+    try:
+        model = load_planning_model(planning_model_path)
+        model.scenarios.user_combinations = combinations
+        model.setup()
+        reset = IncrementalReset(model).reset if incremental else model.reset
+        cache = PlanningCache(model, size=cache_size) if cache_size else None
+        recorders = {}
+        conn.send(('ready', [node.name for node in model.nodes]))
+    except Exception:
+        conn.send(('error', traceback.format_exc()))
+        return
+
+    while True:
+        message = conn.recv()
+        if message is None:
+            if cache:
+                cache.log_stats()
+            break
+        start, state = message
+        try:
+            state.update_recorders(recorders)
+            model.scheduling = state
+            reset(start=start)
+            model.step()
+            conn.send(('ok', np.array([node.flow for node in model.nodes])))
+        except Exception:
+            conn.send(('error', traceback.format_exc()))
+
+
+class PlanningPool(object):
+    """
+    Run the planning model with its scenario combinations split across worker processes.
+
+    Each worker loads its own replica of the planning model, limited to a contiguous share of the scheduling model's
+    scenario combinations. Planning solves are independent by scenario, so the replicas step in parallel. At each
+    step, each replica is given the scheduling model state it needs (see SchedulingState), and the resulting node
+    flows are gathered back, so that `pool.nodes[name].flow[global_id]` can be read by the scheduling model as with a
+    single planning model.
+
+    Workers are forked, so all components must be registered before the pool is created. The pool stands in for the
+    planning model in the daily run (i.e., model.planning), but planning model recorders are not available.
+    """
+
+    mode = 'planning'
+
+    def __init__(self, model, planning_model_path, load_planning_model, workers, recorders=None, incremental=False,
+                 cache_size=0):
+        """
+        :param model: The scheduling model, after setup
+        :param planning_model_path: The planning model file
+        :param load_planning_model: A function to load and set up the planning model from its path
+        :param workers: The number of worker processes
+        :param recorders: Scheduling model recorders to pass to the replicas
+        :param incremental: Reset the replicas incrementally (see utilities.warm_start)
+        :param cache_size: The size of each replica's planning cache, if any (see utilities.planning_cache)
+        """
+        self.scheduling = model
+        self.recorders = recorders or []
+        self._start = None
+        self._sent = 0  # the time steps of the scheduling model recorders already sent to the replicas
+
+        combinations = model.scenarios.combinations
+        self.scenario_ids = [ids for ids in np.array_split(np.arange(len(combinations)), workers) if len(ids)]
+        context = multiprocessing.get_context('fork')
+        self.workers = []
+        for ids in self.scenario_ids:
+            conn, child_conn = context.Pipe()
+            indices = np.array([combinations[i].indices for i in ids])
+            process = context.Process(target=_run_replica, daemon=True, args=(
+                child_conn, load_planning_model, planning_model_path, indices, incremental, cache_size))
+            process.start()
+            self.workers.append((process, conn))
+
+        node_names = None
+        for process, conn in self.workers:
+            node_names = self._receive(conn)
+        self.flows = np.zeros((len(node_names), len(combinations)))
+        self.nodes = {name: _Node(name, flow=self.flows[i]) for i, name in enumerate(node_names)}
+        logger.info('Planning model running in {} processes'.format(len(self.workers)))
+
+    def _receive(self, conn):
+        status, result = conn.recv()
+        if status == 'error':
+            self.close()
+            raise RuntimeError('Planning model replica failed:\n{}'.format(result))
+        return result
+
+    def reset(self, start=None):
+        self._start = start
+
+    def step(self):
+        current = self.scheduling.timestepper.current
+        stop = current.index + 1 if current is not None else 0
+        # if the scheduling model was reset (e.g., for the next climate), the replicas start their recorders again
+        start = self._sent if stop >= self._sent else 0
+        for ids, (process, conn) in zip(self.scenario_ids, self.workers):
+            conn.send((self._start, SchedulingState(self.scheduling, ids, recorders=self.recorders, start=start)))
+        self._sent = stop
+        for ids, (process, conn) in zip(self.scenario_ids, self.workers):
+            self.flows[:, ids] = self._receive(conn)
+
+    def close(self):
+        for process, conn in self.workers:
+            if process.is_alive():
+                try:
+                    conn.send(None)
+                except (BrokenPipeError, OSError):
+                    pass
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+        self.workers = []
@@ -0,0 +1,147 @@
+import os
+import numpy as np
+import pandas as pd
+from loguru import logger
+
+PLANNING_FILENAME = 'planning-{}.npz'
+
+
+class PlanningRecorder(object):
+    """
+    Record the decisions of each planning model run: the planned storage of each reservoir (VirtualStorage nodes) and
+    the planned flow of each powerhouse, for each month of the planning horizon.
+
+    Decisions are kept in one preallocated array, indexed by (planning run, horizon month, variable, scenario), and
+    are read directly from the planning model nodes, so the planning model does not need recorders. Since this is
+    cheap, it can be left on in production runs. Results are saved to a compressed .npz file (planning-<suffix>.npz)
+    that can be read back with read_planning_results.
+    """
+
+    def __init__(self, model, planning_model, months=12):
+        """
+        :param model: The daily model, after setup
+        :param planning_model: The full horizon planning model, after setup
+        :param months: The planning horizon, in months
+        """
+        self.months = months
+        self.scenarios = model.scenarios.multiindex
+        n_runs = len(pd.period_range(model.timestepper.start, model.timestepper.end, freq='M'))
+
+        self.variables = []
+        for node in planning_model.nodes:
+            parts = node.name.split('/')
+            if len(parts) != 2:
+                continue
+            name, month = parts
+            if type(node).__name__ == 'VirtualStorage':
+                variable = '{}/storage'.format(name)
+            elif 'hydropower' in type(node).__name__.lower():
+                variable = '{}/flow'.format(name)
+            else:
+                continue
+            if variable not in self.variables:
+                self.variables.append(variable)
+        self.attributes = ['volume' if v.endswith('/storage') else 'flow' for v in self.variables]
+
+        self.data = np.full((n_runs, months, len(self.variables), len(self.scenarios)), np.nan, dtype=np.float32)
+        self.dates = np.empty(n_runs, dtype='datetime64[M]')
+        self.reasons = np.empty(n_runs, dtype='U10')
+        self.n_runs = 0
+        self._nodes = {}  # planning model id: [(horizon month, variable index, node), ...]
+
+    def _get_nodes(self, planning_model):
+        nodes = self._nodes.get(id(planning_model))
+        if nodes is None:
+            nodes = []
+            for i, variable in enumerate(self.variables):
+                name = variable.rsplit('/', 1)[0]
+                for month in range(self.months):
+                    try:
+                        nodes.append((month, i, planning_model.nodes['{}/{}'.format(name, month + 1)]))
+                    except KeyError:
+                        break  # shorter horizon
+            self._nodes[id(planning_model)] = nodes
+        return nodes
+
+    def record(self, date, planning_model, reason=None):
+        """
+        Record the decisions of a planning model run.
+        :param date: The first month of the plan
+        :param planning_model: The planning model, after the run
+        :param reason: Why the planning model was run (see PlanningSchedule)
+        """
+        if self.n_runs == len(self.dates):
+            self._grow()
+        data = self.data[self.n_runs]
+        for month, i, node in self._get_nodes(planning_model):
+            data[month, i] = getattr(node, self.attributes[i])
+        self.dates[self.n_runs] = np.datetime64(str(date), 'M')
+        self.reasons[self.n_runs] = reason or ''
+        self.n_runs += 1
+
+    def _grow(self):
+        # not expected, with at most one planning run a month
+        n_runs = len(self.dates)
+        self.data = np.concatenate([self.data, np.full_like(self.data, np.nan)])
+        self.dates = np.concatenate([self.dates, np.empty(n_runs, dtype=self.dates.dtype)])
+        self.reasons = np.concatenate([self.reasons, np.empty(n_runs, dtype=self.reasons.dtype)])
+
+    def save(self, results_path, file_suffix):
+        """
+        Save the recorded decisions.
+        :param results_path: The results path, or a dict of climate: results path, to save each climate separately
+            (see ResultsWriter)
+        """
+        if isinstance(results_path, dict):
+            climates = self.scenarios.get_level_values('Climate')
+            for climate, path in results_path.items():
+                combinations = np.where(climates == climate)[0]
+                if self.scenarios.nlevels > 1:
+                    scenarios = self.scenarios[combinations].droplevel('Climate')
+                else:
+                    scenarios = pd.MultiIndex.from_product([range(len(combinations))], names=[''])
+                self._save(path, file_suffix, combinations, scenarios)
+        else:
+            self._save(results_path, file_suffix, np.arange(len(self.scenarios)), self.scenarios)
+
+    def _save(self, results_path, file_suffix, combinations, scenarios):
+        os.makedirs(results_path, exist_ok=True)
+        path = os.path.join(results_path, PLANNING_FILENAME.format(file_suffix))
+        np.savez_compressed(
+            path,
+            data=self.data[:self.n_runs][..., combinations],
+            dates=self.dates[:self.n_runs],
+            reasons=self.reasons[:self.n_runs],
+            variables=np.array(self.variables),
+            scenario_names=np.array([str(n) for n in scenarios.names]),
+            scenarios=np.array([[str(v) for v in (s if isinstance(s, tuple) else (s,))] for s in scenarios]),
+        )
+        logger.info('Planning decisions saved to {}'.format(path))
+
+    def to_dataframe(self):
+        return _to_dataframe(self.data[:self.n_runs], self.dates[:self.n_runs], self.variables, self.scenarios)
+
+
+def _to_dataframe(data, dates, variables, scenarios):
+    n_runs, months, n_variables, n_scenarios = data.shape
+    run_dates = pd.PeriodIndex(dates.astype(str), freq='M')
+    index = pd.MultiIndex.from_arrays([
+        np.repeat(run_dates.to_timestamp(), months),
+        (np.repeat(run_dates, months) + np.tile(np.arange(months), n_runs)).to_timestamp(),
+    ], names=['Date', 'Planning Date'])
+    columns = pd.MultiIndex.from_tuples(
+        [(v,) + (s if isinstance(s, tuple) else (s,)) for v in variables for s in scenarios],
+        names=['variable'] + list(scenarios.names))
+    df = pd.DataFrame(data.reshape(n_runs * months, n_variables * n_scenarios), index=index, columns=columns)
+    return df.dropna(how='all')
+
+
+def read_planning_results(path):
+    """
+    Read planning decisions saved by a PlanningRecorder.
+    :return: A DataFrame indexed by the planning run date and the planned month, with a column for each variable
+        (e.g., "New Melones Lake/storage") and scenario
+    """
+    with np.load(path) as f:
+        scenarios = pd.MultiIndex.from_arrays(list(f['scenarios'].T), names=list(f['scenario_names']))
+        return _to_dataframe(f['data'], f['dates'], list(f['variables']), scenarios)
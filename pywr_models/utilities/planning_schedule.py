@@ -0,0 +1,173 @@
+import os
+from collections import Counter
+from loguru import logger
+
+WATER_YEAR_START_MONTH = 10
+
+
+def get_planning_model_path(planning_model_path, horizon):
+    """
+    Get the path of the planning model with a shorter horizon, e.g., pywr_model_monthly_3.json for 3 months.
+    """
+    root, ext = os.path.splitext(planning_model_path)
+    return '{}_{}{}'.format(root, horizon, ext)
+
+
+def months_to_water_year_end(date):
+    return (9 - date.month) % 12 + 1
+
+
+class PlanningSchedule(object):
+    """
+    Decide when to run the planning model, and with what horizon.
+
+    The planning model is run at the start of a month if any of the following apply:
+
+    - it has not been run yet, or the last plan does not cover this month
+    - it is a regular planning month, every `interval` months from the start of the water year (e.g., 1: monthly,
+      3: quarterly, 12: once a water year, on Oct 1)
+    - it is a forecast update month (`forecast_months`)
+    - the storage of a reservoir deviates from the last plan by more than `storage_threshold`, as a fraction of its
+      capacity, in any scenario
+
+    In other months, the scheduling model follows the last plan, reading the planned flows for the current month
+    (i.e., model.planning_month months into the plan).
+
+    With `shrink_horizon`, the planning horizon ends at the end of the water year, so it shrinks from `months`
+    (at most 12) in October to one month in September. This uses a planning model built for each horizon (see
+    get_planning_model_path), loaded as needed.
+    """
+
+    def __init__(self, months=12, interval=1, storage_threshold=None, forecast_months=None, shrink_horizon=False):
+        if 12 % interval:
+            raise ValueError('The planning interval must divide the year evenly (1, 2, 3, 4, 6 or 12 months)')
+        self.months = months
+        self.interval = interval
+        self.storage_threshold = storage_threshold
+        self.forecast_months = forecast_months or []
+        self.shrink_horizon = shrink_horizon
+
+        self.planning_models = {}
+        self.planning_model_paths = {}
+        self.load_planning_model = None
+
+        self.last_plan = None  # (date, horizon)
+        self.plans = Counter()  # reason: number of plans
+        self._reservoirs = None
+
+    def __repr__(self):
+        return 'PlanningSchedule(interval={}, storage_threshold={}, forecast_months={}, shrink_horizon={})'.format(
+            self.interval, self.storage_threshold, self.forecast_months, self.shrink_horizon)
+
+    def get_horizons(self):
+        """
+        Get the planning horizons that may be needed, in months.
+        """
+        if self.shrink_horizon:
+            return list(range(1, self.months + 1))
+        return [self.months]
+
+    def get_horizon(self, date):
+        if self.shrink_horizon:
+            return min(self.months, months_to_water_year_end(date))
+        return self.months
+
+    def set_planning_models(self, planning_model, planning_model_path=None, load_planning_model=None):
+        """
+        :param planning_model: The loaded planning model, with the full horizon
+        :param planning_model_path: Its path, from which the paths of planning models with shorter horizons are found
+        :param load_planning_model: A function to load a planning model from its path
+        """
+        self.planning_models = {self.months: planning_model}
+        if planning_model_path:
+            self.planning_model_paths = {h: get_planning_model_path(planning_model_path, h)
+                                         for h in self.get_horizons() if h != self.months}
+        self.load_planning_model = load_planning_model
+
+    def get_planning_model(self, horizon, scheduling_model):
+        planning_model = self.planning_models.get(horizon)
+        if planning_model is None:
+            logger.info('Loading {}-month planning model'.format(horizon))
+            planning_model = self.load_planning_model(self.planning_model_paths[horizon])
+            planning_model.scheduling = scheduling_model
+            self.planning_models[horizon] = planning_model
+        return planning_model
+
+    def _get_reservoirs(self, model):
+        # scheduling model reservoirs that are also in the planning model
+        from pywr._core import AbstractStorage
+        reservoirs = []
+        for node in model.nodes:
+            if isinstance(node, AbstractStorage):
+                try:
+                    model.planning.nodes['{} [link]/1'.format(node.name)]
+                except KeyError:
+                    continue
+                reservoirs.append(node)
+        return reservoirs
+
+    def get_storage_deviation(self, model, months_into_plan):
+        """
+        Get the largest difference between the storage of a reservoir and its planned storage at the start of this
+        month, as a fraction of capacity.
+        """
+        if self._reservoirs is None:
+            self._reservoirs = self._get_reservoirs(model)
+        deviation = 0.0
+        for node in self._reservoirs:
+            # planned storage carried over from the previous month
+            planned = model.planning.nodes['{} [link]/{}'.format(node.name, months_into_plan)].flow
+            for scenario_index in model.scenarios.combinations:
+                sid = scenario_index.global_id
+                max_volume = node.get_max_volume(scenario_index)
+                if max_volume > 0:
+                    deviation = max(deviation, abs(node.volume[sid] - planned[sid]) / max_volume)
+        return deviation
+
+    def get_reason(self, date, model):
+        """
+        Get the reason to run the planning model at the start of this month, if any.
+        :param date: The first day of the month
+        :param model: The scheduling model
+        :return: The reason, or None if the scheduling model should follow the last plan
+        """
+        if self.last_plan is None:
+            return 'first'
+        plan_date, horizon = self.last_plan
+        months_into_plan = (date.year - plan_date.year) * 12 + date.month - plan_date.month
+        if months_into_plan >= horizon:
+            return 'horizon'
+        if (date.month - WATER_YEAR_START_MONTH) % 12 % self.interval == 0:
+            return 'interval'
+        if date.month in self.forecast_months:
+            return 'forecast'
+        if self.storage_threshold is not None \
+                and self.get_storage_deviation(model, months_into_plan) > self.storage_threshold:
+            return 'storage'
+        return None
+
+    def run(self, date, model, reset):
+        """
+        Run the planning model at the start of a month, if needed, updating model.planning and model.planning_month.
+        :param date: The first day of the month
+        :param model: The scheduling model
+        :param reset: A function to reset a planning model to a date, e.g., lambda planning_model, start: ...
+        :return: The reason the planning model was run (see get_reason), or None if it was not run
+        """
+        reason = self.get_reason(date, model)
+        if reason is None:
+            model.planning_month += 1
+            return None
+
+        horizon = self.get_horizon(date)
+        model.planning = self.get_planning_model(horizon, model)
+        reset(model.planning, date.to_timestamp())
+        model.planning.step()
+        model.planning_month = 1
+        self.last_plan = (date, horizon)
+        self.plans[reason] += 1
+        return reason
+
+    def log_stats(self):
+        logger.info('Planning model runs: {} ({})'.format(
+            sum(self.plans.values()), ', '.join('{}: {}'.format(k, v) for k, v in sorted(self.plans.items()))))
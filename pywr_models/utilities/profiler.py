@@ -0,0 +1,160 @@
+import time
+import numpy as np
+import pandas as pd
+from loguru import logger
+
+
+def _is_custom(obj):
+    # custom (Python) classes can be instrumented; pywr's own (Cython) classes cannot
+    return not type(obj).__module__.startswith('pywr')
+
+
+class Profiler(object):
+    """
+    Collect the cumulative time and number of calls of the parts of a model run:
+
+    - before() and value() of each custom parameter
+    - after() of each custom recorder (pywr's own recorders are included in the model "after" phase)
+    - the model phases: before (nodes and parameters), solve (the LP) and after (nodes and recorders)
+    - the planning model reset and step
+
+    Methods are timed by temporarily replacing them with timed versions, so profiling has no cost unless turned on.
+    Call restore() when done to remove the timers.
+    """
+
+    def __init__(self):
+        self.timings = {}  # (model, component, type, method): [seconds, calls]
+        self.total_seconds = None
+        self._labels = {}
+        self._patched = []
+        self._active = set()
+        self._start_time = None
+
+    def _record(self, key, seconds):
+        timing = self.timings.get(key)
+        if timing is None:
+            self.timings[key] = [seconds, 1]
+        else:
+            timing[0] += seconds
+            timing[1] += 1
+
+    def _patch_class(self, cls, method_name):
+        func = getattr(cls, method_name)
+        if getattr(func, 'profiled', False):
+            return
+        profiler = self
+
+        def timed(obj, *args, **kwargs):
+            key = (id(obj), method_name)
+            if key in profiler._active:
+                # e.g., a call to super() from a subclass that is also timed
+                return func(obj, *args, **kwargs)
+            profiler._active.add(key)
+            t0 = time.perf_counter()
+            try:
+                return func(obj, *args, **kwargs)
+            finally:
+                profiler._active.discard(key)
+                label = profiler._labels.get(id(obj.model), '')
+                profiler._record((label, obj.name, type(obj).__name__, method_name), time.perf_counter() - t0)
+
+        timed.profiled = True
+        self._patched.append((cls, method_name, cls.__dict__.get(method_name)))
+        setattr(cls, method_name, timed)
+
+    def _patch_instance(self, obj, method_name, key):
+        func = getattr(obj, method_name)
+        profiler = self
+
+        def timed(*args, **kwargs):
+            t0 = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                profiler._record(key, time.perf_counter() - t0)
+
+        self._patched.append((obj, method_name, None))
+        setattr(obj, method_name, timed)
+
+    def instrument(self, model, label='daily'):
+        """
+        Add timers to a model (and its planning model, if any).
+        :param model: The Pywr model, after setup
+        :param label: The label of the model in the report
+        """
+        self._labels[id(model)] = label
+
+        classes = set()
+        for parameter in model.parameters:
+            if _is_custom(parameter):
+                classes.add((type(parameter), 'before'))
+                classes.add((type(parameter), 'value'))
+        for recorder in model.recorders:
+            if _is_custom(recorder):
+                classes.add((type(recorder), 'after'))
+        for cls, method_name in classes:
+            self._patch_class(cls, method_name)
+
+        for phase in ['before', 'solve', 'after']:
+            self._patch_instance(model, phase, (label, '(model)', 'Model', phase))
+
+        planning_model = getattr(model, 'planning', None)
+        if planning_model is not None:
+            for method_name in ['reset', 'step']:
+                self._patch_instance(planning_model, method_name, (label, '(planning model)', 'Model', method_name))
+            if hasattr(planning_model, 'parameters'):
+                # (not a planning pool, whose models run in other processes)
+                self.instrument(planning_model, label='planning')
+
+    def restore(self):
+        """
+        Remove all timers.
+        """
+        for owner, method_name, original in reversed(self._patched):
+            if original is None:
+                delattr(owner, method_name)
+            else:
+                setattr(owner, method_name, original)
+        self._patched = []
+
+    def start(self):
+        self._start_time = time.perf_counter()
+
+    def stop(self):
+        self.total_seconds = time.perf_counter() - self._start_time
+
+    def add_solver_stats(self, model, label='daily'):
+        """
+        Add the solver's own timing breakdown (e.g., LP solve vs. bounds updates) for a model.
+        """
+        stats = getattr(model.solver, 'stats', None) or {}
+        solves = self.timings.get((label, '(model)', 'Model', 'solve'), [0, 0])[1]
+        for name, seconds in stats.items():
+            if isinstance(seconds, float):
+                self.timings[(label, '(solver)', type(model.solver).__name__, name)] = [seconds, solves]
+
+    def to_dataframe(self):
+        """
+        Get the timings as a dataframe, ranked by total time.
+        """
+        rows = []
+        for (label, component, _type, method), (seconds, calls) in self.timings.items():
+            rows.append(dict(model=label, component=component, type=_type, method=method, calls=calls,
+                             seconds=seconds))
+        df = pd.DataFrame(rows, columns=['model', 'component', 'type', 'method', 'calls', 'seconds'])
+        df = df.sort_values('seconds', ascending=False).reset_index(drop=True)
+        df['mean_ms'] = df['seconds'] / df['calls'].replace(0, np.nan) * 1000
+        if self.total_seconds:
+            df['percent'] = df['seconds'] / self.total_seconds * 100
+        return df
+
+    def save(self, path, top=20):
+        """
+        Save the report to a CSV file and log the top entries.
+        """
+        df = self.to_dataframe()
+        df.to_csv(path, index=False)
+        if self.total_seconds:
+            logger.info('Profile (total run time: {:.1f} seconds):'.format(self.total_seconds))
+        logger.info('\n' + df.head(top).to_string())
+        logger.info('Profile saved to {}'.format(path))
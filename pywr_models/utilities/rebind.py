@@ -0,0 +1,85 @@
+from .hydrology_store import load_dataframe
+from pywr.parameters import DataFrameParameter
+from loguru import logger
+
+# Parameter/table keys that are not passed on to pandas when reading a dataframe
+NON_DATA_KEYS = ['type', 'name', 'scenario', 'comment']
+
+
+def _strip_urls(section):
+    return {name: {k: v for k, v in item.items() if k != 'url'} for name, item in section.items()}
+
+
+def is_rebindable(old_json, new_json):
+    """
+    Check if a loaded model can be switched to a new model definition just by reloading data.
+    This is the case if the two models differ only in their data urls and dates.
+    """
+    for key in set(old_json) | set(new_json):
+        if key == 'timestepper':
+            continue
+        old_part = old_json.get(key)
+        new_part = new_json.get(key)
+        if key in ['tables', 'store_tables', 'parameters']:
+            if _strip_urls(old_part or {}) != _strip_urls(new_part or {}):
+                return False
+        elif old_part != new_part:
+            return False
+    return True
+
+
+def _read_data(model, spec):
+    data = {k: v for k, v in spec.items() if k not in NON_DATA_KEYS}
+    return load_dataframe(model, data)
+
+
+def rebind_model(model, old_json, new_json):
+    """
+    Switch an already loaded (and set up) model to a new model definition by reloading only the tables and dataframe
+    parameters whose urls have changed, e.g., to run the same network with a different climate. This avoids
+    reloading and setting up the model from scratch.
+
+    If the dates have changed, the timestepper is updated and the model will be set up again on the next step.
+    Otherwise, the changed parameters and all custom parameters are set up again (the latter to clear any state
+    they keep between time steps) and the model is reset.
+    :param model: The loaded Pywr model
+    :param old_json: The model definition that the model was loaded from
+    :param new_json: The new model definition
+    :return: True if the model was rebound, False if it needs to be reloaded instead
+    """
+
+    if not is_rebindable(old_json, new_json):
+        return False
+
+    for tables_key in ['tables', 'store_tables']:
+        for table_name, table in new_json.get(tables_key, {}).items():
+            if table != old_json[tables_key].get(table_name):
+                model.tables[table_name] = _read_data(model, table)
+
+    changed_parameters = []
+    for param_name, param in new_json.get('parameters', {}).items():
+        if param == old_json['parameters'].get(param_name):
+            continue
+        parameter = model.parameters[param_name]
+        if not isinstance(parameter, DataFrameParameter):
+            logger.warning('Cannot rebind data for parameter {}'.format(param_name))
+            return False
+        parameter.dataframe = _read_data(model, param)
+        changed_parameters.append(parameter)
+
+    old_dates = old_json['timestepper']['start'], old_json['timestepper']['end']
+    new_dates = new_json['timestepper']['start'], new_json['timestepper']['end']
+    if old_dates != new_dates:
+        # a full setup is needed anyway; this will happen at the next step
+        model.timestepper.start = new_json['timestepper']['start']
+        model.timestepper.end = new_json['timestepper']['end']
+        model.dirty = True
+        return True
+
+    for parameter in model.parameters:
+        if parameter in changed_parameters or not type(parameter).__module__.startswith('pywr'):
+            parameter.setup()
+
+    model.reset()
+
+    return True
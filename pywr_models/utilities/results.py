@@ -1,11 +1,57 @@
 import os
+import numpy as np
 import pandas as pd
+import tables
 
+RESULTS_FILENAME = 'results-{}.h5'
 
-def save_model_results(model, results_path, file_suffix):
-    results_df = model.to_dataframe()
+# compression for streamed results; blosc is fast enough to not slow down the run
+RESULTS_FILTERS = tables.Filters(complevel=5, complib='blosc')
+
+# rows (days) read at a time when saving results to CSV
+CSV_BLOCK_ROWS = 3650
+
+
+def get_base_results_path(debug=False):
+    if debug:
+        return '../results'
+    else:
+        return os.environ.get('SIERRA_RESULTS_PATH', '../results')
+
+
+def get_dataset_name(model, recorder_name):
+    """
+    Get the name of the dataset (results file) that a recorder belongs to, by node type and attribute, e.g.,
+    "Reservoir_Storage_mcm" for "New Melones Lake/storage".
+    """
+    res_name, attr = recorder_name.split('/')
+    if res_name in model.nodes:
+        node = model.nodes[res_name]
+        _type = type(node).__name__
+    else:
+        _type = 'Other'
+    if attr == 'elevation':
+        unit = 'm'
+    elif attr == 'energy':
+        unit = 'MWh'
+    else:
+        unit = 'mcm'
+    return '{}_{}_{}'.format(_type, attr.title(), unit)
+
+
+def save_model_results(model, results_path, file_suffix, climate=None, results_df=None):
+    """
+    Save model results to CSV files, one for each node type and attribute.
+    :param climate: If climates are run as a "Climate" scenario, save only the results for this climate
+    :param results_df: The model results, if already collected with model.to_dataframe()
+    """
+    if results_df is None:
+        results_df = model.to_dataframe()
     results_df.index.name = 'Date'
     scenario_names = [s.name for s in model.scenarios.scenarios]
+    if climate is not None:
+        results_df = results_df.xs(climate, axis=1, level='Climate')
+        scenario_names.remove('Climate')
     if not scenario_names:
         scenario_names = [0]
     if not os.path.exists(results_path):
@@ -19,32 +65,21 @@ def save_model_results(model, results_path, file_suffix):
     recorder_items = set(results_df.columns.get_level_values(0))
     if len(results_df.columns) == len(recorder_items):
         has_scenarios = False
-        results_df.columns = results_df.columns.droplevel(1)
+        if results_df.columns.nlevels > 1:
+            results_df.columns = results_df.columns.droplevel(1)
 
     columns = {}
     # nodes_of_type = {}
     for c in results_df.columns:
-        res_name, attr = (c[0] if has_scenarios else c).split('/')
-        if res_name in model.nodes:
-            node = model.nodes[res_name]
-            _type = type(node).__name__
+        dataset = get_dataset_name(model, c[0] if has_scenarios else c)
+        if dataset in columns:
+            columns[dataset].append(c)
         else:
-            _type = 'Other'
-        key = (_type, attr)
-        if key in columns:
-            columns[key].append(c)
-        else:
-            columns[key] = [c]
+            columns[dataset] = [c]
         # nodes_of_type[_type] = nodes_of_type.get(_type, []) + [node]
 
-    for (_type, attr), cols in columns.items():
-        if attr == 'elevation':
-            unit = 'm'
-        elif attr == 'energy':
-            unit = 'MWh'
-        else:
-            unit = 'mcm'
-        tab_path = os.path.join(results_path, '{}_{}_{}-{}'.format(_type, attr.title(), unit, file_suffix))
+    for dataset, cols in columns.items():
+        tab_path = os.path.join(results_path, '{}-{}'.format(dataset, file_suffix))
         df = results_df[cols]
         if has_scenarios:
             new_cols = [tuple([col[0].split('/')[0]] + list(col[1:])) for col in cols]
@@ -53,3 +88,213 @@ def save_model_results(model, results_path, file_suffix):
         else:
             df.columns = [c.split('/')[0] for c in df.columns]
         df.to_csv(tab_path + '.csv')
+
+
+def _recorder_data(recorder, start=None, stop=None):
+    # windowed recorders (recorders.windowed) hold only the rows not yet written
+    if hasattr(recorder, 'get_rows'):
+        return np.asarray(recorder.get_rows(start, stop))
+    # Python recorders (e.g., HydropowerEnergyRecorder) keep their data in a regular _data attribute
+    data = getattr(recorder, '_data', None)
+    if data is None:
+        data = recorder.data
+    return np.asarray(data)[start:stop]
+
+
+def _release_rows(recorder, stop):
+    if hasattr(recorder, 'release'):
+        recorder.release(stop)
+
+
+class ResultsWriter(object):
+    """
+    Write model results while the model runs, rather than all at once at the end.
+
+    Each call to write() appends the rows since the previous call to an HDF5 file (results-<suffix>.h5) in the results
+    path, with one extendable, compressed array per dataset (e.g., "Reservoir_Storage_mcm"). The datasets have the same
+    columns as the CSV files written by save_model_results and can be read back with read_results. Since rows are
+    written as the model runs, results up to the last write survive a crash.
+
+    With windowed recorders (see recorders.windowed), the rows are released from the recorders once written, so the
+    recorders hold at most a water year of results rather than the whole run.
+    """
+
+    def __init__(self, model, results_path, file_suffix):
+        """
+        :param model: The daily model, after setup
+        :param results_path: The results path, or, if climates are run as a "Climate" scenario, a dict of
+            climate: results path, in which case the results of each climate are written to its own path
+        :param file_suffix: The file suffix
+        """
+        self.model = model
+        self.file_suffix = file_suffix
+        self.recorders = [r for r in model.recorders if hasattr(r, 'to_dataframe')]
+        self.dates = model.timestepper.datetime_index.to_timestamp()
+        self.rows_written = 0
+
+        datasets = {}
+        for i, recorder in enumerate(self.recorders):
+            datasets.setdefault(get_dataset_name(model, recorder.name), []).append(i)
+
+        sc_index = model.scenarios.multiindex
+        scenario_names = [s.name for s in model.scenarios.scenarios]
+        if isinstance(results_path, dict):
+            climates = sc_index.get_level_values('Climate')
+            scenario_names.remove('Climate')
+            outputs = []
+            for climate, path in results_path.items():
+                combinations = np.where(climates == climate)[0]
+                ensembles = sc_index[combinations].droplevel('Climate') if scenario_names else None
+                outputs.append((path, combinations, ensembles))
+        else:
+            outputs = [(results_path, np.arange(len(sc_index)), sc_index if scenario_names else None)]
+
+        self.outputs = []
+        for path, combinations, ensembles in outputs:
+            output = dict(
+                path=os.path.join(path, RESULTS_FILENAME.format(file_suffix)),
+                results_path=path,
+                combinations=combinations,
+                datasets={},
+            )
+            for dataset, recorder_ids in datasets.items():
+                node_names = [self.recorders[i].name.split('/')[0] for i in recorder_ids]
+                if len(combinations) == 1:
+                    columns = pd.Index(node_names)
+                else:
+                    ensemble_tuples = [e if isinstance(e, tuple) else (e,) for e in ensembles]
+                    columns = pd.MultiIndex.from_tuples(
+                        [(node,) + e for node in node_names for e in ensemble_tuples],
+                        names=['node'] + scenario_names
+                    )
+                output['datasets'][dataset] = dict(recorders=recorder_ids, columns=columns)
+            self.outputs.append(output)
+
+    def get_rows_written(self):
+        """
+        Get the number of time steps already written to all results files, e.g., before a run was interrupted.
+        """
+        rows = []
+        for output in self.outputs:
+            if not os.path.exists(output['path']):
+                return 0
+            with tables.open_file(output['path'], mode='r') as h5:
+                if '/dates' not in h5:
+                    return 0
+                rows.append(min([h5.root.dates.nrows] + [array.nrows for array in h5.root.data]))
+        return min(rows)
+
+    def start(self, step=0):
+        """
+        Prepare the results files before the first write. When resuming a run at a given step, any rows from that
+        step on, written before the run was interrupted, are removed. Otherwise, any existing results are removed.
+        :param step: The index of the first time step to be run
+        """
+        for output in self.outputs:
+            os.makedirs(output['results_path'], exist_ok=True)
+            if not step:
+                if os.path.exists(output['path']):
+                    os.remove(output['path'])
+                continue
+            with tables.open_file(output['path'], mode='a') as h5:
+                for array in [h5.root.dates] + list(h5.root.data):
+                    if array.nrows > step:
+                        array.truncate(step)
+        for recorder in self.recorders:
+            _release_rows(recorder, step)
+        self.rows_written = step
+
+    def write(self, stop):
+        """
+        Write the results from the last write up to (but not including) a time step.
+        :param stop: The index of the time step after the last one to write
+        """
+        start = self.rows_written
+        if stop <= start:
+            return
+
+        data = [_recorder_data(recorder, start, stop) for recorder in self.recorders]
+        dates = self.dates[start:stop].values.astype('datetime64[ns]').astype('int64')
+
+        for output in self.outputs:
+            with tables.open_file(output['path'], mode='a') as h5:
+                if '/dates' not in h5:
+                    self._create_arrays(h5, output)
+                h5.root.dates.append(dates)
+                for dataset, info in output['datasets'].items():
+                    block = np.hstack([data[i][:, output['combinations']] for i in info['recorders']])
+                    h5.get_node('/data', _node_name(dataset)).append(block)
+
+        del data
+        for recorder in self.recorders:
+            _release_rows(recorder, stop)
+        self.rows_written = stop
+
+    def _create_arrays(self, h5, output):
+        expected_rows = len(self.dates)
+        h5.create_earray('/', 'dates', atom=tables.Int64Atom(), shape=(0,), expectedrows=expected_rows)
+        h5.create_group('/', 'data')
+        h5.create_group('/', 'columns')
+        for dataset, info in output['datasets'].items():
+            columns = info['columns']
+            name = _node_name(dataset)
+            h5.create_earray('/data', name, atom=tables.Float64Atom(), shape=(0, len(columns)),
+                             filters=RESULTS_FILTERS, expectedrows=expected_rows)
+            column_values = columns.to_frame(index=False).astype(str).values.astype('U')
+            column_array = h5.create_array('/columns', name, obj=np.char.encode(column_values, 'utf-8'))
+            column_array.attrs.dataset = dataset
+            column_array.attrs.names = [n or '' for n in columns.names] if columns.nlevels > 1 else []
+
+    def to_csv(self):
+        """
+        Save the results to CSV files, one per dataset, as with save_model_results. Each dataset is read and saved
+        in blocks of rows, so only one block is ever in memory.
+        """
+        for output in self.outputs:
+            with tables.open_file(output['path'], mode='r') as h5:
+                nrows = h5.root.dates.nrows
+            for dataset in output['datasets']:
+                tab_path = os.path.join(output['results_path'], '{}-{}.csv'.format(dataset, self.file_suffix))
+                for start in range(0, max(nrows, 1), CSV_BLOCK_ROWS):
+                    df = read_results(output['path'], dataset, start=start, stop=start + CSV_BLOCK_ROWS)
+                    if start:
+                        df.to_csv(tab_path, mode='a', header=False)
+                    else:
+                        df.to_csv(tab_path)
+
+    def remove(self):
+        for output in self.outputs:
+            if os.path.exists(output['path']):
+                os.remove(output['path'])
+
+
+def _node_name(dataset):
+    return dataset.replace(' ', '_')
+
+
+def read_results(path, dataset, start=None, stop=None):
+    """
+    Read a dataset (e.g., "Reservoir_Storage_mcm") from a results file written by ResultsWriter.
+    :param path: The path to the results file
+    :param dataset: The dataset name
+    :param start: The first row (time step) to read, if not the first
+    :param stop: The row after the last one to read, if not the end
+    :return: A dataframe, with the same layout as the dataset's CSV file
+    """
+    name = _node_name(dataset)
+    with tables.open_file(path, mode='r') as h5:
+        column_array = h5.get_node('/columns', name)
+        column_values = np.char.decode(column_array.read(), 'utf-8')
+        names = list(column_array.attrs.names)
+        array = h5.get_node('/data', name)
+        stop = min(array.nrows if stop is None else stop, array.nrows, h5.root.dates.nrows)
+        data = array.read(start, stop)
+        dates = pd.to_datetime(h5.root.dates.read(start, stop))
+
+    if names:
+        columns = pd.MultiIndex.from_arrays(column_values.T.tolist(), names=names)
+    else:
+        columns = pd.Index(column_values[:, 0])
+    df = pd.DataFrame(data, index=dates, columns=columns)
+    df.index.name = 'Date'
+    return df
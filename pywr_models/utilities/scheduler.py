@@ -0,0 +1,285 @@
+import os
+import json
+import time
+from datetime import datetime
+from glob import glob
+from statistics import median
+from loguru import logger
+
+from utilities.results import get_base_results_path
+from utilities.cache import dump_json
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+MANIFEST_DIR = '_jobs'
+RUN_RECORD = '_run.json'
+
+# Rough relative cost of a model year, by basin, used to order jobs when there are no previous runtimes
+BASIN_WEIGHTS = {
+    'upper_san_joaquin': 4,
+    'stanislaus': 2,
+    'tuolumne': 2,
+    'merced': 1,
+}
+PLANNING_WEIGHT = 3
+
+PLANNING_BASINS = ['stanislaus', 'upper_san_joaquin']
+
+
+def get_abs_path(path):
+    """
+    Get the absolute path of a results path, which is relative to the pywr_models folder.
+    """
+    here = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+    return os.path.normpath(os.path.join(here, path))
+
+
+def get_manifest_path(run_name, debug=False):
+    """
+    Get the directory of the job manifest for a run. The manifest has one JSON file per basin and climate.
+    """
+    return get_abs_path(os.path.join(get_base_results_path(debug=debug), run_name, MANIFEST_DIR))
+
+
+def _record_path(manifest_path, basin, climate):
+    return os.path.join(manifest_path, basin, climate + '.json')
+
+
+def read_job_record(manifest_path, basin, climate):
+    path = _record_path(manifest_path, basin, climate)
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except ValueError:
+        return None
+
+
+def write_job_record(manifest_path, basin, climate, record):
+    path = _record_path(manifest_path, basin, climate)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    dump_json(record, path, indent=2)
+
+
+def get_file_suffix(manifest_path, file_suffix, resume=False):
+    """
+    Get the results file suffix of a run. A resumed run keeps the suffix of the run it resumes, so that its results
+    and checkpoints are found again on a later day; otherwise the given suffix is recorded for the run.
+    :param manifest_path: The manifest directory
+    :param file_suffix: The suffix of a new run (e.g., today's date)
+    :param resume: Whether the run is resumed
+    :return: The file suffix to use
+    """
+    path = os.path.join(manifest_path, RUN_RECORD)
+    if resume and os.path.exists(path):
+        try:
+            with open(path) as f:
+                return json.load(f)['file_suffix']
+        except (ValueError, KeyError):
+            pass
+    os.makedirs(manifest_path, exist_ok=True)
+    dump_json(dict(file_suffix=file_suffix), path, indent=2)
+    return file_suffix
+
+
+def read_runtime_history(debug=False):
+    """
+    Collect the run time per model year, by basin and planning option, of all successful jobs of all previous runs.
+    """
+    base_results_path = get_abs_path(get_base_results_path(debug=debug))
+    history = {}
+    for path in glob(os.path.join(base_results_path, '*', MANIFEST_DIR, '**', '*.json'), recursive=True):
+        try:
+            with open(path) as f:
+                record = json.load(f)
+        except ValueError:
+            continue
+        if record.get('status') != 'done' or not record.get('years'):
+            continue
+        key = (record['basin'], record.get('include_planning', False))
+        history.setdefault(key, []).append(record['duration'] / record['years'])
+    return {key: median(values) for key, values in history.items()}
+
+
+def estimate_runtime(basin, years, include_planning=False, history=None):
+    """
+    Estimate the run time of a job, in seconds if there is a history, otherwise in relative units.
+    """
+    include_planning = include_planning and basin in PLANNING_BASINS
+    if history and (basin, include_planning) in history:
+        return history[(basin, include_planning)] * years
+    weight = BASIN_WEIGHTS.get(basin, 1) * (PLANNING_WEIGHT if include_planning else 1)
+    if history:
+        # put unknown jobs first, since they are likely to be the longest
+        weight *= max(history.values()) * 10
+    return weight * years
+
+
+def order_jobs(jobs, years, include_planning=False, history=None):
+    """
+    Order (climate, basin) jobs longest first, so that long jobs do not hold up the end of a run.
+    :param jobs: List of (climate, basin) tuples
+    :param years: A dict of climate: number of years simulated
+    :param include_planning: Whether the planning model is included
+    :param history: Run time history from read_runtime_history
+    """
+    return sorted(jobs, key=lambda job: -estimate_runtime(job[1], years[job[0]], include_planning, history))
+
+
+def get_pending_jobs(jobs, manifest_path):
+    """
+    Get the jobs that have not already finished successfully, with results that still exist.
+    """
+    pending = []
+    for climate, basin in jobs:
+        record = read_job_record(manifest_path, basin, climate)
+        if record and record.get('status') == 'done' and os.path.exists(record.get('results_path', '')):
+            continue
+        pending.append((climate, basin))
+    return pending
+
+
+def reset_peak_memory():
+    """
+    Reset the peak resident memory of the current process, so that get_peak_memory measures only what follows. This
+    is only possible on Linux.
+    :return: True if the peak was reset
+    """
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+
+def get_peak_memory():
+    """
+    Get the peak resident memory of the current process, in MB, since it started or was last reset with
+    reset_peak_memory.
+    """
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    if resource is None:
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run_job(run_fn, climates, basin, manifest_path, years, results_paths, fresh_process=False, **kwargs):
+    """
+    Run a job and record its status, duration and peak memory in the manifest. The peak memory is that of the job's
+    process during the job, which can be measured if the peak can be reset first (on Linux) or the process runs only
+    this job; otherwise, it is not recorded (None), since it would include earlier jobs in the same process.
+    :param run_fn: The run function (run_model, run_models_warm or run_model_climates)
+    :param climates: A climate, or a list of climates for run functions that run several climates
+    :param basin: The basin
+    :param manifest_path: The manifest directory
+    :param years: A dict of climate: number of years simulated
+    :param results_paths: A dict of climate: results path
+    :param fresh_process: Whether the job runs in a new process of its own (e.g., in a pool with maxtasksperchild=1)
+    :return: A dict of climate: status
+    """
+    climate_list = climates if isinstance(climates, list) else [climates]
+    record = dict(
+        basin=basin,
+        include_planning=kwargs.get('include_planning', False) and basin in PLANNING_BASINS,
+        status='running',
+        started=datetime.now().isoformat(),
+        pid=os.getpid(),
+    )
+    for climate in climate_list:
+        write_job_record(manifest_path, basin, climate, dict(record, climate=climate))
+
+    measure_memory = reset_peak_memory() or fresh_process
+    start_time = time.time()
+    try:
+        result = run_fn(climates, basin, **kwargs)
+    except Exception as err:
+        logger.exception(err)
+        result = False
+    duration = time.time() - start_time
+
+    peak_memory = get_peak_memory() if measure_memory else None
+    statuses = {}
+    for climate in climate_list:
+        success = result.get(climate, False) if isinstance(result, dict) else bool(result)
+        statuses[climate] = 'done' if success else 'failed'
+        write_job_record(manifest_path, basin, climate, dict(
+            record,
+            climate=climate,
+            status=statuses[climate],
+            finished=datetime.now().isoformat(),
+            duration=duration / len(climate_list),
+            years=years[climate],
+            peak_memory_mb=peak_memory,
+            results_path=get_abs_path(results_paths[climate]),
+        ))
+
+    return statuses
+
+
+def run_jobs(run_fn, jobs, manifest_path, years, results_paths, multiprocessing=None, num_cores=1, **kwargs):
+    """
+    Run jobs serially or in parallel. Each job runs in isolation, so that a failed job does not stop the others.
+    :param jobs: List of (climates, basin) tuples, in the order to run them
+    :param years: A dict of climate: number of years simulated
+    :param results_paths: A dict of (climate, basin): results path
+    :param multiprocessing: None (serial), 'joblib' or any other value for a multiprocessing pool
+    :return: A dict of (climate, basin): status
+    """
+    job_calls = []
+    for climates, basin in jobs:
+        climate_list = climates if isinstance(climates, list) else [climates]
+        job_kwargs = dict(
+            kwargs,
+            manifest_path=manifest_path,
+            years={c: years[c] for c in climate_list},
+            results_paths={c: results_paths[(c, basin)] for c in climate_list}
+        )
+        job_calls.append(((run_fn, climates, basin), job_kwargs))
+
+    if not multiprocessing:  # serial processing for debugging
+        outputs = [run_job(*job_args, **job_kwargs) for job_args, job_kwargs in job_calls]
+
+    elif multiprocessing == 'joblib':
+        from joblib import Parallel, delayed
+        n_jobs = min(num_cores, len(jobs))
+        outputs = Parallel(n_jobs=n_jobs)(delayed(run_job)(*args, **kwargs) for args, kwargs in job_calls)
+
+    else:
+        import multiprocessing as mp
+        # one job per worker process, so that memory is released between jobs
+        pool = mp.Pool(processes=min(num_cores, len(jobs)), maxtasksperchild=1)
+        async_results = [pool.apply_async(run_job, job_args, dict(job_kwargs, fresh_process=True))
+                         for job_args, job_kwargs in job_calls]
+        pool.close()
+        pool.join()
+        outputs = []
+        for async_result in async_results:
+            try:
+                outputs.append(async_result.get(timeout=0))
+            except Exception as err:
+                logger.error(err)
+                outputs.append({})
+
+    statuses = {}
+    for (climates, basin), output in zip(jobs, outputs):
+        for climate in (climates if isinstance(climates, list) else [climates]):
+            statuses[(climate, basin)] = output.get(climate, 'failed')
+
+    num_failed = len([s for s in statuses.values() if s != 'done'])
+    logger.info('{} of {} jobs finished successfully'.format(len(statuses) - num_failed, len(statuses)))
+    for (climate, basin), status in statuses.items():
+        if status != 'done':
+            logger.warning('Failed: {} {}'.format(basin, climate))
+
+    return statuses
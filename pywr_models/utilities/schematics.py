@@ -2,6 +2,7 @@ import os
 import json
 
 from loguru import logger
+from .network_index import NetworkIndex
 
 fillcolors = {
     'reservoir': 'blue',
@@ -27,28 +28,34 @@ fontcolors = {
 
 # dot = Digraph(comment='System')
 
-def create_schematic(basin, version, format='pdf', view=False):
+def create_schematic(basin, version, format='pdf', view=False, model_path=None, network=None):
+    """
+    Create a schematic of a basin model with Graphviz, saved to the schematics folder.
+    :param network: The NetworkIndex of the model, if already built; otherwise, the model is read from model_path
+    """
     try:
         from graphviz import Digraph, ExecutableNotFound
     except:
         logger.warning('Graphviz python package not installed.')
         return
 
-    filename = 'pywr_model_Livneh'
-    if version:
-        filename += '_' + version
-    filename += '.json'
-    with open(os.path.join('models', basin, 'temp', filename)) as f:
-        model = json.load(f)
+    if network is None:
+        if model_path is None:
+            filename = 'pywr_model_Livneh'
+            if version:
+                filename += '_' + version
+            filename += '.json'
+            model_path = os.path.join('models', basin, 'temp', filename)
+        with open(model_path) as f:
+            network = NetworkIndex.from_json(json.load(f))
 
     try:
         _dot = Digraph(name=basin, comment=basin, format=format)
     except ExecutableNotFound:
         logger.warning('Graphviz executable not found. Daily schematic not created.')
 
-    for node in model['nodes']:
+    for node_name in network.nodes:
 
-        node_name = node['name']
         if version == 'monthly':
             if ' [output]' in node_name:
                 continue
@@ -58,7 +65,7 @@ def create_schematic(basin, version, format='pdf', view=False):
                 if int(month) > 1 and not ('[original]' in node_name and int(month) == 2):
                     continue
 
-        ntype = node['type'].lower()
+        ntype = network.types.get(node_name, '')
         fillcolor = fillcolors.get(ntype, 'white')
         fontcolor = fontcolors.get(ntype, 'black')
         shape = 'rect' if ntype in ['reservoir', 'virtualstorage'] else 'oval'
@@ -84,7 +91,7 @@ def create_schematic(basin, version, format='pdf', view=False):
 
     #     dot.edges(model['edges'])
 
-    for edge in model['edges']:
+    for edge in network.edges:
         if version == 'monthly':
             n1, n2 = edge
             try:
@@ -0,0 +1,153 @@
+"""
+Tables shared by all basins (e.g., the San Joaquin Valley Index and the energy prices in the data's "common" folder),
+loaded once by the main process and published in shared memory, so that parallel workers map the same data instead
+of each reading its own copy.
+
+The main process publishes the tables with SharedTables and passes its descriptors to the workers, which attach to
+them with attach_tables. Tables that are attached are then read from shared memory by load_dataframe (see
+utilities.hydrology_store), as read-only views.
+"""
+
+import os
+import json
+import numpy as np
+import pandas as pd
+from multiprocessing import shared_memory, resource_tracker
+from loguru import logger
+
+COMMON_FOLDER = 'common'
+
+# keys of table definitions that are not passed on to pandas
+NON_DATA_KEYS = ['url', 'type', 'name', 'comment', 'scenario']
+
+here = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))  # the pywr_models folder, where models are run
+
+_attached = {}  # table key: (shared memory block, dataframe)
+
+
+def get_table_key(spec):
+    """
+    Get the key of a table definition: its url, as written in the model file, and its read arguments.
+    """
+    kwargs = {k: v for k, v in spec.items() if k not in NON_DATA_KEYS}
+    return '{}|{}'.format(spec.get('url'), json.dumps(kwargs, sort_keys=True))
+
+
+def get_common_tables(model_jsons):
+    """
+    Find the tables of one or more model definitions that are read from the data's "common" folder.
+    :param model_jsons: Assembled model definitions, e.g., of each basin and climate to be run
+    :return: A dict of table key: table definition
+    """
+    tables = {}
+    for m in model_jsons:
+        for table in m.get('tables', {}).values():
+            url = table.get('url', '')
+            if COMMON_FOLDER in url.replace('\\', '/').split('/')[:-1]:
+                tables[get_table_key(table)] = table
+    return tables
+
+
+class SharedTables(object):
+    """
+    Tables loaded by the main process into shared memory. The blocks are released by close, which should be called
+    once all workers are done.
+    """
+
+    def __init__(self, tables):
+        """
+        :param tables: A dict of table key: table definition (see get_common_tables)
+        """
+        from .monthly_tables import read_table
+
+        self.blocks = []
+        self.descriptors = {}
+        for key, spec in tables.items():
+            df = read_table(dict(spec, url=os.path.join(here, spec['url'])))
+            values = np.ascontiguousarray(df.values)
+            if values.dtype.kind not in 'biuf' or not values.size:
+                logger.warning('Table {} is not numeric and will not be shared'.format(spec['url']))
+                continue
+            block = shared_memory.SharedMemory(create=True, size=values.nbytes)
+            np.ndarray(values.shape, dtype=values.dtype, buffer=block.buf)[:] = values
+            self.blocks.append(block)
+            self.descriptors[key] = dict(
+                block=block.name,
+                shape=values.shape,
+                dtype=values.dtype.str,
+                index=df.index,
+                columns=df.columns if isinstance(df, pd.DataFrame) else None,
+                name=df.name if isinstance(df, pd.Series) else None,
+            )
+        logger.info('{} tables published in shared memory ({:.1f} MB)'.format(
+            len(self.descriptors), sum(block.size for block in self.blocks) / 1e6))
+
+    def close(self):
+        for block in self.blocks:
+            block.close()
+            block.unlink()
+        self.blocks = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def _attach(name):
+    # before Python 3.13, attaching to a block registers it with the resource tracker, which unlinks it when the
+    # worker exits, while the main process and other workers are still using it
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        pass
+    register = resource_tracker.register
+    resource_tracker.register = lambda *args, **kwargs: None
+    try:
+        return shared_memory.SharedMemory(name=name)
+    finally:
+        resource_tracker.register = register
+
+
+def attach_tables(descriptors):
+    """
+    Attach a worker to the tables published by the main process.
+    :param descriptors: The descriptors of the published tables (SharedTables.descriptors), or None
+    """
+    for key, descriptor in (descriptors or {}).items():
+        attached = _attached.get(key)
+        if attached is not None and attached[0].name == descriptor['block']:
+            continue
+        block = _attach(descriptor['block'])
+        values = np.ndarray(descriptor['shape'], dtype=np.dtype(descriptor['dtype']), buffer=block.buf)
+        values.flags.writeable = False
+        if descriptor['columns'] is None:
+            df = pd.Series(values, index=descriptor['index'], name=descriptor['name'], copy=False)
+        else:
+            df = pd.DataFrame(values, index=descriptor['index'], columns=descriptor['columns'], copy=False)
+        _attached[key] = (block, df)
+
+
+def is_shared(spec):
+    return isinstance(spec, dict) and get_table_key(spec) in _attached
+
+
+def get_shared_table(spec):
+    """
+    Get a table from shared memory.
+    :return: A read-only DataFrame or Series, or None if the table has not been published
+    """
+    attached = _attached.get(get_table_key(spec))
+    return attached[1] if attached is not None else None
+
+
+def use_shared_tables(m):
+    """
+    Set up a model definition, just before it is loaded, to take its tables from shared memory where possible (see
+    utilities.hydrology_store.defer_tables). This does nothing if the process is not attached to any tables.
+    """
+    from .hydrology_store import defer_tables
+    if _attached:
+        defer_tables(m, is_shared)
+    return m
@@ -1,46 +1,126 @@
 import os
+import json
+import warnings
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
 import pandas as pd
+from pandas.tseries.frequencies import to_offset
 from loguru import logger
 
+from .cache import dump_json
 
-def check_nan(basin_path, climate):
-    def _check_nan(path, total_nan=0):
-        if os.path.isdir(path):
-            for subpath in os.listdir(path):
-                fullsubpath = os.path.join(path, subpath)
-                total_nan = _check_nan(fullsubpath, total_nan)
 
-        else:
-            ext = os.path.splitext(path)[-1]
-            if ext == '.csv':
-                df = pd.read_csv(path)
+def _get_data_paths(basin_path, climate):
+    # the data files of a basin used by a climate: everything but the gauges, and only the climate's hydrology
+    paths = []
+    for toppath in sorted(os.listdir(basin_path)):
+        if toppath == 'gauges':
+            continue
+        top = os.path.join(basin_path, toppath, climate) if toppath == 'hydrology' else os.path.join(basin_path, toppath)
+        for dirpath, dirnames, filenames in os.walk(top):
+            dirnames.sort()
+            paths.extend(os.path.join(dirpath, f) for f in sorted(filenames) if f.endswith('.csv'))
+    return paths
 
-            else:
-                return total_nan
 
-            count_nan = df.isnull().sum().sum()
+def scan_file(path, time_series=False):
+    """
+    Read a data file and describe it for the data manifest.
+    :param path: The CSV file
+    :param time_series: Parse the first column as dates (e.g., for hydrology), to record the dates covered
+    :return: A dict of the file's size, modified time, rows, column dtypes, NaN count and, if it is a time series,
+        first and last dates
+    """
+    entry = dict(size=os.path.getsize(path), mtime=os.path.getmtime(path))
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', UserWarning)  # dates that pandas cannot infer a format for
+            df = pd.read_csv(path, index_col=0 if time_series else None, parse_dates=time_series)
+    except (ValueError, pd.errors.ParserError) as err:
+        entry['error'] = str(err)
+        return entry
+    entry.update(
+        rows=len(df),
+        dtypes={str(c): str(dtype) for c, dtype in df.dtypes.items()},
+        nan=int(df.isnull().sum().sum()),
+    )
+    dates = df.index.dropna() if isinstance(df.index, pd.DatetimeIndex) else []
+    if len(dates):
+        freq = pd.infer_freq(dates) if len(dates) > 2 else None
+        entry['freq'] = freq
+        # annual data is indexed by (water) year, so its coverage is not checked
+        if not (freq and freq.startswith(('A', 'Y', 'BA', 'BY'))):
+            # the last date covered is the end of the last period, e.g., the end of the month for monthly data
+            last = dates.max() + to_offset(freq) - pd.Timedelta(days=1) if freq else dates.max()
+            entry.update(start=dates.min().strftime('%Y-%m-%d'), end=last.strftime('%Y-%m-%d'))
+    return entry
 
-            try:
-                assert (count_nan == 0)
-            except:
-                logger.warning('NaN found in {}'.format(path))
 
-            total_nan += count_nan
+def _scan(args):
+    return scan_file(*args)
 
-        return total_nan
 
-    for toppath in os.listdir(basin_path):
+def _load_manifest(manifest_path):
+    if manifest_path and os.path.exists(manifest_path):
+        with open(manifest_path) as f:
+            return json.load(f)
+    return {}
 
-        total_nan = 0
 
-        if toppath == 'gauges':
+def validate_data(basin_path, climate, start=None, end=None, manifest_path=None, workers=None):
+    """
+    Check a basin's data files for a climate: count NaNs and, if run dates are given, check that the climate's
+    hydrology covers them. Files are described in a manifest (see scan_file), so that later checks only read the files
+    that have changed, by size and modified time. Changed files are read in parallel.
+    :param basin_path: The basin's data folder
+    :param climate: The climate, e.g., "historical/Livneh"
+    :param start: The first date of the run (YYYY-MM-DD)
+    :param end: The last date of the run
+    :param manifest_path: The manifest file (default: none, i.e., read all files)
+    :param workers: Number of processes to read files with (default: the number of cores)
+    :return: A dict with the total NaN count ("nan"), and the files with NaNs ("nan_files"), files that could not be
+        read ("errors") and time series that do not cover the run ("short")
+    """
+    manifest = _load_manifest(manifest_path)
+    hydrology_path = os.path.join(basin_path, 'hydrology', climate)
+
+    paths = {os.path.relpath(path, basin_path): path for path in _get_data_paths(basin_path, climate)}
+    to_scan = []
+    for key, path in paths.items():
+        entry = manifest.get(key)
+        if entry is None or entry['size'] != os.path.getsize(path) or entry['mtime'] != os.path.getmtime(path):
+            to_scan.append((key, path, path.startswith(hydrology_path)))
+
+    if to_scan:
+        logger.info('Checking {} of {} data files'.format(len(to_scan), len(paths)))
+        workers = min(workers or os.cpu_count() or 1, len(to_scan))
+        if workers > 1 and not multiprocessing.current_process().daemon:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                entries = list(executor.map(_scan, [args[1:] for args in to_scan], chunksize=8))
+        else:  # processes cannot be started from a multiprocessing pool
+            entries = [_scan(args[1:]) for args in to_scan]
+        for (key, _, _), entry in zip(to_scan, entries):
+            manifest[key] = entry
+        if manifest_path:
+            os.makedirs(os.path.dirname(manifest_path), exist_ok=True)
+            dump_json(manifest, manifest_path)
+
+    results = dict(nan=0, nan_files=[], errors=[], short=[])
+    for key, path in paths.items():
+        entry = manifest[key]
+        if 'error' in entry:
+            results['errors'].append(path)
             continue
+        if entry['nan']:
+            results['nan'] += entry['nan']
+            results['nan_files'].append(path)
+        if start and end and 'start' in entry and (entry['start'] > start or entry['end'] < end):
+            results['short'].append(path)
+    return results
 
-        if toppath == 'hydrology':
-            climate_path = os.path.join(basin_path, toppath, climate)
-            total_nan += _check_nan(climate_path, total_nan)
-        else:
-            fulltoppath = os.path.join(basin_path, toppath)
-            total_nan += _check_nan(fulltoppath, total_nan)
 
-    return total_nan
+def check_nan(basin_path, climate, manifest_path=None):
+    results = validate_data(basin_path, climate, manifest_path=manifest_path)
+    for path in results['nan_files']:
+        logger.warning('NaN found in {}'.format(path))
+    return results['nan']
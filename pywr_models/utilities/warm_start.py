@@ -0,0 +1,50 @@
+from loguru import logger
+from pywr._component import Component
+
+
+def _has_state(component):
+    # components that don't override reset() only log a message when reset
+    return type(component).reset is not Component.reset
+
+
+class IncrementalReset(object):
+    """
+    Reset the planning model at the start of each month without a full Model.reset().
+
+    The first reset is a full reset. After that, only the timestepper, the nodes (flows and storage volumes) and the
+    components that keep state between time steps (e.g., recorders and parameters with memory) are reset. Everything
+    else that changes from month to month (initial storages, runoff forecasts, prices) is a parameter value that is
+    recalculated when the model steps, and the LP bounds and costs are updated from them by the solver as usual.
+
+    The solver is not reset either, so each month's LP is warm started from the previous month's basis rather than
+    from a new (crashed) basis. Since the planning LP can have more than one optimal solution, results may differ
+    slightly from those of a full reset.
+    """
+
+    def __init__(self, model):
+        self.model = model
+        self.components = None
+
+    def full_reset(self, start):
+        model = self.model
+        model.reset(start=start)
+        components = model.flatten_component_tree(rebuild=False)
+        self.components = [c for c in components if _has_state(c)]
+        logger.debug('Planning model: {} of {} components are reset each month'.format(
+            len(self.components), len(components)))
+
+    def reset(self, start=None):
+        model = self.model
+        if self.components is None or model.dirty or model.timestepper.dirty:
+            self.full_reset(start)
+            return
+
+        if model.timestepper.reset(start=start):
+            # the number of time steps has changed, so the nodes and components need to be set up again
+            self.full_reset(start)
+            return
+
+        for node in model.nodes:
+            node.reset()
+        for component in self.components:
+            component.reset()